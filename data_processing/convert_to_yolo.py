@@ -1,8 +1,9 @@
 import os
 from .resize_images import resize_image_with_annotations
 import logging 
+from logging_setup import setup_logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 logger = logging.getLogger(__name__)
 
 def convert_to_yolo_format(image_bbox):
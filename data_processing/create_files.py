@@ -2,11 +2,41 @@ import os
 import logging
 from .resize_images import resize_image_with_annotations
 from .convert_to_yolo import convert_to_yolo_format
+from .file_utils import atomic_write
 from torchvision.transforms.functional import to_pil_image # type: ignore
+from logging_setup import setup_logging
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
 
+
+def write_item(source_image, source_annotation, method, image_save_path, annotation_save_path):
+    """
+    Preprocesses one image/XML pair with `method` and writes the JPG and its YOLO labels atomically.
+
+    Returns
+    -------
+    int
+        Number of labelled boxes.
+    """
+    image_bbox = resize_image_with_annotations(source_image, source_annotation, method=method)
+    if image_bbox[0] is None:
+        raise ValueError(f"❌ Failed to process {source_image}")
+    new_image = image_bbox[0]  # Processed image tensor
+    yolo_list = convert_to_yolo_format(image_bbox)
+
+    # Convert tensor to image and save as .jpg
+    atomic_write(image_save_path, lambda path: to_pil_image(new_image).save(path, format="JPEG"))
+
+    # Save YOLO annotations as .txt
+    def write_labels(path):
+        with open(path, "w") as f:
+            for line in yolo_list:
+                f.write(line + "\n")
+    atomic_write(annotation_save_path, write_labels)
+    return len(yolo_list)
+
+
 def create_files(method, image_dir='data/images', annotations_dir='data/annotations', override=False):
     # Check if valid method
     valid_methods = ['resize', 'pad_resize', 'resize_pad']
@@ -55,19 +85,8 @@ def create_files(method, image_dir='data/images', annotations_dir='data/annotati
 
         # Process image and annotations
         source_image = os.path.join(image_dir, image_name)
-        image_bbox = resize_image_with_annotations(source_image, source_annotation, method=method)
-        new_image = image_bbox[0]  # Processed image tensor
-        yolo_list = convert_to_yolo_format(image_bbox)
-
-        # Convert tensor to image and save as .jpg
-        to_pil_image(new_image).save(image_save_path)
-
-        
-        # Save YOLO annotations as .txt
         annotation_save_path = os.path.join(annotation_full_path, f"{image}.txt")
-        with open(annotation_save_path, "w") as f:
-            for line in yolo_list:
-                f.write(line + "\n") 
+        write_item(source_image, source_annotation, method, image_save_path, annotation_save_path)
         
 
 
@@ -0,0 +1,250 @@
+import os
+import json
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+HASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 6  # Hamming distance (out of 64 bits) below which two frames are near-duplicates
+
+# Number of set bits for every byte value, used to count differing bits 8 at a time
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image_path):
+    """
+    64-bit DCT perceptual hash (pHash) of an image.
+
+    The grayscale image is shrunk to 32x32, and each of the 8x8 lowest-frequency DCT
+    coefficients becomes one bit: set if it is above their median. Re-encoding, resizing,
+    small crops and lighting changes only flip a few bits.
+
+    Returns
+    -------
+    int or None
+        The hash, or None if the image can't be read.
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # The DC term only reflects overall brightness
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def compute_hashes(image_dir, workers=None):
+    """
+    Hashes every image in `image_dir` (not recursive) with a process pool.
+
+    Returns
+    -------
+    tuple (list of str, np.ndarray)
+        File names and their hashes as uint64, unreadable images left out.
+    """
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    paths = [os.path.join(image_dir, name) for name in names]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(perceptual_hash, paths, chunksize=32))
+
+    unreadable = [name for name, h in zip(names, hashes) if h is None]
+    if unreadable:
+        logger.warning(f"⚠️ Could not read {len(unreadable)} images, e.g. {unreadable[:3]}")
+
+    kept = [(name, h) for name, h in zip(names, hashes) if h is not None]
+    logger.info(f"✅ Hashed {len(kept)} images in {image_dir}")
+    return [name for name, _ in kept], np.array([h for _, h in kept], dtype=np.uint64)
+
+
+def hamming_distances(query, hashes):
+    """
+    Hamming distance between one hash and an array of uint64 hashes, vectorized over bytes.
+    """
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(query))
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def blocks_for(max_distance):
+    """
+    Fewest equal chunks of the 64 bits that guarantee an exact chunk match within `max_distance`.
+    """
+    blocks = 1
+    while blocks <= max_distance and blocks < HASH_BITS:
+        blocks *= 2
+    return blocks
+
+
+class HashIndex:
+    """
+    Multi-index over 64-bit hashes for near-duplicate search.
+
+    Each hash is split into `blocks` equal chunks with one lookup table per chunk. Two hashes
+    within Hamming distance d < blocks must agree exactly on at least one chunk (pigeonhole),
+    so a query only computes distances to the items sharing a chunk with it instead of to
+    every item. By default the chunking is chosen for `max_distance` (8 chunks of 8 bits for
+    the default of 6); queries with a larger distance fall back to a vectorized scan.
+
+    Attributes:
+        hashes (np.ndarray): The indexed hashes (uint64).
+        blocks (int): Number of chunks the 64 bits are split into.
+        tables (list of dict): For every chunk, chunk value -> item indices.
+    """
+    def __init__(self, hashes, max_distance=DEFAULT_MAX_DISTANCE, blocks=None):
+        blocks = blocks or blocks_for(max_distance)
+        if HASH_BITS % blocks:
+            raise ValueError(f"❌ {HASH_BITS} bits can't be split into {blocks} blocks")
+
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.blocks = blocks
+        self.block_bits = HASH_BITS // blocks
+        self.tables = []
+
+        mask = np.uint64((1 << self.block_bits) - 1)
+        for block in range(blocks):
+            values = (self.hashes >> np.uint64(block * self.block_bits)) & mask
+            order = np.argsort(values, kind="stable")
+            unique, starts = np.unique(values[order], return_index=True)
+            self.tables.append(dict(zip(unique.tolist(), np.split(order, starts[1:]))))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _candidates(self, query):
+        mask = (1 << self.block_bits) - 1
+        found = [self.tables[block].get((query >> (block * self.block_bits)) & mask)
+                 for block in range(self.blocks)]
+        found = [indices for indices in found if indices is not None]
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def query(self, query, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        Indices and distances of the indexed hashes within `max_distance` of `query`.
+        """
+        query = int(query)
+        if max_distance < self.blocks:
+            candidates = self._candidates(query)
+        else:
+            candidates = np.arange(len(self.hashes))
+
+        distances = hamming_distances(query, self.hashes[candidates])
+        close = distances <= max_distance
+        return candidates[close], distances[close]
+
+    def pairs(self, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        All index pairs (i, j), i < j, within `max_distance` of each other.
+        """
+        pairs = []
+        for i, h in enumerate(self.hashes.tolist()):
+            neighbours, _ = self.query(h, max_distance)
+            pairs.extend((i, int(j)) for j in neighbours if j > i)
+        return pairs
+
+
+def duplicate_clusters(hashes, max_distance=DEFAULT_MAX_DISTANCE, blocks=None):
+    """
+    Groups hashes into clusters of near-duplicates (connected components of the
+    "within `max_distance`" graph).
+
+    Returns
+    -------
+    np.ndarray
+        Cluster id per hash; singletons get their own id.
+    """
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in HashIndex(hashes, max_distance, blocks).pairs(max_distance):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    roots = [find(i) for i in range(len(hashes))]
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels
+
+
+def build_report(image_dir, max_distance=DEFAULT_MAX_DISTANCE, workers=None):
+    """
+    Hashes `image_dir` and reports its near-duplicate clusters.
+
+    Returns
+    -------
+    dict
+        `clusters` (every cluster as a list of file names, duplicates first by size),
+        `redundant` (all but the first file of every duplicate cluster) and summary counts.
+    """
+    names, hashes = compute_hashes(image_dir, workers)
+    labels = duplicate_clusters(hashes, max_distance)
+
+    clusters = {}
+    for name, label in zip(names, labels.tolist()):
+        clusters.setdefault(label, []).append(name)
+    clusters = sorted(clusters.values(), key=lambda members: (-len(members), members[0]))
+
+    duplicates = [members for members in clusters if len(members) > 1]
+    redundant = [name for members in duplicates for name in members[1:]]
+    report = {
+        "image_dir": image_dir,
+        "max_distance": max_distance,
+        "images": len(names),
+        "clusters": clusters,
+        "duplicate_clusters": len(duplicates),
+        "redundant": redundant,
+    }
+    logger.info(f"✅ {len(names)} images form {len(clusters)} clusters; {len(duplicates)} have near-duplicates "
+                f"({len(redundant)} redundant images)")
+    return report
+
+
+def load_groups(report_path):
+    """
+    Maps every file stem in a dedup report to the key of its cluster, the smallest stem in it.
+
+    Stems are used because the preprocessed copies in `data/images/<method>` keep the
+    original name but may change the extension. Keying clusters by a member rather than by
+    their position in the report keeps the key of an existing cluster (and so its split)
+    the same when the report is regenerated with more images.
+    """
+    with open(report_path) as f:
+        report = json.load(f)
+    groups = {}
+    for members in report["clusters"]:
+        stems = [os.path.splitext(name)[0] for name in members]
+        groups.update((stem, min(stems)) for stem in stems)
+    return groups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes.")
+    parser.add_argument("--image-dir", default="data/images")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="dedup.json")
+    args = parser.parse_args()
+
+    report = build_report(args.image_dir, args.max_distance, args.workers)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for members in report["clusters"][:10]:
+        if len(members) > 1:
+            print(f"{len(members):>4}  {', '.join(members[:5])}{' ...' if len(members) > 5 else ''}")
+    print(f"Report saved to {args.output}")
+
+#python -m data_processing.dedup --image-dir data/images --output dedup.json
@@ -1,9 +1,11 @@
 import logging 
 import xml.etree.ElementTree as ET
+from logging_setup import get_sampled_logger, setup_logging
 
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
 
 
 def extract_annotations(xml_file = "data/annotations/maksssksksss0.xml"):
@@ -43,7 +45,7 @@ def extract_annotations(xml_file = "data/annotations/maksssksksss0.xml"):
         height = int(size.find('height').text)
         depth = int(size.find('depth').text)
 
-        logger.info(f"{xml_file} : Sucessfully extracted size attributes of image!. Height:{height}, width:{width}, depth:{depth}")
+        sampled_logger.info("size", "%s : Sucessfully extracted size attributes of image!. Height:%s, width:%s, depth:%s", xml_file, height, width, depth)
         result['image_size'] = {'width': width, 'height': height, 'depth': depth}
 
     except AttributeError as e:
@@ -68,7 +70,7 @@ def extract_annotations(xml_file = "data/annotations/maksssksksss0.xml"):
             y_min = int(bounding_box.find('ymin').text)
             x_max = int(bounding_box.find('xmax').text)
             y_max = int(bounding_box.find('ymax').text)
-            logger.info(f"Person {with_mask} and Bounding box at {x_min,y_min} to {x_max,y_max}")
+            sampled_logger.info("box", "Person %s and Bounding box at %s to %s", with_mask, (x_min,y_min), (x_max,y_max))
             # Append bounding box data to the list
             bounding_boxes.append({
                 'label': with_mask,
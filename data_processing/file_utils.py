@@ -0,0 +1,19 @@
+import os
+import uuid
+import socket
+
+
+def atomic_write(path, write):
+    """
+    Calls `write(temp_path)` and renames the result to `path`, so readers never see a partial file.
+
+    The temp file is in the same directory (same filesystem), where `os.replace` is atomic. Its
+    name is unique across machines writing to the same shared directory, not just across processes.
+    """
+    temp_path = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -4,10 +4,12 @@ import numpy as np
 import torch
 import logging
 from .extract_annotations import extract_annotations  # Import extract_annotations from another file
+from logging_setup import get_sampled_logger, setup_logging
 
 # Configure logger
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
 
 def resize_image_with_annotations(image_path, xml_path, target_size=(224, 224), method="resize"):
     """
@@ -73,7 +75,7 @@ def resize_image_with_annotations(image_path, xml_path, target_size=(224, 224),
             logger.error(f"Invalid resizing method: {method}")
             return None, None
 
-        logger.info(f"✅ Processed: {image_path}, New Size: {image_resized.shape[:2]}")
+        sampled_logger.info("processed", "✅ Processed: %s, New Size: %s", image_path, image_resized.shape[:2])
 
         # Scale and adjust bounding boxes
         resized_bboxes = []
@@ -86,7 +88,7 @@ def resize_image_with_annotations(image_path, xml_path, target_size=(224, 224),
             x_max = int(annotation["coordinates"]["xmax"] * scale_x + shift_x)
             y_max = int(annotation["coordinates"]["ymax"] * scale_y + shift_y)
 
-            logger.info(f"🔄 Adjusted Bounding Box for {label}: {x_min,y_min} to {x_max,y_max}")
+            sampled_logger.info("box", "🔄 Adjusted Bounding Box for %s: %s to %s", label, (x_min,y_min), (x_max,y_max))
             resized_bboxes.append({
                 "label": label,
                 "coordinates": {"xmin": x_min, "ymin": y_min, "xmax": x_max, "ymax": y_max}
@@ -158,5 +160,5 @@ def pad_then_resize(image, target_size, original_width, original_height):
 
 
 if __name__ == "__main__":
-    logging.info(resize_image_with_annotations(image_path="data/images/maksssksksss0.png",
+    logger.info(resize_image_with_annotations(image_path="data/images/maksssksksss0.png",
                                                xml_path="data/annotations/maksssksksss0.xml"))
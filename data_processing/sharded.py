@@ -0,0 +1,407 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from .dedup import load_groups
+from .file_utils import atomic_write
+from logging_setup import get_sampled_logger, setup_logging
+
+# torch is only needed to preprocess images; create_files is imported inside process_items so the
+# queue, sharding and merge steps can run (and be tested) without it.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
+
+METHODS = ["resize", "resize_pad", "pad_resize"]
+IMAGE_EXTENSIONS = (".jpg", ".png")
+SPLIT_RATIOS = {"train": 0.8, "val": 0.1, "test": 0.1}
+CHUNK_SIZE = 256  # Items per manifest part / queue claim
+
+
+def stable_hash(key):
+    """
+    Hash of a string that is the same on every machine and Python process (unlike `hash()`).
+    """
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def shard_of(stem, num_shards):
+    return stable_hash(stem) % num_shards
+
+
+def list_items(image_dir="data/images", annotations_dir="data/annotations"):
+    """
+    Work items: `(image_name, stem)` for every source image that has an XML annotation, sorted by stem.
+    """
+    items = []
+    for image_name in sorted(os.listdir(image_dir)):
+        stem, extension = os.path.splitext(image_name)
+        if extension.lower() not in IMAGE_EXTENSIONS or not os.path.isfile(os.path.join(image_dir, image_name)):
+            continue
+        if not os.path.exists(os.path.join(annotations_dir, f"{stem}.xml")):
+            logger.warning(f"⚠️ {stem}.xml does not exist, skipping {image_name}")
+            continue
+        items.append((image_name, stem))
+    return items
+
+
+class WorkQueue:
+    """
+    Work queue in a SQLite file on shared storage, so workers on several machines can pull
+    items without a coordinator.
+
+    Items are claimed in chunks under a write lock; a claim is a lease that expires after
+    `lease_seconds`, so items held by a crashed worker are handed out again. The database
+    uses the rollback journal rather than WAL, which doesn't work on network filesystems.
+
+    Attributes:
+        path (str): SQLite database file.
+        lease_seconds (float): How long a claim is valid before others may take the item.
+    """
+    def __init__(self, path, lease_seconds=1800):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        connection = self._connect()
+        try:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    stem TEXT PRIMARY KEY,
+                    image_name TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_items_status ON items (status, claimed_at)")
+        finally:
+            connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)  # Explicit transactions
+        connection.execute("PRAGMA journal_mode=DELETE")
+        return connection
+
+    def add(self, items):
+        """
+        Adds `(image_name, stem)` items; items already in the queue (done or not) are left alone.
+
+        Returns the number of new items.
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            before = connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            connection.executemany("INSERT OR IGNORE INTO items (stem, image_name) VALUES (?, ?)",
+                                   [(stem, image_name) for image_name, stem in items])
+            after = connection.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        return after - before
+
+    def claim(self, worker, limit=CHUNK_SIZE, max_attempts=3):
+        """
+        Claims up to `limit` pending (or expired) items for `worker`.
+
+        Expired items that were already claimed `max_attempts` times are marked failed instead
+        of being handed out again, see `retry_failed`.
+
+        Returns
+        -------
+        list of tuple
+            `(image_name, stem)` items, empty when there is nothing left to do.
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")  # Take the write lock before reading, so claims can't overlap
+            connection.execute(
+                "UPDATE items SET status = 'failed', error = ? WHERE status = 'claimed' AND claimed_at < ? AND attempts >= ?",
+                (f"Lease expired after {max_attempts} attempts", now - self.lease_seconds, max_attempts))
+            rows = connection.execute(
+                "SELECT stem, image_name FROM items WHERE attempts < ? AND "
+                "(status = 'pending' OR (status = 'claimed' AND claimed_at < ?)) ORDER BY stem LIMIT ?",
+                (max_attempts, now - self.lease_seconds, limit)).fetchall()
+            connection.executemany(
+                "UPDATE items SET status = 'claimed', worker = ?, claimed_at = ?, attempts = attempts + 1 WHERE stem = ?",
+                [(worker, now, stem) for stem, _ in rows])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        return [(image_name, stem) for stem, image_name in rows]
+
+    def finish(self, worker, done, failed=None):
+        """
+        Marks claimed stems as done and `failed` ({stem: error}) as failed (see `retry_failed`).
+        Items whose lease was taken over by another worker are left alone.
+        """
+        failed = failed or {}
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("UPDATE items SET status = 'done', error = NULL WHERE stem = ? AND worker = ?",
+                                   [(stem, worker) for stem in done])
+            connection.executemany("UPDATE items SET status = 'failed', error = ? WHERE stem = ? AND worker = ?",
+                                   [(error, stem, worker) for stem, error in failed.items()])
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def retry_failed(self):
+        connection = self._connect()
+        try:
+            connection.execute("UPDATE items SET status = 'pending', attempts = 0 WHERE status = 'failed'")
+        finally:
+            connection.close()
+
+    def progress(self):
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
+
+
+def output_paths(output_dir, method, stem):
+    # YOLO finds labels by replacing /images/ with /labels/ in the image path
+    return (os.path.join(output_dir, "images", method, f"{stem}.jpg"),
+            os.path.join(output_dir, "labels", method, f"{stem}.txt"))
+
+
+def process_items(items, output_dir, part_name, image_dir="data/images", annotations_dir="data/annotations",
+                  methods=METHODS, override=False):
+    """
+    Preprocesses a chunk of items with every method and writes a manifest part for it.
+
+    Outputs are written atomically, and items whose outputs already exist are skipped unless
+    `override` is set, so a chunk can safely be redone after a crash. The manifest part is
+    written last, also atomically.
+
+    Returns
+    -------
+    tuple (list, dict)
+        Stems that succeeded and `{stem: error}` for those that failed.
+    """
+    from .create_files import write_item
+
+    for method in methods:
+        os.makedirs(os.path.join(output_dir, "images", method), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "labels", method), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "manifests"), exist_ok=True)
+
+    records, done, failed = [], [], {}
+    for image_name, stem in items:
+        try:
+            record = {"stem": stem, "source": image_name, "boxes": {}}
+            for method in methods:
+                image_path, label_path = output_paths(output_dir, method, stem)
+                if not override and os.path.exists(image_path) and os.path.exists(label_path):
+                    with open(label_path) as f:
+                        record["boxes"][method] = sum(1 for line in f if line.strip())
+                    continue
+                record["boxes"][method] = write_item(os.path.join(image_dir, image_name),
+                                                     os.path.join(annotations_dir, f"{stem}.xml"),
+                                                     method, image_path, label_path)
+            records.append(record)
+            done.append(stem)
+            sampled_logger.info("item", "✅ Processed %s", stem)
+        except Exception as e:
+            failed[stem] = str(e)
+            logger.error(f"❌ Failed to process {image_name}: {e}")
+
+    def write_part(path):
+        with open(path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    atomic_write(os.path.join(output_dir, "manifests", f"{part_name}.jsonl"), write_part)
+    return done, failed
+
+
+def run_shard(shard, num_shards, output_dir, image_dir="data/images", annotations_dir="data/annotations",
+              methods=METHODS, override=False, workers=1):
+    """
+    Processes the items whose stable hash falls in `shard` of `num_shards`, with no coordination:
+    start one per machine with `--shard i --num-shards n`.
+
+    Returns
+    -------
+    dict
+        `{"done", "failed"}` counts.
+    """
+    items = [item for item in list_items(image_dir, annotations_dir) if shard_of(item[1], num_shards) == shard]
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    logger.info(f"🧩 Shard {shard}/{num_shards}: {len(items)} items in {len(chunks)} chunks")
+
+    done, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_items, chunk, output_dir, f"shard-{shard}-of-{num_shards}-{i:05d}",
+                               image_dir, annotations_dir, methods, override) for i, chunk in enumerate(chunks)]
+        for future in futures:
+            chunk_done, chunk_failed = future.result()
+            done += len(chunk_done)
+            failed += len(chunk_failed)
+
+    logger.info(f"✅ Shard {shard}/{num_shards} finished: {done} done, {failed} failed")
+    return {"done": done, "failed": failed}
+
+
+def queue_worker(queue_path, output_dir, worker, image_dir="data/images", annotations_dir="data/annotations",
+                 methods=METHODS, override=False):
+    """
+    Claims chunks from the shared queue and processes them until it is empty.
+    """
+    queue = WorkQueue(queue_path)
+    done = failed = chunk = 0
+    while True:
+        items = queue.claim(worker)
+        if not items:
+            break
+        chunk_done, chunk_failed = process_items(items, output_dir, f"{worker}-{chunk:05d}", image_dir,
+                                                 annotations_dir, methods, override)
+        queue.finish(worker, chunk_done, chunk_failed)
+        done += len(chunk_done)
+        failed += len(chunk_failed)
+        chunk += 1
+    return {"done": done, "failed": failed}
+
+
+def run_queue_workers(queue_path, output_dir, image_dir="data/images", annotations_dir="data/annotations",
+                      methods=METHODS, override=False, workers=1):
+    """
+    Runs `workers` queue workers on this machine; start it on as many machines as you like.
+    """
+    host = socket.gethostname()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(queue_worker, queue_path, output_dir, f"{host}-{os.getpid()}-{i}", image_dir,
+                               annotations_dir, methods, override) for i in range(workers)]
+        results = [future.result() for future in futures]
+
+    totals = {"done": sum(r["done"] for r in results), "failed": sum(r["failed"] for r in results)}
+    logger.info(f"✅ Queue workers finished: {totals}, queue: {WorkQueue(queue_path).progress()}")
+    return totals
+
+
+def assign_split(key, ratios=SPLIT_RATIOS):
+    """
+    Deterministic split for a stem or cluster: the same on every machine and every rebuild,
+    and unaffected by adding new items.
+    """
+    position = stable_hash(str(key)) / 2 ** 64
+    cumulative = 0.0
+    for split, ratio in ratios.items():
+        cumulative += ratio
+        if position < cumulative:
+            return split
+    return split
+
+
+def merge(output_dir, methods=METHODS, dedup_report=None, ratios=SPLIT_RATIOS):
+    """
+    Merges the manifest parts into `manifest.jsonl` and writes the train/val/test file lists
+    and a data yaml per method.
+
+    The split is decided per item from a stable hash (of its near-duplicate cluster when a
+    dedup report is given, so clusters stay in one split), so no files are copied and
+    re-running after adding items only moves the new ones.
+
+    Returns
+    -------
+    dict
+        Item counts per split.
+    """
+    groups = load_groups(dedup_report) if dedup_report else {}
+    manifest_dir = os.path.join(output_dir, "manifests")
+    parts = [os.path.join(manifest_dir, part) for part in os.listdir(manifest_dir)
+             if part.endswith(".jsonl")]  # Skips temp files of parts still being written
+    records = {}
+    for part in sorted(parts, key=lambda path: (os.path.getmtime(path), path)):
+        with open(part) as f:
+            for line in f:
+                record = json.loads(line)
+                records[record["stem"]] = record  # Parts are read oldest first, so the latest run of an item wins
+
+    splits = {split: [] for split in ratios}
+    for stem in sorted(records):
+        split = assign_split(groups.get(stem, stem), ratios)
+        records[stem]["split"] = split
+        splits[split].append(stem)
+
+    def write_lines(lines):
+        def write(path):
+            with open(path, "w") as f:
+                f.writelines(line + "\n" for line in lines)
+        return write
+
+    atomic_write(os.path.join(output_dir, "manifest.jsonl"),
+                 write_lines([json.dumps(records[stem]) for stem in sorted(records)]))
+
+    for method in methods:
+        split_dir = os.path.join(output_dir, "splits", method)
+        os.makedirs(split_dir, exist_ok=True)
+        for split, stems in splits.items():
+            paths = [os.path.abspath(output_paths(output_dir, method, stem)[0]) for stem in stems
+                     if method in records[stem]["boxes"]]
+            atomic_write(os.path.join(split_dir, f"{split}.txt"), write_lines(paths))
+
+        data_yaml = [f"{split}: {os.path.abspath(os.path.join(split_dir, f'{split}.txt'))}" for split in splits]
+        data_yaml += ["nc: 2", "names: ['without_mask','with_mask']"]
+        atomic_write(os.path.join(output_dir, f"{method}.yaml"), write_lines(data_yaml))
+
+    counts = {split: len(stems) for split, stems in splits.items()}
+    logger.info(f"✅ Merged {len(records)} items from {manifest_dir}: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--image-dir", default="data/images")
+    common.add_argument("--annotations-dir", default="data/annotations")
+    common.add_argument("--output-dir", default="data_yolo_sharded")
+    common.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS)
+
+    parser = argparse.ArgumentParser(description="Sharded preprocessing: enqueue, work (queue or hash shard), merge.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", parents=[common])
+    enqueue.add_argument("--queue", required=True, help="SQLite queue on shared storage")
+    enqueue.add_argument("--retry-failed", action="store_true")
+    work = commands.add_parser("work", parents=[common])
+    source = work.add_mutually_exclusive_group(required=True)
+    source.add_argument("--queue", help="SQLite queue on shared storage")
+    source.add_argument("--shard", type=int, help="Hash shard to process, instead of a queue")
+    work.add_argument("--num-shards", type=int, default=1)
+    work.add_argument("--workers", type=int, default=os.cpu_count())
+    work.add_argument("--override", action="store_true")
+    merge_parser = commands.add_parser("merge", parents=[common])
+    merge_parser.add_argument("--dedup-report", default=None, help="Keep near-duplicate clusters in one split")
+    status = commands.add_parser("status")
+    status.add_argument("--queue", required=True, help="SQLite queue on shared storage")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        queue = WorkQueue(args.queue)
+        added = queue.add(list_items(args.image_dir, args.annotations_dir))
+        if args.retry_failed:
+            queue.retry_failed()
+        print(f"Added {added} items, queue: {queue.progress()}")
+    elif args.command == "work" and args.shard is not None:
+        run_shard(args.shard, args.num_shards, args.output_dir, args.image_dir, args.annotations_dir, args.methods,
+                  args.override, args.workers)
+    elif args.command == "work":
+        run_queue_workers(args.queue, args.output_dir, args.image_dir, args.annotations_dir, args.methods,
+                          args.override, args.workers)
+    elif args.command == "merge":
+        print(merge(args.output_dir, args.methods, args.dedup_report))
+    else:
+        print(WorkQueue(args.queue).progress())
+
+#python -m data_processing.sharded enqueue --queue /shared/queue.db
+#python -m data_processing.sharded work --queue /shared/queue.db --output-dir /shared/data_yolo_sharded
+#python -m data_processing.sharded merge --output-dir /shared/data_yolo_sharded --dedup-report dedup.json
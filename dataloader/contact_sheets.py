@@ -0,0 +1,131 @@
+import os
+import math
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from serving.rendering import CLASS_NAMES, draw_yolo_labels
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def read_yolo_labels(label_path):
+    """
+    YOLO label rows of one image, skipping malformed lines. Missing file means no objects.
+    """
+    labels = []
+    if not os.path.exists(label_path):
+        return labels
+    with open(label_path) as f:
+        for line in f:
+            try:
+                values = list(map(float, line.split()))
+            except ValueError:
+                continue
+            if len(values) == 5:
+                labels.append(values)
+    return labels
+
+
+def render_thumbnail(image_path, label_path, thumb_size, names=CLASS_NAMES):
+    """
+    Letterboxed `thumb_size` square thumbnail of an image with its labels and file name drawn on it.
+    """
+    canvas = np.full((thumb_size, thumb_size, 3), 40, dtype=np.uint8)
+    image = cv2.imread(image_path)
+    if image is None:
+        cv2.putText(canvas, "unreadable", (8, thumb_size // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 230), 1,
+                    cv2.LINE_AA)
+    else:
+        # Draw at thumbnail scale: far cheaper than drawing on the full image and shrinking it
+        scale = thumb_size / max(image.shape[:2])
+        width, height = max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))
+        small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        draw_yolo_labels(small, read_yolo_labels(label_path), names, thickness=1, font_scale=0.35)
+        top, left = (thumb_size - height) // 2, (thumb_size - width) // 2
+        canvas[top:top + height, left:left + width] = small
+
+    name = os.path.basename(image_path)
+    cv2.rectangle(canvas, (0, thumb_size - 16), (thumb_size, thumb_size), (0, 0, 0), cv2.FILLED)
+    cv2.putText(canvas, name, (4, thumb_size - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (255, 255, 255), 1, cv2.LINE_AA)
+    return canvas
+
+
+def render_sheet(job):
+    """
+    Renders one contact sheet and writes it to disk. Runs in a worker process.
+
+    Parameters
+    ----------
+    job : tuple
+        `(image_paths, label_paths, output_path, cols, thumb_size, quality)`.
+    """
+    image_paths, label_paths, output_path, cols, thumb_size, quality = job
+    cv2.setNumThreads(1)  # Parallelism comes from the process pool
+
+    rows = math.ceil(len(image_paths) / cols)
+    sheet = np.zeros((rows * thumb_size, cols * thumb_size, 3), dtype=np.uint8)
+    for i, (image_path, label_path) in enumerate(zip(image_paths, label_paths)):
+        row, col = divmod(i, cols)
+        sheet[row * thumb_size:(row + 1) * thumb_size, col * thumb_size:(col + 1) * thumb_size] = \
+            render_thumbnail(image_path, label_path, thumb_size)
+
+    cv2.imwrite(output_path, sheet, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return output_path
+
+
+def make_contact_sheets(image_dir, label_dir, output_dir, cols=8, rows=6, thumb_size=256, workers=None, quality=85,
+                        limit=None):
+    """
+    Renders labelled thumbnails of a dataset split into grid images for label review.
+
+    Sheets are rendered in parallel, one per task, so thousands of samples take seconds.
+
+    Returns
+    -------
+    list of str
+        Paths of the written sheets, in file name order.
+    """
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    if not names:
+        logger.warning(f"⚠️ No images found in {image_dir}")
+        return []
+
+    os.makedirs(output_dir, exist_ok=True)
+    per_sheet = cols * rows
+    jobs = []
+    for number, first in enumerate(range(0, len(names), per_sheet)):
+        chunk = names[first:first + per_sheet]
+        jobs.append(([os.path.join(image_dir, name) for name in chunk],
+                     [os.path.join(label_dir, os.path.splitext(name)[0] + ".txt") for name in chunk],
+                     os.path.join(output_dir, f"sheet_{number:04d}.jpg"), cols, thumb_size, quality))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        paths = list(pool.map(render_sheet, jobs))
+
+    logger.info(f"✅ Rendered {len(names)} samples into {len(paths)} sheets in {output_dir}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render labelled contact sheets of a dataset for review.")
+    parser.add_argument("--image-dir", default="data_yolo/images/resize/train")
+    parser.add_argument("--label-dir", default="data_yolo/labels/resize/train")
+    parser.add_argument("--output-dir", default="contact_sheets")
+    parser.add_argument("--cols", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--thumb-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N images")
+    args = parser.parse_args()
+
+    make_contact_sheets(args.image_dir, args.label_dir, args.output_dir, args.cols, args.rows, args.thumb_size,
+                        args.workers, limit=args.limit)
+
+#python -m dataloader.contact_sheets --image-dir data_yolo/images/resize/train --label-dir data_yolo/labels/resize/train
@@ -1,13 +1,15 @@
 
 import torch
-from torch.utils.data import Dataset,DataLoader
+from torch.utils.data import Dataset
 import cv2
 import os
 import logging
 import matplotlib.pyplot as plt
 from .visualise_images import show_image_with_boxes
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from logging_setup import get_sampled_logger, setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
 
 class CustomYoloDataset(Dataset):
     '''
@@ -38,7 +40,7 @@ class CustomYoloDataset(Dataset):
         # Load image
         image = cv2.imread(img_path)
         if image is None:
-            logging.error(f"Unable to load image at {img_path}")
+            logger.error(f"Unable to load image at {img_path}")
             raise FileNotFoundError(f"Unable to load image at {img_path}")
             
         # Convert BGR to RGB and normalize
@@ -47,7 +49,6 @@ class CustomYoloDataset(Dataset):
         
         label_path = os.path.join(self.label_dir, img_name).replace('.jpg', '.txt').replace('.png', '.txt')
 
-        print(label_path)
         # Load YOLO annotations
         labels = []
         if os.path.exists(label_path):
@@ -65,7 +66,7 @@ class CustomYoloDataset(Dataset):
         #Convert to 2D list to tensor
         labels_tensor = torch.tensor(labels,dtype = torch.float32)
         
-        logging.info(f"Suceesfully loaded image:{img_path} and {label_path}")
+        sampled_logger.info("loaded", "Suceesfully loaded image:%s and %s", img_path, label_path)
 
         return image_tensor, labels_tensor 
 
@@ -93,8 +94,9 @@ if __name__ == "__main__":
     # Initialise the Dataset
     dataset = CustomYoloDataset(method = 'resize')
 
-    # Load the data set
-    dataloader = DataLoader(dataset,batch_size=2,shuffle=True,num_workers=1,collate_fn=custom_collate_fn)
+    # Load the data set: workers decode and collate in the background, batches are prefetched
+    from .prefetch_loader import PrefetchLoader
+    dataloader = PrefetchLoader(dataset,batch_size=2,shuffle=True,num_workers=1,collate_fn=custom_collate_fn)
     
     # Iterate DataLoader 
     for batch_idx,(images, labels) in enumerate(dataloader):
@@ -0,0 +1,145 @@
+import time
+import queue
+import logging
+import threading
+from logging_setup import setup_logging
+
+# torch is imported in PrefetchLoader.__init__, only when it builds the DataLoader, so the
+# prefetching itself can be used (and tested) on any iterable of batches.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+_END = object()  # Marks the end of an epoch in the prefetch queue
+
+
+class _LoaderError:
+    def __init__(self, error):
+        self.error = error
+
+
+class PrefetchLoader:
+    '''
+    DataLoader wrapper that overlaps data loading with training and measures input stalls.
+
+    Worker processes (kept alive across epochs) read, decode and collate batches; a
+    background thread pulls finished batches into a small queue, so while the training
+    loop works on one batch the next ones are already waiting (double buffering with the
+    default `prefetch_batches=2`). Time the loop spends blocked on the queue is recorded
+    as stall time for every epoch.
+
+    Attributes:
+        loader (DataLoader): The wrapped loader.
+        epoch_stats (list): One dict per finished epoch with `batches`, `stall_seconds`,
+            `total_seconds` and `stall_fraction`.
+    '''
+    def __init__(self, dataset=None, batch_size=8, shuffle=True, num_workers=2, collate_fn=None,
+                 prefetch_batches=2, pin_memory=False, prefetch_factor=2, loader=None):
+        '''
+        Parameters
+        ----------
+        collate_fn : callable, optional
+            Defaults to `custom_collate_fn`.
+        loader : iterable, optional
+            An existing DataLoader (or any re-iterable of batches) to prefetch from, instead
+            of building one from `dataset`.
+        '''
+        if loader is None:
+            from torch.utils.data import DataLoader
+            from .mask_dataloader import custom_collate_fn
+
+            loader = DataLoader(
+                dataset,
+                batch_size=batch_size,
+                shuffle=shuffle,
+                num_workers=num_workers,
+                collate_fn=collate_fn or custom_collate_fn,
+                pin_memory=pin_memory,
+                persistent_workers=num_workers > 0,  # Don't respawn workers every epoch
+                prefetch_factor=prefetch_factor if num_workers > 0 else None,
+            )
+        self.loader = loader
+        self.prefetch_batches = prefetch_batches
+        self.epoch_stats = []
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def last_epoch_stats(self):
+        return self.epoch_stats[-1] if self.epoch_stats else None
+
+    def _produce(self, buffer, stop):
+        try:
+            for batch in self.loader:
+                while not stop.is_set():
+                    try:
+                        buffer.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(_END)
+        except Exception as e:
+            buffer.put(_LoaderError(e))
+
+    def __iter__(self):
+        buffer = queue.Queue(maxsize=self.prefetch_batches)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(buffer, stop), name="prefetch", daemon=True)
+
+        epoch_start = time.perf_counter()
+        producer.start()
+        stall_seconds = 0.0
+        batches = 0
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = buffer.get()
+                stall_seconds += time.perf_counter() - wait_start
+
+                if item is _END:
+                    break
+                if isinstance(item, _LoaderError):
+                    logger.error(f"❌ Data loading failed: {item.error}")
+                    raise item.error
+
+                batches += 1
+                yield item
+        finally:
+            # Unblock the producer if the loop stopped early
+            stop.set()
+            while producer.is_alive():
+                try:
+                    buffer.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+
+            total_seconds = time.perf_counter() - epoch_start
+            stats = {
+                "epoch": len(self.epoch_stats) + 1,
+                "batches": batches,
+                "stall_seconds": round(stall_seconds, 3),
+                "total_seconds": round(total_seconds, 3),
+                "stall_fraction": round(stall_seconds / total_seconds, 3) if total_seconds > 0 else 0.0,
+            }
+            self.epoch_stats.append(stats)
+            logger.info(f"📊 Epoch {stats['epoch']}: {batches} batches, waited {stats['stall_seconds']}s on data "
+                        f"({stats['stall_fraction']:.0%} of {stats['total_seconds']}s)")
+
+
+if __name__ == "__main__":
+    from .mask_dataloader import CustomYoloDataset
+
+    dataset = CustomYoloDataset(method='resize')
+    loader = PrefetchLoader(dataset, batch_size=8, num_workers=2)
+
+    # Simulated training step to show whether the loop is input-bound
+    for epoch in range(2):
+        for images, labels in loader:
+            time.sleep(0.01)
+    print(loader.epoch_stats)
+
+#python -m dataloader.prefetch_loader
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# Central logging configuration shared by every module.
+#
+# Records are handed to a queue and written by a listener thread, so the code that logs never
+# blocks on formatting or I/O. Per-item logs in hot paths go through SampledLogger, which only
+# emits a sample of them and keeps counters that are reported as periodic summaries.
+# Worker processes (multiprocessing / ProcessPoolExecutor) log synchronously instead: a forked
+# child doesn't inherit the listener thread, and workers exit without running atexit handlers.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))  # Emit 1 in N per-item logs
+LOG_MAX_PER_SECOND = float(os.getenv("LOG_MAX_PER_SECOND", "10"))  # ... and at most this many per key
+LOG_SUMMARY_INTERVAL = float(os.getenv("LOG_SUMMARY_INTERVAL", "60"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_direct_output = None  # Handler a worker process writes to directly
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, including any `extra=` fields.
+    """
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:  # Already formatted by the queue handler
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge the message arguments here; full formatting happens on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=None, log_format=None, stream=None):
+    """
+    Configures the root logger with a non-blocking queue handler. Safe to call from every module.
+
+    Parameters
+    ----------
+    level : str or int, optional
+        Defaults to the LOG_LEVEL environment variable (INFO).
+    log_format : str, optional
+        "text" or "json". Defaults to the LOG_FORMAT environment variable (text).
+    stream : file-like, optional
+        Where the listener writes, defaults to stderr.
+    """
+    global _listener, _direct_output
+
+    with _setup_lock:
+        if _listener is not None or _direct_output is not None:
+            return
+
+        output = logging.StreamHandler(stream)
+        if (log_format or LOG_FORMAT) == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+
+        if _in_worker_process():
+            _direct_output = output
+            root.addHandler(output)
+            return
+
+        log_queue = queue.SimpleQueue()
+        root.addHandler(_QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def _in_worker_process():
+    # Spawned workers import multiprocessing before running any of our modules
+    multiprocessing = sys.modules.get("multiprocessing")
+    return multiprocessing is not None and multiprocessing.parent_process() is not None
+
+
+def _log_directly_after_fork():
+    """
+    Runs in a forked child: the inherited queue handler would feed a listener thread that no
+    longer exists, so every record would be lost. Write to the listener's output instead.
+    """
+    global _listener, _direct_output, _setup_lock
+
+    _setup_lock = threading.Lock()  # May have been held by another thread at fork time
+    if _listener is None:
+        return
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _direct_output = _listener.handlers[0]
+    _listener = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_log_directly_after_fork)
+
+
+def shutdown_logging():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class SampledLogger:
+    """
+    Rate-limited logging for per-item messages (per box, per file) in hot paths.
+
+    Every call is counted under its key. A message is only formatted and emitted for the
+    first of every `every_n` calls and at most `max_per_second` times per second per key;
+    everything else just increments counters, which are logged as one summary line every
+    `summary_interval` seconds (and on `flush_summary()`).
+
+    Messages use lazy %-style arguments so suppressed calls never pay for formatting:
+    `sampled.info("box", "Box at %s %s", top_left, bottom_right)`.
+    """
+    def __init__(self, logger, every_n=LOG_SAMPLE_EVERY, max_per_second=LOG_MAX_PER_SECOND,
+                 summary_interval=LOG_SUMMARY_INTERVAL):
+        self.logger = logger
+        self.every_n = max(1, every_n)
+        self.max_per_second = max_per_second
+        self.summary_interval = summary_interval
+        self.counts = {}
+        self.emitted = {}
+        self._window = {}
+        self._last_summary = time.monotonic()
+        self._lock = threading.Lock()
+
+    def log(self, key, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+
+            emit = (count - 1) % self.every_n == 0
+            if emit and self.max_per_second:
+                window_start, in_window = self._window.get(key, (now, 0))
+                if now - window_start >= 1.0:
+                    window_start, in_window = now, 0
+                emit = in_window < self.max_per_second
+                self._window[key] = (window_start, in_window + emit)
+
+            if emit:
+                self.emitted[key] = self.emitted.get(key, 0) + 1
+            summary_due = now - self._last_summary >= self.summary_interval
+
+        if emit:
+            self.logger.log(level, msg, *args, stacklevel=3, **kwargs)
+        if summary_due:
+            self.flush_summary()
+
+    def debug(self, key, msg, *args, **kwargs):
+        self.log(key, logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, key, msg, *args, **kwargs):
+        self.log(key, logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, key, msg, *args, **kwargs):
+        self.log(key, logging.WARNING, msg, *args, **kwargs)
+
+    def flush_summary(self):
+        """
+        Logs the per-key counters accumulated since the last summary and resets them.
+        """
+        with self._lock:
+            counts, emitted = self.counts, self.emitted
+            self.counts, self.emitted = {}, {}
+            self._last_summary = time.monotonic()
+
+        if counts:
+            summary = {key: {"count": count, "logged": emitted.get(key, 0)} for key, count in counts.items()}
+            self.logger.info("📊 Log summary %s", summary, extra={"log_summary": summary})
+
+
+def get_sampled_logger(name, **kwargs):
+    """
+    Returns a SampledLogger around `logging.getLogger(name)`.
+    """
+    return SampledLogger(logging.getLogger(name), **kwargs)
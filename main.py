@@ -1,67 +1,352 @@
-from fastapi import FastAPI,UploadFile,File,HTTPException
-from ultralytics import YOLO
-import torch
+from fastapi import FastAPI,UploadFile,File,HTTPException,Header,Query
+from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 import os
+import time
 import logging
-from data_processing.resize_images import resize_image_with_annotations
-import cv2
-import numpy as np
-from fastapi.responses import FileResponse
+import threading
+from serving.backends import VALID_MODEL_EXTENSIONS, decode_image, load_backend
+from serving.tiling import tiled_predict
+from serving.cascade import PROPOSAL_MAX_SIDE, FaceProposer, cascade_predict
+from serving.scheduler import InferenceScheduler, DeadlineExceeded, LoadShed, PRIORITIES, request_deadline
+from serving.adaptive import AdaptiveController, load_tiers
+from serving.autotune import AUTOTUNE_CONFIG, autotune, load_config, save_config, apply_config
+from serving.detection_store import BUCKETS, DETECTIONS_DB, DetectionStore
+from serving.rendering import IMAGE_FORMATS, MEDIA_TYPES, render_detections
+from serving.memory_debug import MemoryTracker
+from serving.shadow import SHADOW_MODEL_PATH, ShadowEvaluator
+from serving.buffer_pool import buffer_pool
+from logging_setup import get_sampled_logger, setup_logging
 
+# torch / ultralytics / cv2 are only imported by serving.backends once the model is loaded
+# in the background, so the server can bind its port and answer /health straight away.
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
 
 app = FastAPI()
 
-MODEL_PATH = "best.pt"
+MODEL_PATH = os.getenv("MODEL_PATH", "best.pt")  # best.pt or an exported best.torchscript
+LIGHT_MODEL_PATH = os.getenv("LIGHT_MODEL_PATH")  # Optional lighter model served by degraded tiers
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "2"))
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "full")  # Default mode when a request doesn't pick one
+INFERENCE_MODES = ["full", "tiled", "cascade"]
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "64"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+DEFAULT_MAX_AGE_MS = float(os.getenv("DEFAULT_MAX_AGE_MS", "0")) or None  # Deadline for clients that send none
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "1") == "1"
+AUTOTUNE_ON_STARTUP = os.getenv("AUTOTUNE_ON_STARTUP", "0") == "1"  # Tune when no config matches this node
+STORE_DETECTIONS = os.getenv("STORE_DETECTIONS", "0") == "1"  # Persist detections to DETECTIONS_DB for reports
+# Live clients downscale and JPEG-encode frames as advertised by /client_config
+CLIENT_JPEG_QUALITY = float(os.getenv("CLIENT_JPEG_QUALITY", "0.7"))
+CLIENT_MIN_JPEG_QUALITY = float(os.getenv("CLIENT_MIN_JPEG_QUALITY", "0.4"))
+CLIENT_MAX_JPEG_QUALITY = float(os.getenv("CLIENT_MAX_JPEG_QUALITY", "0.9"))
+CLIENT_TARGET_RTT_MS = float(os.getenv("CLIENT_TARGET_RTT_MS", "300"))
+CLIENT_FRAME_INTERVAL_MS = float(os.getenv("CLIENT_FRAME_INTERVAL_MS", "500"))
+MEMORY_DEBUG = os.getenv("MEMORY_DEBUG", "0") == "1"  # Enables tracemalloc and /debug/memory (slows the server)
+SHADOW_SHED_QUEUE = int(os.getenv("SHADOW_SHED_QUEUE", "2"))  # Shadow sampling pauses at this primary queue depth
 
-if not MODEL_PATH.endswith(".pt"):
-    logger.error(f"❌ File must be a .pt file, MODEL PATH was {MODEL_PATH}")
-    raise ValueError(f"❌ File must be a .pt file, MODEL PATH was {MODEL_PATH}")
+if not MODEL_PATH.endswith(VALID_MODEL_EXTENSIONS):
+    logger.error(f"❌ File must be one of {VALID_MODEL_EXTENSIONS}, MODEL PATH was {MODEL_PATH}")
+    raise ValueError(f"❌ File must be one of {VALID_MODEL_EXTENSIONS}, MODEL PATH was {MODEL_PATH}")
 
 if not os.path.exists(MODEL_PATH):
-    logger.error("f❌ Model file not found: {MODEL_PATH}")
+    logger.error(f"❌ Model file not found: {MODEL_PATH}")
     raise FileNotFoundError(f"❌ Model file not found: {MODEL_PATH}")
 
-try:
-    model = YOLO(MODEL_PATH)
-    logger.info(f"✅ YOLO model loaded successfully: {MODEL_PATH}")
-except Exception as e:
-    logger.critical(f"🚨 Failed to load model: {e}")
-    raise SystemExit(e) 
+# Shared server state, filled in by the background loader
+state = {"backend": None, "light_backend": None, "proposer": None, "ready": False, "error": None,
+         "startup_seconds": None, "autotune": None, "memory": None, "shadow": None}
+
+# Every inference goes through this earliest-deadline-first queue
+scheduler = InferenceScheduler(max_queue=MAX_QUEUE, workers=INFERENCE_WORKERS)
+# Picks the quality tier (input size, confidence, model) from queue depth and recent latency
+controller = AdaptiveController(
+    load_tiers(),
+    high_queue=int(os.getenv("ADAPTIVE_HIGH_QUEUE", "8")),
+    low_queue=int(os.getenv("ADAPTIVE_LOW_QUEUE", "1")),
+    high_latency_ms=float(os.getenv("ADAPTIVE_HIGH_LATENCY_MS", "400")),
+    low_latency_ms=float(os.getenv("ADAPTIVE_LOW_LATENCY_MS", "150")),
+    min_samples=int(os.getenv("ADAPTIVE_MIN_SAMPLES", "10")),
+    enabled=ADAPTIVE_QUALITY,
+)
+# Detections are queued here and written to SQLite in batches by a background thread
+store = DetectionStore(DETECTIONS_DB) if STORE_DETECTIONS else None
+
+
+def load_model():
+    start = time.perf_counter()
+    try:
+        config = load_config(AUTOTUNE_CONFIG, MODEL_PATH)
+        if config is None and AUTOTUNE_ON_STARTUP:
+            config = autotune(MODEL_PATH)
+            save_config(config, AUTOTUNE_CONFIG)
+
+        backend = load_backend(MODEL_PATH, fuse=config["fuse"] if config else True)
+        if config:
+            apply_config(backend, config)
+            state["autotune"] = {k: v for k, v in config.items() if k != "measurements"}
+        backend.warmup(runs=WARMUP_RUNS)
+        state["backend"] = backend
+        if LIGHT_MODEL_PATH:
+            light_backend = load_backend(LIGHT_MODEL_PATH)
+            if config:
+                light_backend.configure(inference_mode=config["inference_mode"], channels_last=config["channels_last"])
+            light_backend.warmup(runs=WARMUP_RUNS)
+            state["light_backend"] = light_backend
+        state["proposer"] = FaceProposer() #Face proposals for mode=cascade
+        if SHADOW_MODEL_PATH:
+            load_shadow_model(config)
+        state["startup_seconds"] = round(time.perf_counter() - start, 3)
+        state["ready"] = True
+        logger.info(f"✅ YOLO model loaded and warmed up in {state['startup_seconds']}s: {MODEL_PATH}")
+    except Exception as e:
+        state["error"] = str(e)
+        logger.critical(f"🚨 Failed to load model: {e}")
+
+
+def load_shadow_model(config):
+    # A broken candidate must never take the primary model down with it
+    try:
+        shadow_backend = load_backend(SHADOW_MODEL_PATH)
+        if config:
+            shadow_backend.configure(inference_mode=config["inference_mode"], channels_last=config["channels_last"])
+        shadow_backend.warmup(runs=WARMUP_RUNS)
+        shadow = ShadowEvaluator(shadow_backend, predict_boxes, overloaded=primary_overloaded)
+        shadow.start()
+        state["shadow"] = shadow
+        logger.info(f"✅ Shadow model loaded: {SHADOW_MODEL_PATH} (sample rate {shadow.sample_rate})")
+    except Exception as e:
+        logger.error(f"❌ Failed to load shadow model {SHADOW_MODEL_PATH}, shadow evaluation disabled: {e}")
+
+
+def primary_overloaded():
+    # Shadow work is the first thing shed: any backlog or a degraded quality tier stops it
+    return scheduler.queue_depth >= SHADOW_SHED_QUEUE or controller.level > 0
+
+
+@app.on_event("startup")
+async def start_model_loading():
+    if MEMORY_DEBUG:
+        state["memory"] = MemoryTracker() # Before loading, so the model shows up in the growth report
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+    scheduler.start()
+    if store:
+        store.start()
+
+
+@app.on_event("shutdown")
+async def flush_detection_store():
+    if store:
+        store.close()
+
 
 @app.get("/")
 async def serve_frontend():
     return FileResponse("frontend.html")
 
 
+@app.get("/health")
+async def health():
+    # Liveness: only fails if the model could not be loaded at all
+    if state["error"]:
+        return JSONResponse(status_code=500, content={"status": "error", "detail": state["error"]})
+    return {"status": "ok"}
 
-@app.post("/detect_mask")
-async def detect_mask(file: UploadFile = File()):
+
+@app.get("/ready")
+async def ready():
+    # Readiness: flips once the model is loaded and warmed up
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, "error": state["error"]})
+    return {"ready": True, "model": MODEL_PATH, "startup_seconds": state["startup_seconds"],
+            "autotune": state["autotune"]}
+
+
+@app.get("/stats")
+async def stats():
+    return {"scheduler": scheduler.snapshot(), "adaptive": controller.snapshot(),
+            "store": store.snapshot() if store else None,
+            "shadow": state["shadow"].snapshot() if state["shadow"] else None,
+            "buffer_pool": buffer_pool.snapshot() if buffer_pool else None}
+
+
+@app.get("/stats/shadow")
+async def shadow_stats():
+    if state["shadow"] is None:
+        raise HTTPException(status_code=404, detail="❌ No shadow model is running (set SHADOW_MODEL_PATH).")
+    return state["shadow"].snapshot()
+
+
+@app.get("/debug/memory")
+def debug_memory(top: int = Query(20, ge=0, le=200), tensors: bool = False):
+    # Plain def: snapshots take a while, FastAPI runs this in its thread pool
+    if state["memory"] is None:
+        raise HTTPException(status_code=404, detail="❌ Memory debugging is disabled (MEMORY_DEBUG=0).")
+    return state["memory"].snapshot(top=top, count_tensors=tensors)
+
+
+@app.post("/debug/memory/baseline")
+def reset_memory_baseline():
+    if state["memory"] is None:
+        raise HTTPException(status_code=404, detail="❌ Memory debugging is disabled (MEMORY_DEBUG=0).")
+    state["memory"].reset_baseline()
+    return {"baseline": "reset"}
+
+
+@app.get("/client_config")
+async def client_config(mode: str = INFERENCE_MODE):
+    # Frames larger than what the model looks at only cost bandwidth and decode time
+    if mode not in INFERENCE_MODES:
+        raise HTTPException(status_code=400, detail=f"❌ mode must be one of {INFERENCE_MODES}")
+    if not state["ready"]:
+        raise HTTPException(status_code=503, detail="⏳ Model is still loading.")
+
+    # full: letterboxed to the model input size; cascade: faces are proposed on a downscaled frame;
+    # tiled: needs the full resolution, that's the point of tiling
+    max_side = {"full": state["backend"].imgsz, "cascade": PROPOSAL_MAX_SIDE, "tiled": None}[mode]
+    return {"mode": mode, "max_side": max_side, "encoding": "image/jpeg", "jpeg_quality": CLIENT_JPEG_QUALITY,
+            "min_jpeg_quality": CLIENT_MIN_JPEG_QUALITY, "max_jpeg_quality": CLIENT_MAX_JPEG_QUALITY,
+            "target_rtt_ms": CLIENT_TARGET_RTT_MS, "frame_interval_ms": CLIENT_FRAME_INTERVAL_MS}
+
+
+@app.get("/reports/label_share")
+def label_share(label: str = "without_mask", bucket: str = "hour", start: float = None, end: float = None,
+                camera: str = None, by_camera: bool = False):
+    # Plain def: FastAPI runs it in its thread pool, so the SQLite read doesn't block the event loop
+    if not store:
+        raise HTTPException(status_code=404, detail="❌ Detection storage is disabled, enable it with STORE_DETECTIONS=1.")
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"❌ bucket must be one of {list(BUCKETS)}")
+    return {"label": label, "bucket": bucket,
+            "periods": store.label_share(label, bucket, start, end, camera, by_camera)}
+
+
+@app.get("/reports/recent")
+def recent_detections(limit: int = Query(100, ge=1, le=1000), camera: str = None, label: str = None):
+    if not store:
+        raise HTTPException(status_code=404, detail="❌ Detection storage is disabled, enable it with STORE_DETECTIONS=1.")
+    return {"detections": store.recent(limit, camera, label)}
+
+
+def predict_boxes(backend, image, mode, imgsz, conf, bgr=False):
+    """
+    Runs one model on a decoded image in the given mode. The image is RGB, or BGR with `bgr=True` (mode full only).
+
+    Returns
+    -------
+    tuple (np.ndarray, bool)
+        (N, 6) detections with rows `x1, y1, x2, y2, confidence, class_id`, and whether
+        cascade mode fell back to a full-frame pass.
+    """
+    if mode == "tiled":
+        return tiled_predict(backend, image, conf=conf, imgsz=imgsz), False #Overlapping tiles in one batch, merged with NMS
+    if mode == "cascade":
+        return cascade_predict(backend, image, state["proposer"], conf=conf, full_imgsz=imgsz) #Face crops in one batch
+    return backend.predict([image], imgsz=imgsz, conf=conf, bgr=bgr)[0], False
+
+
+def run_detection(image_bytes, mode, tier, keep_image=False):
+    """
+    Decodes an uploaded image and runs detection in the requested mode and quality tier. Runs on an inference thread.
+
+    With `keep_image` the decoded RGB image is returned along with the response, for rendering.
+    """
+    backend = state["backend"]
+    if tier["model"] == "light" and state["light_backend"] is not None:
+        backend = state["light_backend"]
+    imgsz, conf = tier["imgsz"], tier["conf"]
+
+    # Full-frame inference keeps OpenCV's BGR and swaps channels while filling the model input;
+    # tiles, face crops and rendering need the RGB frame
+    bgr = mode == "full" and not keep_image
+    image = decode_image(image_bytes, rgb=not bgr) #Bytes -> RGB/BGR
+    if image is None:
+        raise HTTPException(status_code=400, detail="❌ Could not decode image.")
+
+    start = time.perf_counter()
+    boxes, fallback = predict_boxes(backend, image, mode, imgsz, conf, bgr)
+    if state["shadow"] is not None:
+        # Only a sampled, non-blocking enqueue; the candidate runs on its own thread
+        state["shadow"].offer(image, boxes, mode, imgsz, conf, (time.perf_counter() - start) * 1000, bgr)
+
+    detections = []
+    for box in boxes:
+        x1, y1, x2, y2 = map(int, box[:4]) #Box pos
+        confidence = round(float(box[4]), 2) #Confidence
+        cls = int(box[5])
+        label = backend.names[cls] #Mask or no mask detected
+
+        sampled_logger.info("box", "Box at %s %s", (x1,y1), (x2,y2))
+        detections.append({
+            "label": label,
+            "confidence": confidence,
+            "bbox":[x1, y1, x2, y2]
+        })
+
+    response = {"detections":detections, "mode": "full" if fallback else mode, "tier": tier["name"]}
+    return (response, image) if keep_image else response
+
+
+async def schedule_detection(file, mode, x_deadline_ms, x_max_age_ms, x_priority, x_camera_id, keep_image=False):
+    """
+    Validates a detection request and runs it through the scheduler. Shared by /detect_mask and /detect_mask/render.
+    """
     if file.content_type not in ["image/jpeg", "image/jpg", "image/png"]:
         raise HTTPException(status_code=400, detail="❌ Only JPEG, JPG, or PNG files are allowed.")
 
+    if mode not in INFERENCE_MODES:
+        raise HTTPException(status_code=400, detail=f"❌ mode must be one of {INFERENCE_MODES}")
+
+    if x_priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"❌ X-Priority must be one of {list(PRIORITIES)}")
+
+    try:
+        deadline = request_deadline(x_deadline_ms, x_max_age_ms, DEFAULT_MAX_AGE_MS)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="❌ X-Deadline-Ms and X-Max-Age-Ms must be numbers.")
+
+    if not state["ready"]:
+        raise HTTPException(status_code=503, detail="⏳ Model is still loading.")
+
     image_bytes = await file.read() #Image -> bytes
-    nparr = np.frombuffer(image_bytes, np.uint8) #Bytes -> Numpy arr
-    image_bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR) #BGR
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB) #BGR -> RGB
 
-    results = model(image_rgb)
+    start = time.perf_counter()
+    tier = controller.update(scheduler.queue_depth)
+    try:
+        result = await scheduler.submit(lambda: run_detection(image_bytes, mode, tier, keep_image), deadline, x_priority)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"⌛ Request dropped: {e}")
+    except LoadShed as e:
+        raise HTTPException(status_code=503, detail=f"🚦 Request shed under load: {e}")
 
-    detections = []
-    for result in results:
-        for box in result.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist()) #Box pos
-            conf = round(box.conf[0].item(), 2) #Confidence
-            cls = int(box.cls[0].item()) 
-            label = result.names[cls] #Mask or no mask detected
-
-            logging.info(f"Box at {(x1,y1)} {(x2,y2)}")
-            detections.append({
-                "label": label,
-                "confidence": conf,
-                "bbox":[x1, y1, x2, y2]
-            })
-
-    return {"detections":detections}
\ No newline at end of file
+    controller.record((time.perf_counter() - start) * 1000)
+    response = result[0] if keep_image else result
+    if store:
+        store.add(x_camera_id, response["detections"], mode=response["mode"])
+    return result
+
+
+@app.post("/detect_mask")
+async def detect_mask(file: UploadFile = File(), mode: str = INFERENCE_MODE,
+                      x_deadline_ms: str = Header(None), x_max_age_ms: str = Header(None),
+                      x_priority: str = Header("live"), x_camera_id: str = Header("unknown")):
+    return await schedule_detection(file, mode, x_deadline_ms, x_max_age_ms, x_priority, x_camera_id)
+
+
+@app.post("/detect_mask/render")
+async def detect_mask_render(file: UploadFile = File(), mode: str = INFERENCE_MODE, format: str = "jpeg",
+                             quality: int = Query(85, ge=1, le=100),
+                             x_deadline_ms: str = Header(None), x_max_age_ms: str = Header(None),
+                             x_priority: str = Header("live"), x_camera_id: str = Header("unknown")):
+    if format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"❌ format must be one of {list(IMAGE_FORMATS)}")
+
+    response, image_rgb = await schedule_detection(file, mode, x_deadline_ms, x_max_age_ms, x_priority, x_camera_id,
+                                                   keep_image=True)
+    # Drawn and encoded outside the inference queue so rendering doesn't hold up the model
+    content = await run_in_threadpool(render_detections, image_rgb, response["detections"], format, quality)
+    return Response(content=content, media_type=MEDIA_TYPES[format],
+                    headers={"X-Detections": str(len(response["detections"])), "X-Mode": response["mode"],
+                             "X-Tier": response["tier"]})
@@ -0,0 +1,254 @@
+import os
+import copy
+import logging
+import argparse
+
+import mlflow
+import torch
+import torch.nn.functional as F
+import torch_pruning as tp
+from ultralytics import YOLO
+from ultralytics.nn.modules import Detect
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from .sweep import write_data_yaml
+from serving.backends import load_backend
+from serving.autotune import time_inference
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+def count_macs(model, imgsz):
+    example_inputs = torch.randn(1, 3, imgsz, imgsz)
+    macs, params = tp.utils.count_ops_and_params(model, example_inputs)
+    return macs, params
+
+
+def prune_model(model, target_flops_ratio, imgsz=224, iterative_steps=20, max_pruning_ratio=0.9):
+    """
+    Structured L2-magnitude channel pruning of a DetectionModel down to a target share of its FLOPs.
+
+    Channels are removed for real (smaller Conv/BN layers), not masked, so the pruned model
+    is faster on CPU. The Detect head is left intact so outputs keep the same layout.
+
+    Parameters
+    ----------
+    model : ultralytics.nn.tasks.DetectionModel
+        Model to prune, it is not modified.
+    target_flops_ratio : float
+        Pruned FLOPs / original FLOPs, e.g. 0.5.
+
+    Returns
+    -------
+    tuple (DetectionModel, dict)
+        The pruned copy and `{"base_macs", "macs", "base_params", "params", "flops_ratio"}`.
+    """
+    model = copy.deepcopy(model).float().eval()
+    for parameter in model.parameters():
+        parameter.requires_grad_(True)
+
+    example_inputs = torch.randn(1, 3, imgsz, imgsz)
+    base_macs, base_params = tp.utils.count_ops_and_params(model, example_inputs)
+    ignored_layers = [module for module in model.modules() if isinstance(module, Detect)]
+
+    pruner = tp.pruner.MagnitudePruner(
+        model,
+        example_inputs,
+        importance=tp.importance.MagnitudeImportance(p=2),
+        iterative_steps=iterative_steps,
+        pruning_ratio=max_pruning_ratio,
+        ignored_layers=ignored_layers,
+    )
+
+    macs, params = base_macs, base_params
+    for step in range(iterative_steps):
+        pruner.step()
+        macs, params = tp.utils.count_ops_and_params(model, example_inputs)
+        logger.info(f"✂️ Step {step + 1}: {macs / base_macs:.2%} FLOPs, {params / base_params:.2%} params")
+        if macs <= target_flops_ratio * base_macs:
+            break
+
+    stats = {"base_macs": base_macs, "macs": macs, "base_params": base_params, "params": params,
+             "flops_ratio": macs / base_macs}
+    return model, stats
+
+
+class DistillationLoss:
+    """
+    Detection loss plus knowledge distillation from the unpruned teacher's head outputs.
+
+    For every detection level the student matches the teacher's class scores (temperature
+    scaled sigmoid targets) and box distributions (KL divergence over the DFL bins).
+
+    Attributes:
+        base (callable): The model's own detection criterion.
+        teacher (torch.nn.Module): Frozen teacher in eval mode.
+        alpha (float): Weight of the distillation term.
+        temperature (float): Softening temperature.
+    """
+    def __init__(self, base, teacher, reg_max, alpha=1.0, temperature=2.0):
+        self.base = base
+        self.teacher = teacher
+        self.reg_max = reg_max
+        self.alpha = alpha
+        self.temperature = temperature
+
+    def distillation_term(self, student_feats, teacher_feats):
+        T = self.temperature
+        loss = 0.0
+        for student, teacher in zip(student_feats, teacher_feats):
+            batch, channels, height, width = student.shape
+            box_channels = 4 * self.reg_max
+            s_box, s_cls = student.split((box_channels, channels - box_channels), 1)
+            t_box, t_cls = teacher.split((box_channels, channels - box_channels), 1)
+
+            loss = loss + F.binary_cross_entropy_with_logits(s_cls / T, torch.sigmoid(t_cls / T)) * T * T
+
+            s_box = s_box.view(batch, 4, self.reg_max, height, width)
+            t_box = t_box.view(batch, 4, self.reg_max, height, width)
+            loss = loss + F.kl_div(F.log_softmax(s_box / T, dim=2), F.softmax(t_box / T, dim=2),
+                                   reduction="batchmean") * T * T / (height * width)
+        return loss
+
+    def __call__(self, preds, batch):
+        loss, loss_items = self.base(preds, batch)
+
+        with torch.no_grad():
+            teacher_out = self.teacher(batch["img"])
+        teacher_feats = teacher_out[1] if isinstance(teacher_out, tuple) else teacher_out
+
+        kd = self.alpha * self.distillation_term(preds, teacher_feats) * batch["img"].shape[0]
+        # Depending on the ultralytics version the base loss is a scalar or one value per loss component
+        loss = loss + (kd if loss.dim() == 0 else kd / loss.numel())
+        return loss, loss_items
+
+
+class DistillationTrainer(DetectionTrainer):
+    """
+    DetectionTrainer that trains a given (pruned) student with a distillation loss.
+
+    `student`, `teacher`, `alpha` and `temperature` are set on the class before calling
+    `YOLO.train(trainer=DistillationTrainer, ...)`, since ultralytics builds the trainer itself.
+    """
+    student = None
+    teacher = None
+    alpha = 1.0
+    temperature = 2.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Attach the distillation loss only while training batches, so checkpoints saved
+        # after each epoch don't pickle the teacher along with the student
+        self.add_callback("on_train_epoch_start", self._attach_distillation)
+        self.add_callback("on_train_epoch_end", self._detach_distillation)
+
+    def get_model(self, cfg=None, weights=None, verbose=True):
+        return self.student
+
+    @staticmethod
+    def _attach_distillation(trainer):
+        model = trainer.model
+        base = model.init_criterion()
+        reg_max = model.model[-1].reg_max
+        model.criterion = DistillationLoss(base, trainer.teacher, reg_max, trainer.alpha, trainer.temperature)
+
+    @staticmethod
+    def _detach_distillation(trainer):
+        trainer.model.criterion = None
+
+
+def measure_latency_ms(model_path, imgsz, runs=20):
+    backend = load_backend(model_path, imgsz=imgsz)
+    backend.configure(threads=torch.get_num_threads())
+    return time_inference(backend, imgsz, batch_size=1, runs=runs) * 1000
+
+
+def validate(model_path, data_yaml, imgsz, split="test"):
+    metrics = YOLO(model_path).val(data=data_yaml, imgsz=imgsz, split=split, batch=8, plots=False)
+    return {"mAP_0.5": float(metrics.box.map50), "mAP_0_5_0_95": float(metrics.box.map)}
+
+
+def compress(teacher_path, method="resize_pad", flops_ratios=(0.5,), epochs=30, imgsz=224, batch=8, lr0=0.001,
+             alpha=1.0, temperature=2.0, experiment_name="yolo_v3_mini_compression", project="runs/compress"):
+    """
+    Prunes the trained model at each FLOPs ratio, fine-tunes with distillation and logs each variant to MLflow.
+
+    Every variant is logged with its FLOPs/params, test mAP and single-image CPU latency,
+    next to a baseline run for the unpruned teacher.
+
+    Returns
+    -------
+    list of dict
+        One summary per variant (teacher first).
+    """
+    data_yaml = write_data_yaml(method, os.path.join(project, "_data"))
+    teacher = YOLO(teacher_path).model.float().eval()
+    for parameter in teacher.parameters():
+        parameter.requires_grad_(False)
+
+    mlflow.set_experiment(experiment_name=experiment_name)
+    summaries = []
+
+    base_latency = measure_latency_ms(teacher_path, imgsz)
+    with mlflow.start_run(run_name="teacher"):
+        macs, params = count_macs(teacher, imgsz)
+        metrics = {**validate(teacher_path, data_yaml, imgsz), "latency_ms": base_latency, "speedup": 1.0}
+        mlflow.log_params({"model": teacher_path, "method": method, "imgsz": imgsz, "flops_ratio": 1.0,
+                           "macs": macs, "params": params})
+        mlflow.log_metrics(metrics)
+        summaries.append({"name": "teacher", "path": teacher_path, **metrics})
+
+    for ratio in flops_ratios:
+        name = f"pruned_{int(ratio * 100)}"
+        student, stats = prune_model(teacher, ratio, imgsz)
+
+        DistillationTrainer.student = student
+        DistillationTrainer.teacher = teacher
+        DistillationTrainer.alpha = alpha
+        DistillationTrainer.temperature = temperature
+
+        with mlflow.start_run(run_name=name):
+            mlflow.log_params({"teacher": teacher_path, "method": method, "imgsz": imgsz, "target_flops_ratio": ratio,
+                               "flops_ratio": round(stats["flops_ratio"], 4), "macs": stats["macs"],
+                               "params": stats["params"], "epochs": epochs, "batch": batch, "lr0": lr0,
+                               "kd_alpha": alpha, "kd_temperature": temperature})
+
+            results = YOLO(teacher_path).train(trainer=DistillationTrainer, data=data_yaml, epochs=epochs,
+                                               imgsz=imgsz, batch=batch, lr0=lr0, optimizer="Adam",
+                                               project=project, name=name, exist_ok=True, amp=False)
+            best_model_path = os.path.join(results.save_dir, "weights", "best.pt")
+
+            latency = measure_latency_ms(best_model_path, imgsz)
+            metrics = {**validate(best_model_path, data_yaml, imgsz), "latency_ms": latency,
+                       "speedup": base_latency / latency}
+            mlflow.log_metrics(metrics)
+            mlflow.log_artifact(best_model_path, artifact_path="YOLO_Model")
+            summaries.append({"name": name, "path": best_model_path, **metrics})
+            logger.info(f"✅ {name}: {metrics}")
+
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Structured pruning + distillation of the mask detector.")
+    parser.add_argument("--model", default="best.pt")
+    parser.add_argument("--method", default="resize_pad")
+    parser.add_argument("--flops-ratio", nargs="+", type=float, default=[0.5])
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--imgsz", type=int, default=224)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--lr0", type=float, default=0.001)
+    parser.add_argument("--alpha", type=float, default=1.0)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--experiment", default="yolo_v3_mini_compression")
+    args = parser.parse_args()
+
+    summaries = compress(args.model, args.method, args.flops_ratio, args.epochs, args.imgsz, args.batch, args.lr0,
+                         args.alpha, args.temperature, args.experiment)
+    print(f"\n{'variant':<14}{'mAP50':>8}{'mAP50-95':>10}{'latency ms':>12}{'speedup':>9}")
+    for s in summaries:
+        print(f"{s['name']:<14}{s['mAP_0.5']:>8.3f}{s['mAP_0_5_0_95']:>10.3f}{s['latency_ms']:>12.2f}{s['speedup']:>9.2f}")
+
+#python -m model.yolo_v3_mini.compress --model best.pt --flops-ratio 0.5 0.35
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+from logging_setup import setup_logging
+
+# torch / cv2 are only needed to run the model, they are imported lazily in run_inference so the
+# metric functions can be used (and tested) on cached predictions alone.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# Box size buckets as a fraction of image area: COCO's 32² and 96² pixel limits scaled to a 640 image
+SIZE_RANGES = {"small": (0.0, (32 / 640) ** 2), "medium": ((32 / 640) ** 2, (96 / 640) ** 2), "large": ((96 / 640) ** 2, float("inf"))}
+IMAGE_EXTENSIONS = (".jpg", ".png")
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two sets of xyxy boxes.
+
+    Returns
+    -------
+    np.ndarray
+        A (len(boxes_a), len(boxes_b)) IoU matrix.
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Marks each prediction as a true positive at every IoU threshold.
+
+    Matching is greedy by IoU: every ground truth box is matched to at most one prediction
+    of the same class, and every prediction to at most one ground truth box.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean (num_predictions, num_thresholds) array.
+    """
+    correct = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    if len(pred_boxes) == 0 or len(gt_boxes) == 0:
+        return correct
+
+    iou = box_iou(gt_boxes, pred_boxes) * (gt_classes[:, None] == pred_classes[None, :])
+    for t, threshold in enumerate(iou_thresholds):
+        gt_index, pred_index = np.nonzero(iou >= threshold)
+        if len(gt_index) == 0:
+            continue
+        # Highest IoU first, then keep the first occurrence of each prediction and of each ground truth
+        order = np.argsort(-iou[gt_index, pred_index], kind="stable")
+        gt_index, pred_index = gt_index[order], pred_index[order]
+        _, first = np.unique(pred_index, return_index=True)
+        gt_index, pred_index = gt_index[first], pred_index[first]
+        _, first = np.unique(gt_index, return_index=True)
+        correct[pred_index[first], t] = True
+
+    return correct
+
+
+def average_precision(recall, precision):
+    """
+    COCO-style 101-point interpolated average precision for each column of recall/precision curves.
+    """
+    envelope = np.flip(np.maximum.accumulate(np.flip(precision, axis=0), axis=0), axis=0)
+    recall_points = np.linspace(0, 1, 101)
+    ap = np.zeros(recall.shape[1])
+    for t in range(recall.shape[1]):
+        index = np.searchsorted(recall[:, t], recall_points, side="left")
+        valid = index < len(recall)
+        ap[t] = envelope[index[valid], t].sum() / len(recall_points)
+    return ap
+
+
+def compute_metrics(correct, confidences, pred_classes, gt_classes, class_ids, conf_threshold=0.25):
+    """
+    Computes precision, recall, F1 (at `conf_threshold`, IoU 0.5) and mAP per class from matched predictions.
+
+    Parameters
+    ----------
+    correct : np.ndarray
+        (num_predictions, num_thresholds) true positive flags from `match_predictions`.
+    confidences, pred_classes : np.ndarray
+        Confidence and class of every prediction.
+    gt_classes : np.ndarray
+        Class of every ground truth box.
+    class_ids : iterable of int
+        Classes to report.
+
+    Returns
+    -------
+    dict
+        `{"per_class": {class_id: metrics}, "overall": metrics}`; overall values are averaged
+        over classes that have ground truth boxes.
+    """
+    order = np.argsort(-confidences, kind="stable")
+    correct, confidences, pred_classes = correct[order], confidences[order], pred_classes[order]
+
+    per_class = {}
+    for class_id in class_ids:
+        num_gt = int((gt_classes == class_id).sum())
+        mask = pred_classes == class_id
+        class_correct = correct[mask]
+
+        if num_gt == 0:
+            per_class[class_id] = {"num_gt": 0, "num_pred": int(mask.sum()), "precision": 0.0, "recall": 0.0,
+                                   "F1_Score": 0.0, "mAP_0.5": 0.0, "mAP_0_5_0_95": 0.0}
+            continue
+
+        true_positives = np.cumsum(class_correct, axis=0)
+        false_positives = np.cumsum(~class_correct, axis=0)
+        recall = true_positives / num_gt
+        precision = true_positives / np.maximum(true_positives + false_positives, 1)
+        ap = average_precision(recall, precision) if len(class_correct) else np.zeros(correct.shape[1])
+
+        above = confidences[mask] >= conf_threshold
+        tp_at_threshold = class_correct[above, 0].sum()
+        p = tp_at_threshold / above.sum() if above.sum() else 0.0
+        r = tp_at_threshold / num_gt
+        per_class[class_id] = {
+            "num_gt": num_gt,
+            "num_pred": int(above.sum()),
+            "precision": float(p),
+            "recall": float(r),
+            "F1_Score": float(2 * p * r / (p + r)) if p + r > 0 else 0.0,
+            "mAP_0.5": float(ap[0]),
+            "mAP_0_5_0_95": float(ap.mean()),
+        }
+
+    present = [metrics for metrics in per_class.values() if metrics["num_gt"] > 0]
+    overall = {key: float(np.mean([metrics[key] for metrics in present])) if present else 0.0
+               for key in ("precision", "recall", "F1_Score", "mAP_0.5", "mAP_0_5_0_95")}
+    overall["num_gt"] = int(len(gt_classes))
+
+    return {"per_class": per_class, "overall": overall}
+
+
+def relative_area(boxes, shape):
+    height, width = shape
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) / float(height * width)
+
+
+def evaluate_predictions(predictions, ground_truths, shapes, names, conf_threshold=0.25, min_conf=0.001):
+    """
+    Scores cached predictions against ground truth, overall, per class and per box size.
+
+    Parameters
+    ----------
+    predictions : list of np.ndarray
+        One (N, 6) `x1, y1, x2, y2, confidence, class_id` array per image.
+    ground_truths : list of np.ndarray
+        One (M, 5) `class_id, x1, y1, x2, y2` array per image.
+    shapes : list of tuple
+        (height, width) of every image.
+    names : dict
+        Class id to label name.
+    conf_threshold : float
+        Confidence used for precision/recall/F1. mAP always uses every prediction above `min_conf`.
+
+    Returns
+    -------
+    dict
+        `{"overall", "per_class", "per_size"}` metrics.
+    """
+    buckets = {"all": None, **SIZE_RANGES}
+    collected = {bucket: {"correct": [], "conf": [], "pred_cls": [], "gt_cls": []} for bucket in buckets}
+
+    for preds, gts, shape in zip(predictions, ground_truths, shapes):
+        preds = preds[preds[:, 4] >= min_conf]
+        pred_area = relative_area(preds[:, :4], shape)
+        gt_area = relative_area(gts[:, 1:5], shape)
+
+        for bucket, size_range in buckets.items():
+            if size_range is None:
+                p, g = preds, gts
+            else:
+                # Predictions and ground truth are both bucketed by their own size
+                p = preds[(pred_area >= size_range[0]) & (pred_area < size_range[1])]
+                g = gts[(gt_area >= size_range[0]) & (gt_area < size_range[1])]
+
+            correct = match_predictions(p[:, :4], p[:, 5], g[:, 1:5], g[:, 0])
+            collected[bucket]["correct"].append(correct)
+            collected[bucket]["conf"].append(p[:, 4])
+            collected[bucket]["pred_cls"].append(p[:, 5])
+            collected[bucket]["gt_cls"].append(g[:, 0])
+
+    class_ids = sorted(names)
+    results = {}
+    for bucket, data in collected.items():
+        metrics = compute_metrics(
+            np.concatenate(data["correct"]) if data["correct"] else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool),
+            np.concatenate(data["conf"]) if data["conf"] else np.zeros(0),
+            np.concatenate(data["pred_cls"]) if data["pred_cls"] else np.zeros(0),
+            np.concatenate(data["gt_cls"]) if data["gt_cls"] else np.zeros(0),
+            class_ids, conf_threshold,
+        )
+        results[bucket] = metrics
+
+    return {
+        "overall": results["all"]["overall"],
+        "per_class": {names[class_id]: metrics for class_id, metrics in results["all"]["per_class"].items()},
+        "per_size": {bucket: results[bucket]["overall"] for bucket in SIZE_RANGES},
+    }
+
+
+def load_yolo_labels(label_path, shape):
+    """
+    Reads a YOLO label file into a (M, 5) `class_id, x1, y1, x2, y2` array in pixel coordinates.
+    """
+    height, width = shape
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5))
+
+    labels = np.loadtxt(label_path, ndmin=2)
+    if labels.size == 0:
+        return np.zeros((0, 5))
+
+    boxes = np.empty((len(labels), 5))
+    boxes[:, 0] = labels[:, 0]
+    boxes[:, 1] = (labels[:, 1] - labels[:, 3] / 2) * width
+    boxes[:, 2] = (labels[:, 2] - labels[:, 4] / 2) * height
+    boxes[:, 3] = (labels[:, 1] + labels[:, 3] / 2) * width
+    boxes[:, 4] = (labels[:, 2] + labels[:, 4] / 2) * height
+    return boxes
+
+
+def split_paths(method, split="test", data_root="data_yolo"):
+    """
+    Returns the image directory and label directory `split_data_set` created for a method and split.
+    """
+    return (os.path.join(data_root, "images", method, split),
+            os.path.join(data_root, "labels", method, split))
+
+
+def list_images(image_dir):
+    return sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def file_signatures(directory, names):
+    """
+    `[name, size, mtime_ns]` of every file, `[name, None, None]` for missing ones, for cache keys.
+    """
+    signatures = []
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signatures.append([name, stat.st_size, stat.st_mtime_ns])
+        else:
+            signatures.append([name, None, None])
+    return signatures
+
+
+def cache_key(model_path, image_dir, imgsz, min_conf, tiling=None):
+    """
+    Identifies an inference run: the model file (path, size, mtime), the images (name, size and
+    mtime of every file, so adding, removing or replacing one invalidates the cache) and the
+    inference settings.
+    """
+    stat = os.stat(model_path)
+    images = file_signatures(image_dir, list_images(image_dir))
+    payload = json.dumps([os.path.abspath(model_path), stat.st_size, stat.st_mtime, os.path.abspath(image_dir),
+                          images, imgsz, min_conf, tiling], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def run_inference(model_path, image_dir, imgsz=None, batch_size=16, min_conf=0.001, cache_dir="runs/eval_cache",
+                  tiling=None):
+    """
+    Runs batched inference over every image in `image_dir`, caching the raw predictions.
+
+    Predictions are stored with a very low confidence floor (`min_conf`) so that rescoring
+    at any higher threshold reuses the cache instead of rerunning the model.
+
+    If `tiling` is given (keyword arguments of `serving.tiling.tiled_predict`, may be empty),
+    every image is run in tiled mode instead; its tiles already form one batch.
+
+    Returns
+    -------
+    dict
+        `{"files", "shapes", "predictions", "names", "seconds"}`.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{cache_key(model_path, image_dir, imgsz, min_conf, tiling)}.npz")
+    if os.path.exists(cache_path):
+        logger.info(f"✅ Using cached predictions: {cache_path}")
+        return load_cache(cache_path)
+
+    import cv2
+    from serving.backends import load_backend
+    from serving.tiling import tiled_predict
+
+    backend = load_backend(model_path, imgsz=imgsz)
+    files = list_images(image_dir)
+    shapes, predictions = [], []
+
+    start = time.perf_counter()
+    for i in range(0, len(files), batch_size):
+        images = []
+        for name in files[i:i + batch_size]:
+            image = cv2.imread(os.path.join(image_dir, name))
+            if image is None:
+                raise FileNotFoundError(f"Unable to load image at {os.path.join(image_dir, name)}")
+            images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            shapes.append(image.shape[:2])
+        if tiling is not None:
+            predictions.extend(tiled_predict(backend, image, conf=min_conf, **tiling) for image in images)
+        else:
+            predictions.extend(backend.predict(images, conf=min_conf))
+    seconds = time.perf_counter() - start
+    logger.info(f"✅ Inference on {len(files)} images in {seconds:.1f}s ({len(files) / max(seconds, 1e-9):.1f} img/s)")
+
+    result = {"files": files, "shapes": shapes, "predictions": predictions, "names": backend.names, "seconds": seconds}
+    save_cache(cache_path, result)
+    return result
+
+
+def save_cache(cache_path, result):
+    counts = np.array([len(p) for p in result["predictions"]], dtype=np.int64)
+    np.savez_compressed(
+        cache_path,
+        files=np.array(result["files"]),
+        shapes=np.array(result["shapes"], dtype=np.int64).reshape(-1, 2),
+        counts=counts,
+        predictions=np.concatenate(result["predictions"]) if len(counts) else np.zeros((0, 6)),
+        names=json.dumps({str(k): v for k, v in result["names"].items()}),
+        seconds=result["seconds"],
+    )
+
+
+def load_cache(cache_path):
+    data = np.load(cache_path)
+    counts = data["counts"]
+    predictions = np.split(data["predictions"], np.cumsum(counts)[:-1]) if len(counts) else []
+    return {
+        "files": data["files"].tolist(),
+        "shapes": [tuple(int(v) for v in shape) for shape in data["shapes"]],
+        "predictions": predictions,
+        "names": {int(k): v for k, v in json.loads(str(data["names"])).items()},
+        "seconds": float(data["seconds"]),
+    }
+
+
+def evaluate_model(model_path, method, split="test", conf_thresholds=(0.25,), imgsz=None, batch_size=16,
+                   data_root="data_yolo", cache_dir="runs/eval_cache", tiling=None):
+    """
+    Evaluates a model on a `split_data_set` split, rescoring cached predictions at each confidence threshold.
+
+    Returns
+    -------
+    dict
+        Metrics keyed by confidence threshold.
+    """
+    image_dir, label_dir = split_paths(method, split, data_root)
+    inference = run_inference(model_path, image_dir, imgsz, batch_size, cache_dir=cache_dir, tiling=tiling)
+
+    ground_truths = [
+        load_yolo_labels(os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"), shape)
+        for name, shape in zip(inference["files"], inference["shapes"])
+    ]
+
+    report = {}
+    for conf_threshold in conf_thresholds:
+        report[conf_threshold] = evaluate_predictions(inference["predictions"], ground_truths, inference["shapes"],
+                                                      inference["names"], conf_threshold)
+    return report
+
+
+def print_report(report):
+    for conf_threshold, metrics in report.items():
+        print(f"\nconf >= {conf_threshold}")
+        print(f"{'':<16}{'P':>8}{'R':>8}{'F1':>8}{'mAP50':>8}{'mAP50-95':>10}")
+        rows = [("all", metrics["overall"])] + list(metrics["per_class"].items()) + list(metrics["per_size"].items())
+        for name, m in rows:
+            print(f"{name:<16}{m['precision']:>8.3f}{m['recall']:>8.3f}{m['F1_Score']:>8.3f}"
+                  f"{m['mAP_0.5']:>8.3f}{m['mAP_0_5_0_95']:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline evaluation of a model on a data_yolo split.")
+    parser.add_argument("--model", nargs="+", default=["best.pt"], help="One or more checkpoints to compare")
+    parser.add_argument("--method", nargs="+", default=["resize_pad"])
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--conf", nargs="+", type=float, default=[0.25])
+    parser.add_argument("--imgsz", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tiled", action="store_true", help="Use tiled inference (serving.tiling defaults)")
+    parser.add_argument("--json", default=None, help="Write all reports to this JSON file")
+    args = parser.parse_args()
+
+    all_reports = {}
+    for model_path in args.model:
+        for method in args.method:
+            logger.info(f"🚀 Evaluating {model_path} on {method}/{args.split}")
+            report = evaluate_model(model_path, method, args.split, args.conf, args.imgsz, args.batch_size,
+                                    tiling={} if args.tiled else None)
+            print(f"\n=== {model_path} | {method} ===")
+            print_report(report)
+            all_reports[f"{model_path}|{method}"] = {str(k): v for k, v in report.items()}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_reports, f, indent=2)
+
+#python -m model.yolo_v3_mini.evaluate --model best.pt runs/sweep/abc/weights/best.pt --method resize resize_pad --conf 0.25 0.5
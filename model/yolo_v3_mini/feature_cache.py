@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+
+from data_processing.file_utils import atomic_write
+from model.yolo_v3_mini.evaluate import (evaluate_model, file_signatures, list_images, load_yolo_labels, print_report,
+                                         split_paths)
+from logging_setup import setup_logging
+
+# torch / ultralytics / cv2 are imported inside the functions that run the model, so the cache
+# layout and label helpers can be used (and tested) without them.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+FEATURE_DTYPE = np.float16  # Halves the cache; features are cast back to float32 per batch
+
+
+def cache_key(model_path, image_dir, label_dir, imgsz, freeze, flip):
+    """
+    Identifies a feature cache: the model file (path, size, mtime), the images and their labels
+    (name, size and mtime of every file, so adding, removing or replacing one invalidates the
+    cache) and the cached layers.
+    """
+    stat = os.stat(model_path)
+    images = list_images(image_dir)
+    labels = [os.path.splitext(name)[0] + ".txt" for name in images]
+    payload = json.dumps([os.path.abspath(model_path), stat.st_size, stat.st_mtime, os.path.abspath(image_dir),
+                          file_signatures(image_dir, images), file_signatures(label_dir, labels),
+                          imgsz, freeze, flip], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def cached_layers(froms, freeze):
+    """
+    Indices of the frozen layers whose outputs the trainable layers read.
+
+    Parameters
+    ----------
+    froms : list
+        The ultralytics `m.f` of every layer in order: -1 for the previous layer, an absolute
+        index, or a list of those for concatenations.
+    freeze : int
+        Layers `0 .. freeze - 1` are frozen.
+
+    Returns
+    -------
+    list of int
+        Always includes `freeze - 1`, plus any earlier layer a later skip connection reads.
+    """
+    needed = {freeze - 1}
+    for i, f in enumerate(froms[freeze:], start=freeze):
+        for j in (f if isinstance(f, list) else [f]):
+            j = i - 1 if j == -1 else j
+            if j < freeze:
+                needed.add(j)
+    return sorted(needed)
+
+
+def letterbox_labels(boxes, scale, pad, imgsz, flip=False):
+    """
+    Maps labels from `load_yolo_labels` onto the letterboxed (and optionally mirrored) image.
+
+    Parameters
+    ----------
+    boxes : np.ndarray
+        (M, 5) `class_id, x1, y1, x2, y2` in pixels of the original image.
+
+    Returns
+    -------
+    np.ndarray
+        (M, 5) `class_id, x, y, w, h` normalised to the `imgsz` letterbox, as ultralytics trains on.
+    """
+    left, top = pad
+    x1 = boxes[:, 1] * scale + left
+    x2 = boxes[:, 3] * scale + left
+    if flip:
+        x1, x2 = imgsz - x2, imgsz - x1
+    y1 = boxes[:, 2] * scale + top
+    y2 = boxes[:, 4] * scale + top
+    return np.stack([boxes[:, 0], (x1 + x2) / 2 / imgsz, (y1 + y2) / 2 / imgsz,
+                     (x2 - x1) / imgsz, (y2 - y1) / imgsz], axis=1)
+
+
+def batch_targets(labels, index):
+    """
+    Selects the labels of the samples in `index` in the ultralytics loss format.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        (M, 6) `sample, class_id, x, y, w, h` rows of the whole cache.
+    index : np.ndarray
+        Sorted sample indices of the batch.
+
+    Returns
+    -------
+    dict
+        `batch_idx` (n,), `cls` (n, 1) and `bboxes` (n, 4) arrays.
+    """
+    rows = labels[np.isin(labels[:, 0], index)]
+    return {"batch_idx": np.searchsorted(index, rows[:, 0]).astype(np.float32),
+            "cls": rows[:, 1:2].astype(np.float32),
+            "bboxes": rows[:, 2:6].astype(np.float32)}
+
+
+def load_feature_cache(cache_dir):
+    """
+    Opens a cache written by `build_feature_cache`. Features are memory-mapped, not read.
+
+    Returns
+    -------
+    tuple (dict, dict, np.ndarray)
+        The metadata, `{layer: (N, C, H, W) memmap}` and the (M, 6) labels.
+    """
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        meta = json.load(f)
+    features = {int(layer): np.load(os.path.join(cache_dir, f"layer_{layer}.npy"), mmap_mode="r")
+                for layer in meta["layers"]}
+    labels = np.load(os.path.join(cache_dir, "labels.npy"))
+    return meta, features, labels
+
+
+def build_feature_cache(model_path, image_dir, label_dir, cache_root="runs/feature_cache", imgsz=224, freeze=5,
+                        batch_size=32, flip=False):
+    """
+    Runs the frozen layers of a YOLO model once over a split and stores their outputs.
+
+    Images are letterboxed like the server does (serving.backends) and the frozen layers run
+    in eval mode, so the cached features are exactly what the deployed model computes. With
+    `flip`, a mirrored copy of every image is cached as well: light augmentation paid once.
+    `meta.json` is written last, so an interrupted build is redone rather than reused.
+
+    Returns
+    -------
+    str
+        The cache directory.
+    """
+    cache_dir = os.path.join(cache_root, cache_key(model_path, image_dir, label_dir, imgsz, freeze, flip))
+    if os.path.exists(os.path.join(cache_dir, "meta.json")):
+        logger.info(f"✅ Using cached features: {cache_dir}")
+        return cache_dir
+
+    import cv2
+    import torch
+    from ultralytics import YOLO
+    from serving.backends import fill_input, letterbox
+
+    model = YOLO(model_path).model.float().eval()
+    layers = cached_layers([m.f for m in model.model], freeze)
+    files = list_images(image_dir)
+    views = [False, True] if flip else [False]
+    count = len(files) * len(views)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    stores, labels, sample = {}, [], 0
+    canvas = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+    for i in range(0, len(files), batch_size):
+        inputs = []
+        for name in files[i:i + batch_size]:
+            image = cv2.imread(os.path.join(image_dir, name))
+            if image is None:
+                raise FileNotFoundError(f"Unable to load image at {os.path.join(image_dir, name)}")
+            _, scale, pad = letterbox(image, imgsz, out=canvas)
+            boxes = load_yolo_labels(os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"), image.shape[:2])
+            for mirrored in views:
+                tensor = np.empty((3, imgsz, imgsz), dtype=np.float32)
+                fill_input(canvas[:, ::-1] if mirrored else canvas, tensor, bgr=True)
+                inputs.append(tensor)
+                target = letterbox_labels(boxes, scale, pad, imgsz, mirrored)
+                labels.append(np.column_stack([np.full(len(target), sample), target]))
+                sample += 1
+
+        x, y = torch.from_numpy(np.stack(inputs)), []
+        with torch.inference_mode():
+            for m in model.model[:freeze]:
+                if m.f != -1:
+                    x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+                x = m(x)
+                y.append(x)
+        outputs = {j: y[j].numpy() for j in layers}
+
+        first = sample - len(inputs)
+        for j, output in outputs.items():
+            if j not in stores:
+                stores[j] = np.lib.format.open_memmap(os.path.join(cache_dir, f"layer_{j}.npy"), mode="w+",
+                                                      dtype=FEATURE_DTYPE, shape=(count, *output.shape[1:]))
+            stores[j][first:sample] = output
+    for store in stores.values():
+        store.flush()
+
+    np.save(os.path.join(cache_dir, "labels.npy"), np.concatenate(labels) if labels else np.zeros((0, 6)))
+    meta = {"model": os.path.abspath(model_path), "image_dir": os.path.abspath(image_dir), "imgsz": imgsz,
+            "freeze": freeze, "flip": flip, "layers": layers, "samples": count, "files": files,
+            "shapes": {str(j): list(store.shape[1:]) for j, store in stores.items()},
+            "seconds": round(time.perf_counter() - start, 1)}
+
+    def write_meta(path):
+        with open(path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+    atomic_write(os.path.join(cache_dir, "meta.json"), write_meta)
+    size_mb = sum(store.nbytes for store in stores.values()) / 2 ** 20
+    logger.info(f"✅ Cached layers {layers} of {count} samples ({size_mb:.0f} MB) in {meta['seconds']}s: {cache_dir}")
+    return cache_dir
+
+
+def head_forward(model, features, freeze):
+    """
+    Runs the layers after `freeze` of an ultralytics DetectionModel on cached `{layer: tensor}` features.
+    """
+    y = [features.get(j) for j in range(freeze)]
+    x = y[freeze - 1]
+    for m in model.model[freeze:]:
+        if m.f != -1:
+            x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+        x = m(x)
+        y.append(x if m.i in model.save else None)
+    return x
+
+
+def _batches(features, labels, count, batch_size, rng=None):
+    import torch
+
+    order = rng.permutation(count) if rng is not None else np.arange(count)
+    for start in range(0, count, batch_size):
+        index = np.sort(order[start:start + batch_size])  # Sorted, so memmap reads go forward
+        inputs = {j: torch.from_numpy(np.asarray(store[index], dtype=np.float32)) for j, store in features.items()}
+        targets = {key: torch.from_numpy(value) for key, value in batch_targets(labels, index).items()}
+        yield inputs, targets
+
+
+def _loss(criterion, preds, targets):
+    loss, items = criterion(preds, targets)
+    return loss.sum(), items  # Scalar in older ultralytics releases, (box, cls, dfl) in newer ones
+
+
+def train_head(model_path, train_cache, val_cache=None, epochs=30, batch_size=16, lr0=0.001, output="runs/head",
+               seed=0, experiment_name=None):
+    """
+    Trains the layers after the frozen backbone on cached features and saves the best checkpoint.
+
+    The frozen layers are never run; every step is a forward and backward pass through the
+    head only, with the ultralytics detection loss. The checkpoint with the lowest validation
+    loss (training loss without `val_cache`) is saved as an ultralytics `best.pt`.
+
+    Returns
+    -------
+    dict
+        `best` checkpoint path, `best_epoch`, `best_loss` and training `seconds`.
+    """
+    import torch
+    from copy import deepcopy
+    from ultralytics import YOLO
+    from ultralytics.cfg import get_cfg
+    from ultralytics.utils.loss import v8DetectionLoss
+
+    meta, features, labels = load_feature_cache(train_cache)
+    freeze = meta["freeze"]
+    if val_cache is not None:
+        val_meta, val_features, val_labels = load_feature_cache(val_cache)
+        if val_meta["freeze"] != freeze or val_meta["model"] != meta["model"]:
+            raise ValueError("❌ Train and validation caches come from different models or freeze depths")
+
+    model = YOLO(model_path).model.float()
+    for name, parameter in model.named_parameters():
+        parameter.requires_grad = int(name.split(".")[1]) >= freeze and ".dfl" not in name  # As ultralytics freezes
+    model.args = get_cfg(overrides={"imgsz": meta["imgsz"]})  # Box, cls and dfl loss gains
+    criterion = v8DetectionLoss(model)
+    optimizer = torch.optim.Adam([p for p in model.parameters() if p.requires_grad], lr=lr0)
+
+    run = None
+    if experiment_name:
+        import mlflow
+
+        mlflow.set_experiment(experiment_name=experiment_name)
+        run = mlflow.start_run(run_name=f"head_{os.path.basename(model_path)}")
+        mlflow.log_params({"mode": "cached_head", "freeze": freeze, "imgsz": meta["imgsz"], "epochs": epochs,
+                           "batch": batch_size, "lr0": lr0, "flip": meta["flip"], "samples": meta["samples"]})
+
+    os.makedirs(output, exist_ok=True)
+    best_path = os.path.join(output, "best.pt")
+    best = {"best": best_path, "best_epoch": None, "best_loss": float("inf")}
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    try:
+        for epoch in range(epochs):
+            model.train()
+            train_loss, steps = 0.0, 0
+            for inputs, targets in _batches(features, labels, meta["samples"], batch_size, rng):
+                loss, _ = _loss(criterion, head_forward(model, inputs, freeze), targets)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                train_loss, steps = train_loss + loss.item(), steps + 1
+            train_loss /= max(steps, 1)
+
+            epoch_loss, metrics = train_loss, {"head_train_loss": train_loss}
+            if val_cache is not None:
+                model.eval()  # BatchNorm running stats stay untouched, Detect returns (y, raw) which the loss accepts
+                val_loss, steps = 0.0, 0
+                with torch.no_grad():
+                    for inputs, targets in _batches(val_features, val_labels, val_meta["samples"], batch_size):
+                        val_loss, steps = val_loss + _loss(criterion, head_forward(model, inputs, freeze), targets)[0].item(), steps + 1
+                epoch_loss = metrics["head_val_loss"] = val_loss / max(steps, 1)
+            logger.info(f"📉 Epoch {epoch + 1}/{epochs}: " + ", ".join(f"{k}={v:.4f}" for k, v in metrics.items()))
+            if run:
+                for key, value in metrics.items():
+                    mlflow.log_metric(key, value, step=epoch)
+
+            if epoch_loss < best["best_loss"]:
+                best.update(best_epoch=epoch + 1, best_loss=epoch_loss)
+                checkpoint = {"model": deepcopy(model).half(), "train_args": {**vars(model.args), "freeze": freeze},
+                              "epoch": epoch, "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                atomic_write(best_path, lambda path: torch.save(checkpoint, path))
+        best["seconds"] = round(time.perf_counter() - start, 1)
+        logger.info(f"✅ Head trained in {best['seconds']}s, best epoch {best['best_epoch']}: {best_path}")
+        if run:
+            mlflow.log_metric("head_best_loss", best["best_loss"])
+            mlflow.log_artifact(best_path, artifact_path="YOLO_Model")
+    finally:
+        if run:
+            mlflow.end_run()
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune the detection head on cached frozen-backbone features.")
+    parser.add_argument("--model", default="best.pt", help="Checkpoint to fine-tune, its backbone stays frozen")
+    parser.add_argument("--method", default="resize_pad", help="data_yolo method whose train/val splits are used")
+    parser.add_argument("--data-root", default="data_yolo", help="e.g. the split_data_set output of new site data")
+    parser.add_argument("--imgsz", type=int, default=224)
+    parser.add_argument("--freeze", type=int, default=5)
+    parser.add_argument("--flip", action="store_true", help="Also cache mirrored training images")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--lr0", type=float, default=0.001)
+    parser.add_argument("--cache-root", default="runs/feature_cache")
+    parser.add_argument("--output", default="runs/head")
+    parser.add_argument("--experiment", default=None, help="MLflow experiment to log to")
+    args = parser.parse_args()
+
+    train_dir, train_labels = split_paths(args.method, "train", args.data_root)
+    val_dir, val_labels = split_paths(args.method, "val", args.data_root)
+    train_cache = build_feature_cache(args.model, train_dir, train_labels, args.cache_root, args.imgsz, args.freeze,
+                                      flip=args.flip)
+    val_cache = build_feature_cache(args.model, val_dir, val_labels, args.cache_root, args.imgsz, args.freeze)
+    result = train_head(args.model, train_cache, val_cache, args.epochs, args.batch, args.lr0, args.output,
+                        experiment_name=args.experiment)
+
+    report = evaluate_model(result["best"], args.method, "val", data_root=args.data_root, imgsz=args.imgsz)
+    print(f"\n=== {result['best']} | {args.method}/val (epoch {result['best_epoch']}, {result['seconds']}s) ===")
+    print_report(report)
+
+#python -m model.yolo_v3_mini.feature_cache --model best.pt --method resize_pad --freeze 5 --flip --epochs 30
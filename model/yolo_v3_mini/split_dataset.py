@@ -2,11 +2,15 @@ import os
 import random
 import logging
 import shutil
+import argparse
+from data_processing.dedup import load_groups
+from logging_setup import get_sampled_logger, setup_logging
 
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
+sampled_logger = get_sampled_logger(__name__)
 
 #Source files
 source_images_dir = 'data/images'
@@ -37,7 +41,7 @@ for method in methods:
         os.makedirs(os.path.join(output_images_method, split),exist_ok=True)
         os.makedirs(os.path.join(output_labels_method, split),exist_ok=True)
 
-logging.info("✅ Directories created successfully!")
+logger.info("✅ Directories created successfully!")
 
 # Split ratios
 train_ratio = 0.8
@@ -89,9 +93,61 @@ def validate_directory_and_return_files(directory_path, allowed_extensions=None)
     return valid_files
 
 
-def split_data_set():
+def split_by_groups(image_names, groups, rng=random, drop_duplicates=False):
+    """
+    Splits images into train/val/test while keeping every near-duplicate cluster in a single split.
+
+    Args:
+        image_names (list): Image file names.
+        groups (dict): File stem -> cluster key, see `data_processing.dedup.load_groups`.
+            Images missing from it are treated as their own cluster.
+        rng (random.Random, optional): Source of the cluster shuffle.
+        drop_duplicates (bool, optional): Keep only the first image of every cluster.
+
+    Returns:
+        tuple: Training, validation and testing file lists.
+    """
+    clusters = {}
+    for name in sorted(image_names):
+        stem = os.path.splitext(name)[0]
+        clusters.setdefault(groups.get(stem, stem), []).append(name)
+
+    members = list(clusters.values())
+    if drop_duplicates:
+        members = [cluster[:1] for cluster in members]
+    rng.shuffle(members)
+
+    no_images = sum(len(cluster) for cluster in members)
+    train_count = int(train_ratio * no_images)
+    val_count = int(val_ratio * no_images)
+
+    # Fill the splits in order with whole clusters, so sizes are only approximately the ratios
+    training_set, validation_set, testing_set = [], [], []
+    for cluster in members:
+        if len(training_set) < train_count:
+            training_set.extend(cluster)
+        elif len(validation_set) < val_count:
+            validation_set.extend(cluster)
+        else:
+            testing_set.extend(cluster)
+    return training_set, validation_set, testing_set
+
+
+def split_data_set(dedup_report=None, drop_duplicates=False, seed=None):
+    """
+    Copies every method's images and labels into data_yolo train/val/test splits.
+
+    Args:
+        dedup_report (str, optional): Report from `python -m data_processing.dedup`. When given,
+            near-duplicate frames are kept in the same split so they can't leak between splits.
+        drop_duplicates (bool, optional): With a report, keep only one image per cluster.
+        seed (int, optional): Seed for the shuffle, giving every method the same split.
+    """
     logger.info("Starting data set split")
-    
+    groups = load_groups(dedup_report) if dedup_report else None
+    if drop_duplicates and groups is None:
+        raise ValueError("❌ drop_duplicates needs a dedup report")
+
 
     for method in methods:
         method_image_dir = os.path.join(source_images_dir,method)
@@ -107,17 +163,20 @@ def split_data_set():
         if no_images != no_labels:
             logger.warning(f"⚠️ No. of images and labels aren't equal!: They are {no_images} images and {no_labels} labels")
 
-        #Shuffle image names
-        random.shuffle(image_names)
-        
-        train_count = int(train_ratio * no_images)
-        val_count = int(val_ratio * no_images )
-        test_count = no_images - train_count - val_count
+        rng = random.Random(seed) if seed is not None else random
+        if groups is not None:
+            training_set, validation_set, testing_set = split_by_groups(image_names, groups, rng, drop_duplicates)
+        else:
+            #Shuffle image names
+            rng.shuffle(image_names)
+
+            train_count = int(train_ratio * no_images)
+            val_count = int(val_ratio * no_images )
 
-        #Create training,validation and testing sets
-        training_set = image_names[:train_count]
-        validation_set = image_names[train_count:train_count+val_count]
-        testing_set = image_names[train_count + val_count :]
+            #Create training,validation and testing sets
+            training_set = image_names[:train_count]
+            validation_set = image_names[train_count:train_count+val_count]
+            testing_set = image_names[train_count + val_count :]
 
         logger.info(f"Training set: {len(training_set)} files, Validation set: {len(validation_set)} files, Testing set: {len(testing_set)}")
         
@@ -143,7 +202,7 @@ def split_data_set():
                 #Copy image
                 try:
                     shutil.copyfile(src_image_path,target_image_path)
-                    logger.info(f"✅ Copied Image {src_image_path} → {target_image_path}")
+                    sampled_logger.info("copied_image", "✅ Copied Image %s → %s", src_image_path, target_image_path)
                 except FileNotFoundError:
                     logger.error(f"❌ Image not found: {src_image_path} → {target_image_path}")
                 except Exception as e:
@@ -152,7 +211,7 @@ def split_data_set():
                 #Copy label
                 try:
                     shutil.copyfile(src_label_path,target_label_path)
-                    logger.info(f"Copied Image {src_label_path} → {target_label_path}")
+                    sampled_logger.info("copied_label", "Copied Label %s → %s", src_label_path, target_label_path)
                 except FileNotFoundError:
                     logger.error(f"❌ Image not found: {src_label_path}")
                 
@@ -160,6 +219,7 @@ def split_data_set():
                     logger.error(f"❌ Error copying {src_label_path} due to {e}")
                 
 
+        sampled_logger.flush_summary()
         logger.info(f"✅ Dataset split completed!, find images at {target_image_dir} and labels at {target_label_dir}")
 
                 
@@ -170,7 +230,15 @@ def split_data_set():
 
 
 if __name__ == "__main__":
-    split_data_set()
+    parser = argparse.ArgumentParser(description="Split the preprocessed dataset into train/val/test.")
+    parser.add_argument("--dedup-report", default=None, help="Keep near-duplicate clusters in one split")
+    parser.add_argument("--drop-duplicates", action="store_true", help="Keep one image per near-duplicate cluster")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    split_data_set(args.dedup_report, args.drop_duplicates, args.seed)
+
+#python -m model.yolo_v3_mini.split_dataset --dedup-report dedup.json
     
 
         
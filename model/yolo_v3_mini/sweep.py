@@ -0,0 +1,357 @@
+import os
+import csv
+import json
+import random
+import hashlib
+import logging
+import argparse
+import itertools
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+import mlflow
+from mlflow.tracking import MlflowClient
+from logging_setup import setup_logging
+
+# ultralytics/torch are imported inside run_trial so each worker process can set its
+# thread budget before torch initialises its thread pools.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_SPACE = {
+    "method": ["resize", "resize_pad", "pad_resize"],
+    "imgsz": [160, 224],
+    "lr0": [0.001, 0.01],
+    "freeze": [0, 5],
+    "augmentation": {
+        "mild": {"degrees": 5.0, "translate": 0.02, "hsv_h": 0.005, "hsv_s": 0.2, "hsv_v": 0.2},
+        "strong": {"degrees": 10.0, "translate": 0.1, "scale": 0.3, "hsv_h": 0.015, "hsv_s": 0.5, "hsv_v": 0.4, "fliplr": 0.5},
+    },
+}
+
+# Per-epoch metric logged to MLflow and used for pruning
+PRUNE_METRIC = "epoch_mAP_0_5_0_95"
+RESULTS_CSV_COLUMN = "metrics/mAP50-95(B)"
+
+
+def expand_search_space(search_space, max_trials=None, seed=0):
+    """
+    Expands a search space into a list of trials.
+
+    Every key maps to a list of candidate values, except `augmentation` which maps preset
+    names to ultralytics augmentation arguments. The full grid is returned, or a seeded
+    random sample of it when `max_trials` is given, so the trial list is reproducible
+    across restarts of an interrupted sweep.
+
+    Returns
+    -------
+    list of dict
+        Trials such as `{"method": "resize", "imgsz": 224, "lr0": 0.01, "freeze": 5, "augmentation": "mild"}`.
+    """
+    keys = sorted(search_space)
+    choices = [list(search_space[key]) for key in keys]  # For augmentation this lists the preset names
+    trials = [dict(zip(keys, values)) for values in itertools.product(*choices)]
+
+    if max_trials is not None and max_trials < len(trials):
+        trials = random.Random(seed).sample(trials, max_trials)
+
+    return trials
+
+
+def trial_key(trial):
+    """
+    Stable identifier of a trial, used to find it again in MLflow when resuming.
+    """
+    return hashlib.sha1(json.dumps(trial, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def build_train_params(trial, search_space, base_params):
+    """
+    Merges a trial into the base training parameters passed to `model.train`.
+    """
+    params = dict(base_params)
+    for key, value in trial.items():
+        if key == "method":
+            continue
+        if key == "augmentation":
+            params.update(search_space["augmentation"][value])
+        else:
+            params[key] = value
+    return params
+
+
+def write_data_yaml(method, output_dir, data_root="data_yolo", names=("without_mask", "with_mask")):
+    """
+    Writes an ultralytics dataset config pointing at the `split_data_set` output for one preprocessing method.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    images_root = os.path.abspath(os.path.join(data_root, "images", method))
+    config = {
+        "train": os.path.join(images_root, "train"),
+        "val": os.path.join(images_root, "val"),
+        "test": os.path.join(images_root, "test"),
+        "nc": len(names),
+        "names": list(names),
+    }
+    yaml_path = os.path.join(output_dir, f"data_{method}.yaml")
+    with open(yaml_path, "w") as f:
+        yaml.safe_dump(config, f)
+    return yaml_path
+
+
+def sweep_runs(experiment_name, sweep_name):
+    """
+    Returns the MLflow runs of a sweep keyed by trial key.
+    """
+    client = MlflowClient()
+    experiment = client.get_experiment_by_name(experiment_name)
+    if experiment is None:
+        return {}
+
+    runs = client.search_runs([experiment.experiment_id], filter_string=f"tags.`sweep.name` = '{sweep_name}'")
+    return {run.data.tags.get("sweep.trial_key"): run for run in runs}
+
+
+class MedianPruner:
+    """
+    Median stopping rule over the other trials of the same sweep.
+
+    A trial is pruned at epoch `e` if its per-epoch metric is below the median of the metric
+    other trials reached at epoch `e`. Reference histories are read from MLflow, so trials
+    running concurrently in other processes (or from an earlier, interrupted sweep) count.
+
+    Attributes:
+        warmup_epochs (int): Never prune before this many epochs.
+        min_trials (int): Minimum number of reference trials needed at an epoch to prune.
+    """
+    def __init__(self, experiment_name, sweep_name, run_id, warmup_epochs=10, min_trials=3):
+        self.experiment_name = experiment_name
+        self.sweep_name = sweep_name
+        self.run_id = run_id
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.client = MlflowClient()
+
+    def reference_values(self, epoch):
+        values = []
+        for run in sweep_runs(self.experiment_name, self.sweep_name).values():
+            if run.info.run_id == self.run_id:
+                continue
+            for metric in self.client.get_metric_history(run.info.run_id, PRUNE_METRIC):
+                if metric.step == epoch:
+                    values.append(metric.value)
+                    break
+        return values
+
+    def should_prune(self, epoch, value):
+        if epoch < self.warmup_epochs:
+            return False
+
+        references = self.reference_values(epoch)
+        if len(references) < self.min_trials:
+            return False
+
+        return value < statistics.median(references)
+
+
+def read_last_epoch(results_csv):
+    """
+    Returns the last row of an ultralytics results.csv as a dict with stripped column names.
+    """
+    with open(results_csv, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return None
+    return {key.strip(): value for key, value in rows[-1].items()}
+
+
+def run_trial(trial, sweep_name, experiment_name, search_space, yaml_config, base_model="yolov3-tinyu.pt",
+              threads=1, workers=1, run_id=None, resume_from=None, warmup_epochs=10, min_trials=3,
+              project="runs/sweep"):
+    """
+    Trains a single trial inside its own MLflow run. Runs in a worker process.
+
+    Parameters
+    ----------
+    threads : int
+        Torch intra-op threads this trial may use.
+    run_id : str, optional
+        Existing MLflow run of an interrupted trial to continue logging into.
+    resume_from : str, optional
+        `last.pt` of the interrupted trial, training resumes from it.
+
+    Returns
+    -------
+    dict
+        `{"trial_key", "status", "metrics"}` where status is `completed` or `pruned`.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+    from ultralytics import YOLO
+    from .yolo_v3_model import DEFAULT_TRAIN_PARAMS, log_best_epoch_metrics
+
+    key = trial_key(trial)
+    params = build_train_params(trial, search_space, DEFAULT_TRAIN_PARAMS)
+    params["workers"] = workers
+
+    mlflow.set_experiment(experiment_name=experiment_name)
+    with mlflow.start_run(run_id=run_id, run_name=None if run_id else f"{sweep_name}-{key}") as run:
+        mlflow.set_tags({"sweep.name": sweep_name, "sweep.trial_key": key, "sweep.trial": json.dumps(trial, sort_keys=True)})
+        mlflow.log_params({**params, "method": trial["method"], "augmentation": trial.get("augmentation")})
+
+        pruner = MedianPruner(experiment_name, sweep_name, run.info.run_id, warmup_epochs, min_trials)
+        status = {"pruned": False}
+
+        def on_fit_epoch_end(trainer):
+            # results.csv is written before this callback runs
+            last_epoch = read_last_epoch(trainer.csv)
+            if last_epoch is None:
+                return
+            epoch = int(float(last_epoch["epoch"]))
+            value = float(last_epoch[RESULTS_CSV_COLUMN])
+            mlflow.log_metric(PRUNE_METRIC, value, step=epoch)
+
+            if pruner.should_prune(epoch, value):
+                logger.info(f"✂️ Pruning trial {key} at epoch {epoch}: {RESULTS_CSV_COLUMN}={value:.4f}")
+                status["pruned"] = True
+                trainer.stop = True
+
+        if resume_from:
+            logger.info(f"🔁 Resuming trial {key} from {resume_from}")
+            model = YOLO(resume_from)
+            model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+            results = model.train(resume=True)
+        else:
+            model = YOLO(base_model)
+            model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+            mlflow.set_tag("sweep.save_dir", os.path.abspath(os.path.join(project, key)))
+            results = model.train(data=yaml_config, project=project, name=key, exist_ok=True, **params)
+
+        run_dir = results.save_dir if results is not None else model.trainer.save_dir
+        results_csv = os.path.join(run_dir, "results.csv")
+        mlflow.log_artifact(results_csv)
+        metrics = log_best_epoch_metrics(results_csv)
+
+        best_model_path = os.path.join(run_dir, "weights", "best.pt")
+        if os.path.exists(best_model_path):
+            mlflow.log_artifact(best_model_path, artifact_path="YOLO_Model")
+
+        trial_status = "pruned" if status["pruned"] else "completed"
+        mlflow.set_tag("sweep.status", trial_status)
+
+    return {"trial_key": key, "status": trial_status, "metrics": metrics}
+
+
+def run_sweep(sweep_name, experiment_name, search_space=None, max_trials=None, parallel=2, cpu_budget=None,
+              workers=1, base_model="yolov3-tinyu.pt", warmup_epochs=10, min_trials=3, seed=0,
+              project="runs/sweep", data_root="data_yolo"):
+    """
+    Runs a hyperparameter sweep with concurrent trials, median pruning and resume from MLflow state.
+
+    Trials already marked completed/pruned in MLflow are skipped. Trials whose run was
+    interrupted are resumed from their `last.pt` inside the same MLflow run.
+
+    Parameters
+    ----------
+    parallel : int
+        Number of trials trained at the same time.
+    cpu_budget : int, optional
+        Total torch threads shared by all concurrent trials. Defaults to the CPU count.
+
+    Returns
+    -------
+    list of dict
+        Results of the trials run in this call.
+    """
+    search_space = search_space or DEFAULT_SEARCH_SPACE
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    threads = max(1, cpu_budget // parallel)
+    logger.info(f"🚀 Sweep '{sweep_name}': {parallel} concurrent trials x {threads} threads")
+
+    trials = expand_search_space(search_space, max_trials, seed)
+    existing = sweep_runs(experiment_name, sweep_name)
+    yaml_dir = os.path.join(project, "_data")
+
+    pending = []
+    for trial in trials:
+        key = trial_key(trial)
+        run = existing.get(key)
+        run_id = resume_from = None
+        if run is not None:
+            if run.info.status == "FINISHED" and run.data.tags.get("sweep.status"):
+                logger.info(f"⏭️ Trial {key} already {run.data.tags['sweep.status']}, skipping")
+                continue
+            # Interrupted trial: continue in the same MLflow run, from its last checkpoint if there is one
+            run_id = run.info.run_id
+            last_checkpoint = os.path.join(run.data.tags.get("sweep.save_dir", ""), "weights", "last.pt")
+            resume_from = last_checkpoint if os.path.exists(last_checkpoint) else None
+        pending.append((trial, run_id, resume_from))
+
+    logger.info(f"✅ {len(trials) - len(pending)} of {len(trials)} trials already done, {len(pending)} to run")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=context) as executor:
+        futures = {}
+        for trial, run_id, resume_from in pending:
+            yaml_config = write_data_yaml(trial["method"], yaml_dir, data_root)
+            future = executor.submit(run_trial, trial, sweep_name, experiment_name, search_space, yaml_config,
+                                     base_model, threads, workers, run_id, resume_from, warmup_epochs,
+                                     min_trials, project)
+            futures[future] = trial
+
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                logger.info(f"✅ Trial {result['trial_key']} {result['status']}: {result['metrics']}")
+            except Exception as e:
+                logger.error(f"❌ Trial {trial_key(trial)} {trial} failed: {e}")
+
+    return results
+
+
+def leaderboard(experiment_name, sweep_name, metric="mAP_0_5_0_95"):
+    """
+    Returns `(trial, status, metric value)` for every finished trial of a sweep, best first.
+    """
+    rows = []
+    for run in sweep_runs(experiment_name, sweep_name).values():
+        if metric in run.data.metrics:
+            rows.append((json.loads(run.data.tags.get("sweep.trial", "{}")),
+                         run.data.tags.get("sweep.status", run.info.status), run.data.metrics[metric]))
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable, parallel hyperparameter sweep over mlflow_experiment settings.")
+    parser.add_argument("--sweep-name", required=True)
+    parser.add_argument("--experiment", default="yolo_v3_mini_sweep")
+    parser.add_argument("--search-space", default=None, help="YAML/JSON file with the search space")
+    parser.add_argument("--max-trials", type=int, default=None)
+    parser.add_argument("--parallel", type=int, default=2)
+    parser.add_argument("--cpu-budget", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1, help="Dataloader workers per trial")
+    parser.add_argument("--warmup-epochs", type=int, default=10)
+    parser.add_argument("--min-trials", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    search_space = None
+    if args.search_space:
+        with open(args.search_space) as f:
+            search_space = yaml.safe_load(f)
+
+    run_sweep(args.sweep_name, args.experiment, search_space, args.max_trials, args.parallel, args.cpu_budget,
+              args.workers, warmup_epochs=args.warmup_epochs, min_trials=args.min_trials, seed=args.seed)
+
+    for trial, status, value in leaderboard(args.experiment, args.sweep_name):
+        print(f"{value:.4f}  {status:<10} {trial}")
+
+#python -m model.yolo_v3_mini.sweep --sweep-name cpu_sweep_v1 --parallel 4
@@ -7,19 +7,70 @@ from mlflow.tracking import MlflowClient
 import yaml
 import os
 import pandas as pd
+from logging_setup import setup_logging
 
 
 
 
 
 # Setup logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize YOLO model
-model = YOLO(model='yolov3-tinyu.pt')
-
-def mlflow_experiment(yaml_config, model, model_name, experiment_name):
+# Training configuration used by mlflow_experiment, every key is passed to model.train and logged
+DEFAULT_TRAIN_PARAMS = {
+    "epochs": 100,
+    "batch": 8,
+    "imgsz": 224,
+    "lr0": 0.01,
+    "optimizer": "Adam",
+    "freeze": 5,
+    "degrees": 5.0,       # very slight rotation
+    "translate": 0.02,
+    "hsv_h": 0.005,
+    "hsv_s": 0.2,
+    "hsv_v": 0.2,
+}
+
+
+def log_best_epoch_metrics(results_csv):
+    """
+    Logs precision, recall, F1 and mAP of the best epoch (by mAP50-95) in an ultralytics results.csv.
+
+    Returns
+    -------
+    dict
+        The logged metrics.
+    """
+    results_df = pd.read_csv(results_csv)
+    results_df.columns = results_df.columns.str.strip()
+    #Get results of best epoch
+    best_epoch = results_df.loc[results_df['metrics/mAP50-95(B)'].idxmax()]
+    precision = best_epoch['metrics/precision(B)']
+    recall = best_epoch['metrics/recall(B)']
+    mAP_0_5 = best_epoch['metrics/mAP50(B)']
+    mAP_0_5_95 = best_epoch['metrics/mAP50-95(B)']
+    #Calculate f1 score
+    if precision + recall > 0:
+        f1_score = 2* (precision*recall)/(precision+recall)
+    else:
+        f1_score = 0
+
+    metrics = {
+        "precision": precision,
+        "recall": recall,
+        "F1_Score": f1_score,
+        "mAP_0.5": mAP_0_5,
+        "mAP_0_5_0_95": mAP_0_5_95,
+    }
+    #Log metrics
+    for name, value in metrics.items():
+        mlflow.log_metric(name, float(value))
+
+    return metrics
+
+
+def mlflow_experiment(yaml_config, model, model_name, experiment_name, train_params=None):
     # Validate YAML file
     if not yaml_config or not yaml_config.endswith('.yaml'):
         logger.error("❌ Config file path must be a valid .yaml file")
@@ -63,53 +114,18 @@ def mlflow_experiment(yaml_config, model, model_name, experiment_name):
             run_id = run.info.run_id
             print(f"🚀 MLflow Run ID: {run_id}")
             
-            #Log parameters
-            mlflow.log_param("epochs",50)
-            mlflow.log_param("batch_size",16)
-            mlflow.log_param("imgsz",640)
-            mlflow.log_param("learning_rate",0.001)
-            mlflow.log_param("optimizer","Adam")
-            
+            #Log the parameters we actually train with
+            params = {**DEFAULT_TRAIN_PARAMS, **(train_params or {})}
+            mlflow.log_params(params)
+
             #Train model
-            results = model.train(
-            data=yaml_config,
-            epochs=100,
-            batch=8,
-            imgsz=224,
-            lr0=0.01,
-            optimizer='Adam',
-            freeze = 5,
-            degrees=5.0,       # very slight rotation, ±1 degree
-            translate=0.02,
-            hsv_h=0.005,
-            hsv_s=0.2,         
-            hsv_v=0.2          
-
-        )   
+            results = model.train(data=yaml_config, **params)
+
             #Results df
-            run_dir = results.save_dir 
+            run_dir = results.save_dir
             results_dir = os.path.join(run_dir,"results.csv")
             mlflow.log_artifact(results_dir) #Log results
-
-            results_df = pd.read_csv(results_dir)
-            #Get results of best epoch
-            best_epoch = results_df.loc[results_df['metrics/mAP50-95(B)'].idxmax()]
-            precision = best_epoch['metrics/precision(B)']
-            recall = best_epoch['metrics/recall(B)']
-            mAP_0_5 = best_epoch['metrics/mAP50(B)']
-            mAP_0_5_95 = best_epoch['metrics/mAP50-95(B)']
-            #Calculate f1 score
-            if precision + recall > 0:
-                f1_score = 2* (precision*recall)/(precision+recall)
-            else:
-                f1_score = 0 
-            
-            #Log metrics
-            mlflow.log_metric("precision", precision)
-            mlflow.log_metric("recall", recall)
-            mlflow.log_metric("F1_Score", f1_score)
-            mlflow.log_metric("mAP_0.5", mAP_0_5)
-            mlflow.log_metric("mAP_0_5_0_95", mAP_0_5_95)
+            log_best_epoch_metrics(results_dir)
 
             #Log model
 
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Quality tiers from best to cheapest. imgsz=None means the model's own size; model "light"
+# uses LIGHT_MODEL_PATH when it is configured and falls back to the primary model otherwise.
+DEFAULT_TIERS = [
+    {"name": "full", "imgsz": None, "conf": 0.25, "model": "primary"},
+    {"name": "reduced", "imgsz": 160, "conf": 0.35, "model": "primary"},
+    {"name": "minimal", "imgsz": 128, "conf": 0.45, "model": "light"},
+]
+
+
+def load_tiers():
+    """
+    Reads tiers from the ADAPTIVE_TIERS environment variable (a JSON list), or returns DEFAULT_TIERS.
+    """
+    tiers_json = os.getenv("ADAPTIVE_TIERS")
+    if not tiers_json:
+        return DEFAULT_TIERS
+    tiers = json.loads(tiers_json)
+    if not tiers or any("name" not in tier for tier in tiers):
+        logger.error("❌ ADAPTIVE_TIERS must be a non-empty JSON list of tiers with a name")
+        raise ValueError("❌ ADAPTIVE_TIERS must be a non-empty JSON list of tiers with a name")
+    return [{"imgsz": None, "conf": 0.25, "model": "primary", **tier} for tier in tiers]
+
+
+class AdaptiveController:
+    """
+    Steps inference quality down when the node saturates and back up when load eases.
+
+    Load is judged from the scheduler queue depth and the p95 of recent end-to-end latencies.
+    A tier change needs `cooldown` seconds since the previous one, and apart from stepping down
+    on a full queue also `min_samples` latencies measured at the new tier, so the controller
+    doesn't oscillate on an empty window. Stepping up requires both signals to be under their
+    low watermark.
+
+    Attributes:
+        tiers (list of dict): Quality tiers, index 0 is the best.
+        level (int): Index of the tier currently served.
+    """
+    def __init__(self, tiers=None, high_queue=8, low_queue=1, high_latency_ms=400, low_latency_ms=150,
+                 window=50, cooldown=2.0, min_samples=10, enabled=True):
+        self.tiers = tiers or DEFAULT_TIERS
+        self.high_queue = high_queue
+        self.low_queue = low_queue
+        self.high_latency_ms = high_latency_ms
+        self.low_latency_ms = low_latency_ms
+        self.cooldown = cooldown
+        self.min_samples = min(min_samples, window)
+        self.enabled = enabled
+        self.level = 0
+        self.changes = 0
+        self._latencies = deque(maxlen=window)
+        self._last_change = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms):
+        with self._lock:
+            self._latencies.append(latency_ms)
+
+    def p95(self):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def update(self, queue_depth, now=None):
+        """
+        Re-evaluates the tier from the current queue depth and recent latency, and returns it.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self.enabled or now - self._last_change < self.cooldown:
+                return self.tiers[self.level]
+            # Too few requests served at this tier to judge its latency yet. A saturated queue
+            # is enough to step down: under overload most requests are shed and never recorded.
+            judged = not self.changes or len(self._latencies) >= self.min_samples
+            p95 = self.p95()
+            overloaded = queue_depth >= self.high_queue or (judged and p95 >= self.high_latency_ms)
+            relaxed = judged and queue_depth <= self.low_queue and p95 <= self.low_latency_ms
+
+            if overloaded and self.level < len(self.tiers) - 1:
+                self._change(self.level + 1, now, f"queue={queue_depth}, p95={p95:.0f}ms")
+            elif relaxed and self.level > 0:
+                self._change(self.level - 1, now, f"queue={queue_depth}, p95={p95:.0f}ms")
+
+            return self.tiers[self.level]
+
+    def _change(self, level, now, reason):
+        logger.info(f"🎚️ Quality tier {self.tiers[self.level]['name']} → {self.tiers[level]['name']} ({reason})")
+        self.level = level
+        self.changes += 1
+        self._last_change = now
+        # Latencies measured at the old tier would immediately trigger another change
+        self._latencies.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {"enabled": self.enabled, "tier": self.tiers[self.level]["name"], "level": self.level,
+                    "changes": self.changes, "latency_p95_ms": round(self.p95(), 1)}
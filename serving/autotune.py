@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+
+from serving.backends import load_backend
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+AUTOTUNE_CONFIG = os.getenv("AUTOTUNE_CONFIG", "autotune.json")
+
+
+def hardware_fingerprint():
+    """
+    Identifies the node type, so a config tuned on one instance type isn't applied on another.
+    """
+    cpu_model = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    return {"machine": platform.machine(), "cpu_model": cpu_model, "cpu_count": os.cpu_count()}
+
+
+def time_inference(backend, imgsz, batch_size, runs=10, warmup=3):
+    """
+    Median wall time (seconds) of `backend.predict` on a random batch, pre- and post-processing included.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8) for _ in range(batch_size)]
+    for _ in range(warmup):
+        backend.predict(images, imgsz=imgsz)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.predict(images, imgsz=imgsz)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def thread_candidates():
+    cpu_count = os.cpu_count() or 1
+    candidates = {1, cpu_count, max(1, cpu_count // 2)}
+    candidates.update(2 ** i for i in range(1, cpu_count.bit_length()) if 2 ** i <= cpu_count)
+    return sorted(candidates)
+
+
+def largest_within(timings, target_ms):
+    """
+    Picks the largest input size whose latency (seconds) fits `target_ms`, or the fastest one if none does.
+    """
+    fitting = [size for size, seconds in timings.items() if seconds * 1000 <= target_ms]
+    if not fitting:
+        fastest = min(timings, key=timings.get)
+        logger.warning(f"⚠️ No input size fits {target_ms} ms, using the fastest: {fastest}")
+        return fastest
+    return max(fitting)
+
+
+def autotune(model_path, imgsz_options=None, runs=10, target_ms=None):
+    """
+    Benchmarks CPU inference settings on the loaded model and this machine.
+
+    Knobs are tuned one at a time (fuse, threads, inference_mode, channels_last) at batch
+    size 1, each keeping the best value found so far, which needs far fewer runs than the
+    full grid. Input size trades accuracy for speed, so it is only changed when a latency
+    budget `target_ms` is given: the largest size of `imgsz_options` that fits it is used.
+    Batch size isn't tuned: the scheduler runs one request per forward pass.
+
+    Returns
+    -------
+    dict
+        The best configuration plus every measurement taken.
+    """
+    measurements = []
+
+    def measure(backend, settings, imgsz):
+        backend.configure(threads=settings["threads"], inference_mode=settings["inference_mode"],
+                          channels_last=settings["channels_last"])
+        seconds = time_inference(backend, imgsz, 1, runs)
+        measurements.append({**settings, "imgsz": imgsz, "ms": round(seconds * 1000, 3)})
+        logger.info(f"⏱️ {measurements[-1]}")
+        return seconds
+
+    backends = {True: load_backend(model_path, fuse=True)}
+    if model_path.endswith(".pt"):
+        backends[False] = load_backend(model_path, fuse=False)
+    imgsz = backends[True].imgsz
+
+    best = {"fuse": True, "threads": os.cpu_count() or 1, "inference_mode": True, "channels_last": False}
+    for knob, options in [("fuse", list(backends)), ("threads", thread_candidates()),
+                          ("inference_mode", [True, False]), ("channels_last", [False, True])]:
+        timings = {}
+        for option in options:
+            settings = {**best, knob: option}
+            timings[option] = measure(backends[settings["fuse"]], settings, imgsz)
+        best[knob] = min(timings, key=timings.get)
+        logger.info(f"✅ Best {knob}: {best[knob]}")
+
+    backend = backends[best["fuse"]]
+    if target_ms is not None:
+        timings = {size: measure(backend, best, size) for size in (imgsz_options or [imgsz, 160, 128])}
+        imgsz = largest_within(timings, target_ms)
+    elif imgsz_options:
+        for size in imgsz_options:  # Reported for reference only
+            measure(backend, best, size)
+
+    return {**best, "imgsz": imgsz, "model": os.path.abspath(model_path),
+            "hardware": hardware_fingerprint(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "measurements": measurements}
+
+
+def save_config(config, path=AUTOTUNE_CONFIG):
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+    logger.info(f"✅ Autotune config saved to {path}")
+
+
+def load_config(path=AUTOTUNE_CONFIG, model_path=None):
+    """
+    Loads a saved autotune config if it was produced on the same hardware (and model, if given).
+
+    Returns None when there is no usable config.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        config = json.load(f)
+
+    if config.get("hardware") != hardware_fingerprint():
+        logger.warning(f"⚠️ {path} was tuned on {config.get('hardware')}, ignoring it on this node")
+        return None
+    if model_path and config.get("model") != os.path.abspath(model_path):
+        logger.warning(f"⚠️ {path} was tuned for {config.get('model')}, ignoring it for {model_path}")
+        return None
+    return config
+
+
+def apply_config(backend, config):
+    """
+    Applies a tuned config to a loaded backend. Fusing is decided at load time, see `load_backend`.
+    """
+    backend.configure(threads=config["threads"], inference_mode=config["inference_mode"],
+                      channels_last=config["channels_last"], imgsz=config["imgsz"])
+    logger.info(f"✅ Applied autotune config: threads={config['threads']}, inference_mode={config['inference_mode']}, "
+                f"channels_last={config['channels_last']}, imgsz={config['imgsz']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU inference settings and save the best to a config file.")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "best.pt"))
+    parser.add_argument("--output", default=AUTOTUNE_CONFIG)
+    parser.add_argument("--imgsz", nargs="+", type=int, default=None, help="Input sizes to benchmark")
+    parser.add_argument("--target-ms", type=float, default=None,
+                        help="Latency budget; use the largest input size that fits it (affects accuracy)")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    config = autotune(args.model, args.imgsz, args.runs, args.target_ms)
+    save_config(config, args.output)
+    print(json.dumps({k: v for k, v in config.items() if k != "measurements"}, indent=2))
+
+#python -m serving.autotune --model best.pt
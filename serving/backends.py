@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import logging
+from serving.buffer_pool import buffer_pool
+from logging_setup import setup_logging
+
+# torch, torchvision, cv2 and numpy are imported inside the functions that need them so that
+# importing the serving layer (and therefore main.py) stays cheap during container cold starts.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+VALID_MODEL_EXTENSIONS = (".pt", ".torchscript")
+LETTERBOX_COLOR = 114  # Same grey padding ultralytics uses during training
+
+
+def decode_image(image_bytes, rgb=True):
+    """
+    Decodes uploaded JPEG/PNG bytes into a numpy array, RGB or (with `rgb=False`) OpenCV's native BGR.
+
+    Returns None if the bytes cannot be decoded.
+    """
+    import cv2
+    import numpy as np
+
+    nparr = np.frombuffer(image_bytes, np.uint8)  # Bytes -> Numpy arr, a view of the upload, no copy
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)  # BGR
+    if image is None:
+        return None
+    if rgb:
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)  # BGR -> RGB in place, no second full-size frame
+    return image
+
+
+def letterbox(image, imgsz, out=None):
+    """
+    Resizes an image to fit inside a square `imgsz` canvas keeping its aspect ratio, then pads it.
+
+    With `out`, an (imgsz, imgsz, 3) uint8 array, the image is resized straight into its
+    centre and only the padding around it is filled, so no intermediate image is allocated.
+
+    Returns
+    -------
+    tuple (np.ndarray, float, tuple)
+        - The padded (imgsz, imgsz, 3) image.
+        - The scale applied to the original image.
+        - The (left, top) padding in pixels.
+    """
+    import cv2
+    import numpy as np
+
+    height, width = image.shape[:2]
+    scale = min(imgsz / width, imgsz / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    left = (imgsz - new_width) // 2
+    top = (imgsz - new_height) // 2
+
+    if out is None:
+        out = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+    out[:top] = LETTERBOX_COLOR
+    out[top + new_height:] = LETTERBOX_COLOR
+    out[top:top + new_height, :left] = LETTERBOX_COLOR
+    out[top:top + new_height, left + new_width:] = LETTERBOX_COLOR
+    region = out[top:top + new_height, left:left + new_width]
+    if (new_width, new_height) != (width, height):
+        cv2.resize(image, (new_width, new_height), dst=region, interpolation=cv2.INTER_LINEAR)
+    else:
+        region[...] = image
+
+    return out, scale, (left, top)
+
+
+def fill_input(canvas, out, bgr=False):
+    """
+    Writes an (H, W, 3) uint8 image into an (3, H, W) float32 model input scaled to [0, 1].
+
+    The HWC -> CHW transpose, the BGR -> RGB swap (`bgr=True`), the dtype conversion and the
+    scaling happen in a single pass; `out` may be a strided view, e.g. of a channels_last buffer.
+    """
+    import numpy as np
+
+    channels = canvas.transpose(2, 0, 1)
+    np.multiply(channels[::-1] if bgr else channels, np.float32(1 / 255), out=out, casting="unsafe")
+
+
+def non_max_suppression(output, conf=0.25, iou=0.45, max_det=300):
+    """
+    Filters raw YOLO head output with class-aware NMS.
+
+    Parameters
+    ----------
+    output : torch.Tensor
+        Raw detection head output of shape (batch, 4 + num_classes, anchors), boxes in xywh.
+
+    Returns
+    -------
+    list of torch.Tensor
+        One (N, 6) tensor per image with rows `x1, y1, x2, y2, confidence, class_id`.
+    """
+    import torch
+    import torchvision
+
+    output = output.transpose(1, 2)  # (batch, anchors, 4 + num_classes)
+    results = []
+    for pred in output:
+        scores, classes = pred[:, 4:].max(1)
+        keep = scores > conf
+        pred, scores, classes = pred[keep], scores[keep], classes[keep]
+
+        # xywh -> xyxy
+        boxes = torch.empty_like(pred[:, :4])
+        boxes[:, 0] = pred[:, 0] - pred[:, 2] / 2
+        boxes[:, 1] = pred[:, 1] - pred[:, 3] / 2
+        boxes[:, 2] = pred[:, 0] + pred[:, 2] / 2
+        boxes[:, 3] = pred[:, 1] + pred[:, 3] / 2
+
+        index = torchvision.ops.batched_nms(boxes, scores, classes, iou)[:max_det]
+        results.append(torch.cat([boxes[index], scores[index, None], classes[index, None].float()], dim=1))
+
+    return results
+
+
+class DetectorBackend:
+    """
+    Runs a YOLO detection network with our own letterbox pre-processing and NMS post-processing.
+
+    The same code path serves both a regular ultralytics `.pt` checkpoint and an exported
+    `.torchscript` artifact, so the exported model can be loaded without importing ultralytics.
+
+    Attributes:
+        module (torch.nn.Module): The detection network, in eval mode.
+        names (dict): Mapping of class id to label name.
+        imgsz (int): Default square input size used for inference.
+        source (str): Path the model was loaded from.
+        inference_mode (bool): Run under `torch.inference_mode` (else `torch.no_grad`).
+        channels_last (bool): Feed NHWC-strided tensors to a channels_last model.
+        pool (BufferPool): Reused letterbox and input buffers, None to allocate them per call.
+    """
+    def __init__(self, module, names, imgsz=224, source=None, pool=buffer_pool):
+        self.module = module
+        self.names = names
+        self.imgsz = imgsz
+        self.source = source
+        self.inference_mode = True
+        self.channels_last = False
+        self.pool = pool
+
+    def configure(self, threads=None, inference_mode=None, channels_last=None, imgsz=None):
+        """
+        Applies CPU inference settings, typically the ones found by serving.autotune.
+        """
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+        if inference_mode is not None:
+            self.inference_mode = inference_mode
+        if channels_last is not None and channels_last != self.channels_last:
+            memory_format = torch.channels_last if channels_last else torch.contiguous_format
+            self.module = self.module.to(memory_format=memory_format)
+            self.channels_last = channels_last
+        if imgsz:
+            self.imgsz = imgsz
+
+    def prepare_inputs(self, images, imgsz, bgr=False):
+        """
+        Letterboxes a list of images into a normalised (B, 3, imgsz, imgsz) float32 array.
+
+        Each image is resized straight into a letterbox canvas and converted into the input in
+        one pass; both buffers come from `pool`. A channels_last model gets NHWC memory viewed
+        as NCHW, so torch needs no layout copy.
+
+        Returns
+        -------
+        tuple (np.ndarray, list, list)
+            The input array, per-image `(scale, pad, shape)` metas, and the buffers to hand to `release`.
+        """
+        import numpy as np
+
+        canvas_shape = (len(images), imgsz, imgsz, 3)
+        input_shape = canvas_shape if self.channels_last else (len(images), 3, imgsz, imgsz)
+        if self.pool is not None:
+            buffers = [self.pool.acquire(canvas_shape, np.uint8), self.pool.acquire(input_shape, np.float32)]
+        else:
+            buffers = [np.empty(canvas_shape, dtype=np.uint8), np.empty(input_shape, dtype=np.float32)]
+        canvases, inputs = buffers
+        if self.channels_last:
+            inputs = inputs.transpose(0, 3, 1, 2)
+
+        metas = []
+        for i, image in enumerate(images):
+            _, scale, pad = letterbox(image, imgsz, out=canvases[i])
+            fill_input(canvases[i], inputs[i], bgr)
+            metas.append((scale, pad, image.shape[:2]))
+        return inputs, metas, buffers
+
+    def release(self, buffers):
+        if self.pool is not None:
+            for buffer in buffers:
+                self.pool.release(buffer)
+
+    def preprocess(self, images, imgsz, bgr=False):
+        """
+        Letterboxes a list of RGB (or BGR with `bgr=True`) images into a single normalised (B, 3, imgsz, imgsz) tensor.
+
+        The tensor shares memory with pooled buffers; pass the returned buffers to `release` once it is no longer used.
+        """
+        import torch
+
+        inputs, metas, buffers = self.prepare_inputs(images, imgsz, bgr)
+        return torch.from_numpy(inputs), metas, buffers
+
+    def postprocess(self, output, metas, conf, iou, max_det):
+        """
+        Applies NMS and maps boxes from letterboxed coordinates back to the original images.
+        """
+        detections = []
+        for pred, (scale, (left, top), (height, width)) in zip(non_max_suppression(output, conf, iou, max_det), metas):
+            pred[:, [0, 2]] = ((pred[:, [0, 2]] - left) / scale).clamp(0, width)
+            pred[:, [1, 3]] = ((pred[:, [1, 3]] - top) / scale).clamp(0, height)
+            detections.append(pred.numpy())
+        return detections
+
+    def predict(self, images, imgsz=None, conf=0.25, iou=0.45, max_det=300, bgr=False):
+        """
+        Runs detection on a batch of RGB images (BGR with `bgr=True`) in a single forward pass.
+
+        Returns
+        -------
+        list of np.ndarray
+            One (N, 6) array per image with rows `x1, y1, x2, y2, confidence, class_id`
+            in the coordinates of the original image.
+        """
+        import torch
+
+        if not images:
+            return []
+
+        imgsz = imgsz or self.imgsz
+        tensor, metas, buffers = self.preprocess(images, imgsz, bgr)
+        try:
+            with torch.inference_mode() if self.inference_mode else torch.no_grad():
+                output = self.module(tensor)
+        finally:
+            self.release(buffers)
+        if isinstance(output, (list, tuple)):  # ultralytics returns (predictions, raw features) in eval mode
+            output = output[0]
+
+        return self.postprocess(output, metas, conf, iou, max_det)
+
+    def warmup(self, runs=2):
+        """
+        Runs a few dummy inferences so that the first real request doesn't pay for lazy initialisation.
+        """
+        import numpy as np
+
+        dummy = np.full((self.imgsz, self.imgsz, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        for _ in range(runs):
+            self.predict([dummy])
+
+
+def load_backend(model_path, imgsz=None, fuse=True):
+    """
+    Loads a detection backend from a `.pt` checkpoint or an exported `.torchscript` artifact.
+
+    A `.torchscript` file (created with `yolo export model=best.pt format=torchscript imgsz=224`)
+    is loaded with `torch.jit.load`, skipping the ultralytics import and model construction.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the model file.
+    imgsz : int, optional
+        Inference size. Defaults to the size the model was trained/exported with.
+    fuse : bool
+        Fold BatchNorm into the preceding convolutions (`.pt` only, exports are already fused).
+
+    Returns
+    -------
+    DetectorBackend
+    """
+    if not model_path.endswith(VALID_MODEL_EXTENSIONS):
+        logger.error(f"❌ Model must be one of {VALID_MODEL_EXTENSIONS}, MODEL PATH was {model_path}")
+        raise ValueError(f"❌ Model must be one of {VALID_MODEL_EXTENSIONS}, MODEL PATH was {model_path}")
+
+    if not os.path.exists(model_path):
+        logger.error(f"❌ Model file not found: {model_path}")
+        raise FileNotFoundError(f"❌ Model file not found: {model_path}")
+
+    start = time.perf_counter()
+    if model_path.endswith(".torchscript"):
+        import torch
+
+        extra_files = {"config.txt": ""}  # Metadata ultralytics embeds on export
+        module = torch.jit.load(model_path, map_location="cpu", _extra_files=extra_files)
+        metadata = json.loads(extra_files["config.txt"]) if extra_files["config.txt"] else {}
+        names = {int(k): v for k, v in metadata.get("names", {}).items()}
+        exported_imgsz = metadata.get("imgsz", [224])
+        imgsz = imgsz or (exported_imgsz[0] if isinstance(exported_imgsz, list) else exported_imgsz)
+    else:
+        from ultralytics import YOLO
+
+        yolo = YOLO(model_path)
+        module = yolo.model
+        names = yolo.names
+        if fuse and hasattr(module, "fuse"):
+            module = module.fuse(verbose=False)  # Fold Conv+BN like the ultralytics predictor does
+        train_args = getattr(module, "args", {})
+        imgsz = imgsz or (train_args.get("imgsz", 224) if isinstance(train_args, dict) else 224)
+
+    module = module.float().eval()
+    logger.info(f"✅ Loaded {model_path} in {time.perf_counter() - start:.2f}s (imgsz={imgsz}, classes={names})")
+
+    return DetectorBackend(module, names, imgsz=imgsz, source=model_path)
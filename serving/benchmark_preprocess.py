@@ -0,0 +1,185 @@
+import gc
+import json
+import time
+import logging
+import argparse
+import resource
+import multiprocessing
+import threading
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from serving.backends import LETTERBOX_COLOR, DetectorBackend, decode_image, load_backend
+from serving.buffer_pool import BufferPool
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = ["640x480", "1280x720", "1920x1080"]
+VARIANTS = ["allocating", "fused", "fused + pool"]
+
+
+def allocating_inputs(image_bytes, imgsz):
+    """
+    Request preprocessing as it was before the buffer pool, for comparison: RGB copy of the
+    decoded frame, resized copy, fresh canvas and batch, then a float copy in NCHW order.
+    """
+    import cv2
+
+    image_bgr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    image = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    height, width = image.shape[:2]
+    scale = min(imgsz / width, imgsz / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    canvas = np.full((imgsz, imgsz, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    left, top = (imgsz - new_width) // 2, (imgsz - new_height) // 2
+    canvas[top:top + new_height, left:left + new_width] = cv2.resize(image, (new_width, new_height),
+                                                                     interpolation=cv2.INTER_LINEAR)
+    batch = canvas[None]
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2).astype(np.float32) / 255), None
+
+
+def pipeline(backend):
+    """
+    The server's full-frame path: BGR decode, letterbox into and fused conversion from `backend.pool` buffers.
+    """
+    def run(image_bytes, imgsz):
+        image = decode_image(image_bytes, rgb=False)
+        inputs, _, buffers = backend.prepare_inputs([image], imgsz, bgr=True)
+        return inputs, buffers
+    return run
+
+
+def make_frames(sizes, per_size=4, seed=0):
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for size in sizes:
+        width, height = map(int, size.split("x"))
+        for _ in range(per_size):
+            image = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+            frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return frames
+
+
+def run_variant(prepare, release, frames, imgsz, requests, threads=1, forward=None):
+    """
+    Pushes `requests` frames through `prepare` from `threads` threads.
+
+    Returns
+    -------
+    dict
+        Latency percentiles (ms), throughput, minor page faults and garbage collections per request.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(count, offset):
+        local = []
+        for i in range(count):
+            start = time.perf_counter()
+            inputs, buffers = prepare(frames[(offset + i) % len(frames)], imgsz)
+            if forward:
+                forward(inputs)
+            release(buffers)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    gc_before = sum(stat["collections"] for stat in gc.get_stats())
+    faults_before = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(requests // threads, i * 7)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults_before
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - gc_before
+
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "requests_per_second": len(latencies) / elapsed,
+        "page_faults_per_request": faults / len(latencies),
+        "gc_collections": collections,
+    }
+
+
+def allocated_per_request(prepare, release, frames, imgsz, requests=20):
+    """
+    Peak traced memory (bytes) of one request, averaged; numpy reports its buffers to tracemalloc.
+    """
+    tracemalloc.start()
+    peaks = []
+    try:
+        for i in range(requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            inputs, buffers = prepare(frames[i % len(frames)], imgsz)
+            del inputs
+            release(buffers)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+def benchmark_variant(variant, frames, imgsz, requests, threads=1, model_path=None):
+    """
+    Warms up and measures one variant; run in a fresh process so the allocator state
+    left behind by one variant doesn't skew the page faults of the next.
+    """
+    backend = DetectorBackend(module=None, names={}, pool=BufferPool() if variant == "fused + pool" else None)
+    if variant == "allocating":
+        prepare, release = allocating_inputs, lambda buffers: None
+    else:
+        prepare, release = pipeline(backend), backend.release
+
+    forward = None
+    if model_path:
+        import torch
+
+        model = load_backend(model_path, imgsz=imgsz)
+
+        def forward(inputs):
+            with torch.inference_mode():
+                model.module(torch.from_numpy(inputs))
+
+    run_variant(prepare, release, frames, imgsz, min(50, requests), threads, forward)
+    result = run_variant(prepare, release, frames, imgsz, requests, threads, forward)
+    result["allocated_bytes_per_request"] = allocated_per_request(prepare, release, frames, imgsz)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Allocating versus pooled request preprocessing.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--imgsz", type=int, default=224)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--model", default=None, help="Also run the forward pass of this model")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    frames = make_frames(args.sizes)
+    results = {}
+    print(f"\n{'variant':<16}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'faults/req':>12}{'gc':>6}{'alloc KiB':>12}")
+    for name in VARIANTS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            r = executor.submit(benchmark_variant, name, frames, args.imgsz, args.requests, args.threads,
+                                args.model).result()
+        results[name] = r
+        print(f"{name:<16}{r['latency_p50_ms']:>10.2f}{r['latency_p95_ms']:>10.2f}{r['requests_per_second']:>10.0f}"
+              f"{r['page_faults_per_request']:>12.1f}{r['gc_collections']:>6}"
+              f"{r['allocated_bytes_per_request'] / 1024:>12.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+#python -m serving.benchmark_preprocess --sizes 640x480 1920x1080 --threads 4 --model best.pt
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+
+from serving.backends import load_backend
+from serving.tiling import tiled_predict
+from model.yolo_v3_mini.evaluate import IMAGE_EXTENSIONS, evaluate_predictions, load_yolo_labels, split_paths
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# (name, keyword arguments) compared by the benchmark; imgsz=None uses the model's training size
+DEFAULT_CONFIGS = [
+    ("full", {"mode": "full"}),
+    ("full@640", {"mode": "full", "imgsz": 640}),
+    ("tiled 448/0.2/16", {"mode": "tiled", "tile_size": 448, "overlap": 0.2, "max_tiles": 16}),
+    ("tiled 320/0.2/24", {"mode": "tiled", "tile_size": 320, "overlap": 0.2, "max_tiles": 24}),
+    ("tiled 640/0.1/8", {"mode": "tiled", "tile_size": 640, "overlap": 0.1, "max_tiles": 8}),
+]
+
+
+def benchmark_config(backend, images, ground_truths, config, conf=0.25):
+    """
+    Runs one inference configuration over all images, one image at a time like the server does.
+
+    Returns
+    -------
+    dict
+        Latency percentiles (ms) and recall / mAP at `conf`.
+    """
+    options = dict(config)
+    mode = options.pop("mode")
+
+    latencies, predictions = [], []
+    for image in images:
+        start = time.perf_counter()
+        if mode == "tiled":
+            detections = tiled_predict(backend, image, conf=0.001, **options)
+        else:
+            detections = backend.predict([image], conf=0.001, **options)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(detections)
+
+    shapes = [image.shape[:2] for image in images]
+    metrics = evaluate_predictions(predictions, ground_truths, shapes, backend.names, conf_threshold=conf)
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "recall": metrics["overall"]["recall"],
+        "recall_small": metrics["per_size"]["small"]["recall"],
+        "mAP_0.5": metrics["overall"]["mAP_0.5"],
+    }
+
+
+def load_images(image_dir, label_dir, limit=None):
+    import cv2
+
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    images, ground_truths = [], []
+    for name in files:
+        image = cv2.cvtColor(cv2.imread(os.path.join(image_dir, name)), cv2.COLOR_BGR2RGB)
+        images.append(image)
+        ground_truths.append(load_yolo_labels(os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"),
+                                              image.shape[:2]))
+    return images, ground_truths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall versus latency of full-frame and tiled inference.")
+    parser.add_argument("--model", default="best.pt")
+    parser.add_argument("--method", default="resize_pad", help="data_yolo method whose split is used")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--image-dir", default=None, help="Override: directory of high-resolution frames")
+    parser.add_argument("--label-dir", default=None, help="Override: YOLO labels for --image-dir")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    image_dir, label_dir = split_paths(args.method, args.split)
+    images, ground_truths = load_images(args.image_dir or image_dir, args.label_dir or label_dir, args.limit)
+    backend = load_backend(args.model)
+    backend.warmup()
+
+    results = {}
+    print(f"\n{'config':<20}{'p50 ms':>10}{'p95 ms':>10}{'recall':>10}{'recall(s)':>11}{'mAP50':>8}")
+    for name, config in DEFAULT_CONFIGS:
+        results[name] = benchmark_config(backend, images, ground_truths, config, args.conf)
+        r = results[name]
+        print(f"{name:<20}{r['latency_p50_ms']:>10.1f}{r['latency_p95_ms']:>10.1f}{r['recall']:>10.3f}"
+              f"{r['recall_small']:>11.3f}{r['mAP_0.5']:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+#python -m serving.benchmark_tiling --model best.pt --image-dir data_cctv/images --label-dir data_cctv/labels
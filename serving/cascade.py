@@ -0,0 +1,125 @@
+import os
+import logging
+import threading
+
+from serving.tiling import nms
+from logging_setup import setup_logging
+
+# cv2 / numpy are imported inside the functions, like serving.backends, to keep main.py cheap to import.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+CASCADE_IMGSZ = int(os.getenv("CASCADE_IMGSZ", "128"))  # Crop input size, multiple of the model stride (32)
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "0.5"))  # Context added around each proposal
+CASCADE_MAX_CROPS = int(os.getenv("CASCADE_MAX_CROPS", "16"))
+PROPOSAL_MAX_SIDE = 640  # Frames are downscaled to this before running the proposal stage
+
+
+class FaceProposer:
+    """
+    Cheap face proposal stage built on the Haar cascade shipped with opencv-python.
+
+    `cv2.CascadeClassifier.detectMultiScale` isn't safe to call on one instance from several
+    threads, so every inference (and shadow) thread lazily loads its own classifier.
+
+    Attributes:
+        cascade_path (str): The frontal face cascade file.
+        min_neighbors (int): Higher values give fewer, more confident proposals.
+    """
+    def __init__(self, cascade_file="haarcascade_frontalface_default.xml", scale_factor=1.1, min_neighbors=3,
+                 min_size=16):
+        import cv2
+
+        self.cascade_path = os.path.join(cv2.data.haarcascades, cascade_file)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._local = threading.local()
+        self.classifier  # Fail at startup rather than on the first cascade request
+
+    @property
+    def classifier(self):
+        """
+        This thread's `cv2.CascadeClassifier`.
+        """
+        import cv2
+
+        classifier = getattr(self._local, "classifier", None)
+        if classifier is None:
+            classifier = cv2.CascadeClassifier(self.cascade_path)
+            if classifier.empty():
+                logger.error(f"❌ Could not load Haar cascade: {self.cascade_path}")
+                raise FileNotFoundError(f"❌ Could not load Haar cascade: {self.cascade_path}")
+            self._local.classifier = classifier
+        return classifier
+
+    def propose(self, image):
+        """
+        Finds candidate face regions in an RGB image.
+
+        Returns
+        -------
+        list of tuple
+            `(x1, y1, x2, y2)` boxes in image coordinates.
+        """
+        import cv2
+
+        height, width = image.shape[:2]
+        scale = min(1.0, PROPOSAL_MAX_SIDE / max(height, width))
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        faces = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                 minSize=(self.min_size, self.min_size))
+        return [(int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale)) for x, y, w, h in faces]
+
+
+def expand_box(box, margin, width, height):
+    """
+    Grows a box by `margin` of its size on every side and makes it square, clipped to the image.
+    """
+    x1, y1, x2, y2 = box
+    side = max(x2 - x1, y2 - y1) * (1 + 2 * margin)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    return (max(0, int(cx - side / 2)), max(0, int(cy - side / 2)),
+            min(width, int(cx + side / 2)), min(height, int(cy + side / 2)))
+
+
+def cascade_predict(backend, image, proposer, imgsz=CASCADE_IMGSZ, margin=CASCADE_MARGIN, max_crops=CASCADE_MAX_CROPS,
+                    conf=0.25, iou=0.45, full_imgsz=None):
+    """
+    Two-stage detection: cheap face proposals, then the mask detector on small crops in one batch.
+
+    Falls back to a full-frame pass when the proposal stage finds nothing, or finds more
+    faces than `max_crops` (a crowded scene is cheaper to run as one frame). The fallback runs
+    at `full_imgsz`, the backend's input size if not given.
+
+    Returns
+    -------
+    tuple (np.ndarray, bool)
+        - (N, 6) detections in image coordinates.
+        - Whether the full-frame fallback was used.
+    """
+    import numpy as np
+
+    height, width = image.shape[:2]
+    proposals = proposer.propose(image)
+    if not proposals or len(proposals) > max_crops:
+        return backend.predict([image], imgsz=full_imgsz, conf=conf, iou=iou)[0], True
+
+    windows = [expand_box(box, margin, width, height) for box in proposals]
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    results = backend.predict(crops, imgsz=imgsz, conf=conf, iou=iou)
+
+    merged = []
+    for (x1, y1, _, _), detections in zip(windows, results):
+        detections = detections.copy()
+        detections[:, [0, 2]] += x1
+        detections[:, [1, 3]] += y1
+        merged.append(detections)
+    merged = np.concatenate(merged)
+
+    # Overlapping crops of neighbouring faces can see the same face twice
+    return nms(merged, 0.6, use_min_area=True), False
@@ -0,0 +1,244 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DETECTIONS_DB = os.getenv("DETECTIONS_DB", "detections.db")
+BUCKETS = {"hour": 3600, "day": 86400}
+
+_STOP = object()  # Tells the writer thread to flush and exit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS idx_detections_camera_ts ON detections (camera, ts);
+CREATE INDEX IF NOT EXISTS idx_detections_label_ts ON detections (label, ts);
+
+-- Per hour, camera and label counts kept up to date by the writer, so reports read a few
+-- rows per hour instead of scanning every detection
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    hour INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, camera, label)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_hourly_counts_camera ON hourly_counts (camera, hour);
+"""
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer and vice versa
+    connection.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, avoids an fsync per commit
+    return connection
+
+
+class DetectionStore:
+    """
+    Embedded SQLite store for every detection the server returns.
+
+    `add` only puts the detections on an in-memory queue, so persisting never adds latency
+    to a request. A background thread drains the queue and inserts whatever has accumulated
+    in one transaction (up to `batch_size` frames, at least every `flush_interval` seconds),
+    updating the hourly rollup in the same transaction. If the writer falls behind by more
+    than `max_pending` frames new ones are dropped and counted instead of growing memory.
+
+    Attributes:
+        path (str): SQLite database file.
+        stats (dict): Counters exposed by the /stats endpoint.
+    """
+    def __init__(self, path=DETECTIONS_DB, batch_size=500, flush_interval=1.0, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"frames": 0, "detections": 0, "batches": 0, "dropped": 0, "errors": 0}
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+        with connect(path) as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name="detection-store", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        Writes everything still queued and stops the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def add(self, camera, detections, mode=None, ts=None):
+        """
+        Queues the detections of one frame for writing. Never blocks.
+
+        Parameters
+        ----------
+        camera : str
+            Camera or source id the frame came from.
+        detections : list of dict
+            As returned by /detect_mask: `label`, `confidence` and `bbox`.
+        """
+        try:
+            self._queue.put_nowait((time.time() if ts is None else ts, camera, mode, detections))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _writer(self):
+        connection = connect(self.path)
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    frames = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(frames) < self.batch_size:
+                    try:
+                        frames.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if _STOP in frames:
+                    stopping = True
+                    frames = [frame for frame in frames if frame is not _STOP]
+                    while not self._queue.empty():
+                        frames.append(self._queue.get_nowait())
+                if frames:
+                    self._write(connection, frames)
+        finally:
+            connection.close()
+
+    def _write(self, connection, frames):
+        rows = []
+        counts = {}
+        for ts, camera, mode, detections in frames:
+            hour = int(ts // 3600 * 3600)
+            for detection in detections:
+                x1, y1, x2, y2 = detection["bbox"]
+                rows.append((ts, camera, detection["label"], detection["confidence"], x1, y1, x2, y2, mode))
+                key = (hour, camera, detection["label"])
+                counts[key] = counts.get(key, 0) + 1
+
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT INTO detections (ts, camera, label, confidence, x1, y1, x2, y2, mode) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.executemany(
+                    "INSERT INTO hourly_counts (hour, camera, label, count) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (hour, camera, label) DO UPDATE SET count = count + excluded.count",
+                    [(*key, count) for key, count in counts.items()])
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.error(f"❌ Failed to write {len(rows)} detections: {e}")
+            return
+
+        self.stats["frames"] += len(frames)
+        self.stats["detections"] += len(rows)
+        self.stats["batches"] += 1
+
+    def label_share(self, label="without_mask", bucket="hour", start=None, end=None, camera=None, by_camera=False):
+        """
+        Share of detections with `label` per time bucket, e.g. percent without_mask per hour.
+
+        Reads the hourly rollup, so the cost depends on the number of hours and cameras in
+        range, not on the number of detections.
+
+        Parameters
+        ----------
+        bucket : str
+            One of `BUCKETS` ("hour" or "day", UTC).
+        start, end : float, optional
+            Unix time range; partial hours at either end are included whole.
+        camera : str, optional
+            Only this camera.
+        by_camera : bool
+            One row per bucket and camera instead of per bucket.
+
+        Returns
+        -------
+        list of dict
+            `period`, `total`, `count` and `percent` (plus `camera` when grouped by camera), oldest first.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"❌ bucket must be one of {list(BUCKETS)}")
+
+        size = BUCKETS[bucket]
+        conditions, params = [], [label]
+        if start is not None:
+            conditions.append("hour >= ?")
+            params.append(int(start // 3600 * 3600))
+        if end is not None:
+            conditions.append("hour <= ?")
+            params.append(int(end))
+        if camera is not None:
+            conditions.append("camera = ?")
+            params.append(camera)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        group = f"hour / {size} * {size}" + (", camera" if by_camera else "")
+        sql = (f"SELECT hour / {size} * {size} AS period, {'camera' if by_camera else 'NULL'}, SUM(count), "
+               f"SUM(CASE WHEN label = ? THEN count ELSE 0 END) FROM hourly_counts {where} "
+               f"GROUP BY {group} ORDER BY period")
+
+        connection = connect(self.path)
+        try:
+            rows = connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+        report = []
+        for period, row_camera, total, count in rows:
+            entry = {"period": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(period)), "total": total,
+                     "count": count, "percent": round(100 * count / total, 2) if total else 0.0}
+            if by_camera:
+                entry["camera"] = row_camera
+            report.append(entry)
+        return report
+
+    def recent(self, limit=100, camera=None, label=None):
+        """
+        Latest stored detections, newest first.
+        """
+        conditions, params = [], []
+        if camera is not None:
+            conditions.append("camera = ?")
+            params.append(camera)
+        if label is not None:
+            conditions.append("label = ?")
+            params.append(label)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = connect(self.path)
+        try:
+            rows = connection.execute(
+                f"SELECT ts, camera, label, confidence, x1, y1, x2, y2, mode FROM detections {where} "
+                f"ORDER BY ts DESC LIMIT ?", [*params, limit]).fetchall()
+        finally:
+            connection.close()
+        return [{"ts": row[0], "camera": row[1], "label": row[2], "confidence": row[3], "bbox": list(row[4:8]),
+                 "mode": row[8]} for row in rows]
+
+    def snapshot(self):
+        return {**self.stats, "pending": self._queue.qsize()}
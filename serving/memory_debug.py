@@ -0,0 +1,152 @@
+import os
+import gc
+import sys
+import time
+import logging
+import linecache
+import tracemalloc
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+MEMORY_DEBUG_FRAMES = int(os.getenv("MEMORY_DEBUG_FRAMES", "10"))  # Stack depth kept by tracemalloc
+
+
+def process_rss(pid=None):
+    """
+    Resident set size in bytes of this process (or `pid`), read from /proc. None where unavailable.
+    """
+    path = f"/proc/{pid or 'self'}/status"
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def torch_memory_stats(count_tensors=False):
+    """
+    Allocator stats if torch is already loaded (never imports it).
+
+    `count_tensors` walks the garbage collector for live tensors, which is slow but shows
+    tensors kept alive by a leak even on CPU, where torch has no allocator counters.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+
+    stats = {"threads": torch.get_num_threads()}
+    if torch.cuda.is_available():
+        stats["cuda_allocated"] = torch.cuda.memory_allocated()
+        stats["cuda_reserved"] = torch.cuda.memory_reserved()
+    if count_tensors:
+        tensors = [obj for obj in gc.get_objects() if isinstance(obj, torch.Tensor)]
+        stats["live_tensors"] = len(tensors)
+        stats["live_tensor_bytes"] = sum(t.element_size() * t.nelement() for t in tensors if not t.is_cuda)
+    return stats
+
+
+def _format_stat(stat):
+    frame = stat.traceback[0]
+    return {"site": f"{frame.filename}:{frame.lineno}", "size": stat.size, "count": stat.count,
+            "traceback": stat.traceback.format()[-6:]}
+
+
+def _format_diff(stat):
+    return {**_format_stat(stat), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+
+
+class MemoryTracker:
+    """
+    Live memory snapshots for the opt-in /debug/memory endpoint and the soak test.
+
+    Starts tracemalloc (which slows allocation-heavy code, so only when asked for) and keeps
+    a baseline snapshot; each snapshot reports the allocation sites that grew the most
+    since the baseline next to RSS, torch and garbage collector counters.
+
+    Attributes:
+        started (float): `time.time()` when tracing started.
+        baseline (tracemalloc.Snapshot): Snapshot growth is measured against.
+    """
+    def __init__(self, frames=MEMORY_DEBUG_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.started = time.time()
+        self.baseline = self._take()
+
+    @staticmethod
+    def _take():
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),  # Filled by formatting our own tracebacks
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ])
+
+    def reset_baseline(self):
+        self.baseline = self._take()
+
+    def snapshot(self, top=20, count_tensors=False):
+        """
+        Current memory state plus the `top` allocation sites by size and by growth since the baseline.
+
+        Grouping the traces takes seconds on a loaded server and holds the GIL; with `top=0`
+        only the cheap counters are returned.
+        """
+        traced, peak = tracemalloc.get_traced_memory()
+        state = {
+            "time": time.time(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "rss_bytes": process_rss(),
+            "traced_bytes": traced,
+            "traced_peak_bytes": peak,
+            "gc_objects": len(gc.get_objects()),
+            "gc_counts": gc.get_count(),
+            "torch": torch_memory_stats(count_tensors),
+        }
+        if top:
+            snapshot = self._take()
+            state["top_sites"] = [_format_stat(stat) for stat in snapshot.statistics("lineno")[:top]]
+            state["top_growth"] = [_format_diff(stat) for stat in snapshot.compare_to(self.baseline, "lineno")[:top]
+                                   if stat.size_diff > 0]
+        return state
+
+
+def detect_growth(times, values, threshold_per_hour, min_duration=1800):
+    """
+    Flags sustained growth in a memory series, e.g. RSS sampled over a soak test.
+
+    Growth is flagged when the least-squares slope exceeds `threshold_per_hour` and the
+    median of every quarter of the series is at least that of the previous quarter, so a
+    one-off jump (model load, cache fill) or noisy plateau isn't reported as a leak.
+
+    Parameters
+    ----------
+    times : list of float
+        Sample times in seconds.
+    values : list of float
+        Memory at each sample, in any unit (the slope is in the same unit per hour).
+    min_duration : float
+        Series shorter than this (seconds) are never flagged.
+
+    Returns
+    -------
+    dict
+        `slope_per_hour`, `growth` (last quarter median - first quarter median), `monotonic` and `flagged`.
+    """
+    import numpy as np
+
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(times) < 8:
+        return {"slope_per_hour": None, "growth": None, "monotonic": None, "flagged": False}
+
+    slope = np.polyfit(times - times[0], values, 1)[0] * 3600
+    medians = [float(np.median(quarter)) for quarter in np.array_split(values, 4)]
+    monotonic = all(later >= earlier for earlier, later in zip(medians, medians[1:]))
+    long_enough = times[-1] - times[0] >= min_duration
+    return {"slope_per_hour": float(slope), "growth": medians[-1] - medians[0], "monotonic": monotonic,
+            "flagged": bool(long_enough and monotonic and slope > threshold_per_hour)}
@@ -0,0 +1,99 @@
+import logging
+from logging_setup import setup_logging
+
+# cv2 / numpy are imported inside the functions, like serving.backends, to keep main.py cheap to import.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = {0: "without_mask", 1: "with_mask"}  # Same ids as convert_to_yolo_format
+COLOURS = {"with_mask": (0, 200, 0), "without_mask": (0, 0, 230)}  # BGR
+DEFAULT_COLOUR = (0, 165, 255)
+IMAGE_FORMATS = {"jpeg": ".jpg", "png": ".png"}
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+
+
+def draw_boxes(image_bgr, boxes, thickness=None, font_scale=None):
+    """
+    Draws labelled boxes on a BGR image in place with OpenCV primitives.
+
+    Parameters
+    ----------
+    image_bgr : np.ndarray
+        (H, W, 3) uint8 image, modified in place.
+    boxes : list of tuple
+        `(x1, y1, x2, y2, label, confidence)` in pixels; confidence may be None.
+    thickness, font_scale : optional
+        Scaled with the image size by default, so thumbnails and 1080p frames both stay readable.
+
+    Returns
+    -------
+    np.ndarray
+        The same image.
+    """
+    import cv2
+
+    height, width = image_bgr.shape[:2]
+    thickness = thickness or max(1, round(max(height, width) / 400))
+    font_scale = font_scale or max(0.35, max(height, width) / 1200)
+
+    for x1, y1, x2, y2, label, confidence in boxes:
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        colour = COLOURS.get(label, DEFAULT_COLOUR)
+        cv2.rectangle(image_bgr, (x1, y1), (x2, y2), colour, thickness, cv2.LINE_AA)
+
+        text = label if confidence is None else f"{label} {confidence:.0%}"
+        (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        top = y1 - text_h - baseline if y1 - text_h - baseline >= 0 else y1  # Inside the box at the top edge
+        cv2.rectangle(image_bgr, (x1, top), (x1 + text_w, top + text_h + baseline), colour, cv2.FILLED)
+        cv2.putText(image_bgr, text, (x1, top + text_h), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 1,
+                    cv2.LINE_AA)
+    return image_bgr
+
+
+def draw_detections(image_bgr, detections, **kwargs):
+    """
+    Draws /detect_mask detections (`label`, `confidence`, `bbox` dicts) on a BGR image in place.
+    """
+    boxes = [(*detection["bbox"], detection["label"], detection["confidence"]) for detection in detections]
+    return draw_boxes(image_bgr, boxes, **kwargs)
+
+
+def draw_yolo_labels(image_bgr, labels, names=CLASS_NAMES, **kwargs):
+    """
+    Draws YOLO label rows (`class_id x_center y_center width height`, normalised) on a BGR image in place.
+    """
+    height, width = image_bgr.shape[:2]
+    boxes = []
+    for class_id, x_center, y_center, box_w, box_h in labels:
+        boxes.append(((x_center - box_w / 2) * width, (y_center - box_h / 2) * height,
+                      (x_center + box_w / 2) * width, (y_center + box_h / 2) * height,
+                      names.get(int(class_id), str(int(class_id))), None))
+    return draw_boxes(image_bgr, boxes, **kwargs)
+
+
+def encode_image(image_bgr, image_format="jpeg", quality=85):
+    """
+    Encodes a BGR image as JPEG or PNG bytes.
+    """
+    import cv2
+
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"❌ image_format must be one of {list(IMAGE_FORMATS)}")
+
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if image_format == "jpeg" else [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    ok, buffer = cv2.imencode(IMAGE_FORMATS[image_format], image_bgr, params)
+    if not ok:
+        raise ValueError(f"❌ Could not encode image as {image_format}")
+    return buffer.tobytes()
+
+
+def render_detections(image_rgb, detections, image_format="jpeg", quality=85):
+    """
+    Annotated image bytes for a decoded upload and its detections.
+    """
+    import cv2
+
+    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)  # New array, the decoded frame stays untouched
+    draw_detections(image_bgr, detections)
+    return encode_image(image_bgr, image_format, quality)
@@ -0,0 +1,201 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Lower value is served first; live camera frames always go ahead of bulk uploads
+PRIORITIES = {"live": 0, "batch": 1}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request can no longer finish before its deadline."""
+
+
+class LoadShed(Exception):
+    """Raised when a request is dropped because the queue is full of more urgent work."""
+
+
+class _Job:
+    __slots__ = ("fn", "deadline", "priority", "future", "loop", "enqueued")
+
+    def __init__(self, fn, deadline, priority, future, loop):
+        self.fn = fn
+        self.deadline = deadline
+        self.priority = priority
+        self.future = future
+        self.loop = loop
+        self.enqueued = time.monotonic()
+
+
+def _resolve(future, result=None, error=None):
+    # Runs on the event loop; the client may have gone away in the meantime
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class InferenceScheduler:
+    """
+    Earliest-deadline-first queue in front of the model.
+
+    Jobs are ordered by priority class, then by deadline (jobs without a deadline last), then
+    by arrival. Before a job is started the scheduler checks that it can still finish in time,
+    using a moving average of recent service times, so model time is never spent on answers
+    that would arrive too late. When the queue is full the least urgent job is shed.
+
+    Attributes:
+        max_queue (int): Maximum number of waiting jobs.
+        service_time (float): Exponential moving average of job run time, in seconds.
+        stats (dict): Counters exposed by the /stats endpoint.
+    """
+    def __init__(self, max_queue=64, workers=1, initial_service_time=0.05, smoothing=0.2):
+        self.max_queue = max_queue
+        self.workers = workers
+        self.service_time = initial_service_time
+        self.smoothing = smoothing
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "expired": 0, "shed": 0}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def queue_depth(self):
+        return len(self._heap)
+
+    def _key(self, job):
+        return (PRIORITIES[job.priority], job.deadline if job.deadline is not None else float("inf"))
+
+    def _can_finish(self, job, now):
+        return job.deadline is None or now + self.service_time <= job.deadline
+
+    async def submit(self, fn, deadline=None, priority="live"):
+        """
+        Queues `fn` to run on an inference thread and waits for its result.
+
+        Parameters
+        ----------
+        fn : callable
+            Blocking function with no arguments.
+        deadline : float, optional
+            `time.monotonic()` value after which the result is useless.
+        priority : str
+            One of `PRIORITIES`.
+
+        Raises
+        ------
+        DeadlineExceeded
+            If the job can't finish before its deadline, now or by the time it reaches the front.
+        LoadShed
+            If the queue is full and this job is the least urgent one.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"❌ priority must be one of {list(PRIORITIES)}")
+
+        loop = asyncio.get_running_loop()
+        job = _Job(fn, deadline, priority, loop.create_future(), loop)
+
+        with self._condition:
+            self.stats["submitted"] += 1
+            if not self._can_finish(job, time.monotonic()):
+                self.stats["expired"] += 1
+                raise DeadlineExceeded("Deadline can't be met")
+
+            entry = (*self._key(job), next(self._sequence), job)
+            if len(self._heap) >= self.max_queue:
+                least_urgent = max(self._heap)
+                if entry[:3] > least_urgent[:3]:
+                    self.stats["shed"] += 1
+                    raise LoadShed("Queue full")
+                # Make room by shedding the least urgent waiting job
+                self._heap.remove(least_urgent)
+                heapq.heapify(self._heap)
+                self.stats["shed"] += 1
+                shed_job = least_urgent[3]
+                shed_job.loop.call_soon_threadsafe(_resolve, shed_job.future, None, LoadShed("Queue full"))
+
+            heapq.heappush(self._heap, entry)
+            self._condition.notify()
+
+        return await job.future
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                job = heapq.heappop(self._heap)[3]
+
+            if job.future.cancelled():  # Client disconnected while waiting
+                continue
+
+            if not self._can_finish(job, time.monotonic()):
+                with self._condition:
+                    self.stats["expired"] += 1
+                job.loop.call_soon_threadsafe(_resolve, job.future, None, DeadlineExceeded("Deadline passed in queue"))
+                continue
+
+            start = time.monotonic()
+            try:
+                result = job.fn()
+                error = None
+            except Exception as e:
+                result, error = None, e
+            elapsed = time.monotonic() - start
+
+            with self._condition:
+                self.service_time += self.smoothing * (elapsed - self.service_time)
+                self.stats["failed" if error else "completed"] += 1
+            job.loop.call_soon_threadsafe(_resolve, job.future, result, error)
+
+    def snapshot(self):
+        with self._condition:
+            by_priority = {name: 0 for name in PRIORITIES}
+            for entry in self._heap:
+                by_priority[entry[3].priority] += 1
+            return {**self.stats, "queue_depth": len(self._heap), "queued_by_priority": by_priority,
+                    "service_time_ms": round(self.service_time * 1000, 2)}
+
+
+def request_deadline(deadline_ms=None, max_age_ms=None, default_max_age_ms=None):
+    """
+    Converts client deadline headers into a `time.monotonic()` deadline.
+
+    Parameters
+    ----------
+    deadline_ms : str, optional
+        `X-Deadline-Ms`: absolute Unix time in milliseconds.
+    max_age_ms : str, optional
+        `X-Max-Age-Ms`: how long from now the answer is still useful.
+    default_max_age_ms : float, optional
+        Applied when the client sends neither header.
+
+    Returns
+    -------
+    float or None
+        The earliest of the given deadlines, or None if there is none.
+    """
+    now_monotonic = time.monotonic()
+    deadlines = []
+    if deadline_ms is not None:
+        deadlines.append(now_monotonic + (float(deadline_ms) / 1000 - time.time()))
+    if max_age_ms is not None:
+        deadlines.append(now_monotonic + float(max_age_ms) / 1000)
+    if not deadlines and default_max_age_ms:
+        deadlines.append(now_monotonic + default_max_age_ms / 1000)
+    return min(deadlines) if deadlines else None
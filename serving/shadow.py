@@ -0,0 +1,221 @@
+import os
+import time
+import queue
+import random
+import logging
+import threading
+from collections import deque
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+SHADOW_MODEL_PATH = os.getenv("SHADOW_MODEL_PATH")  # Candidate model evaluated on live traffic, e.g. a retrained best.pt
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))  # Fraction of requests also sent to the candidate
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "4"))
+SHADOW_MATCH_IOU = float(os.getenv("SHADOW_MATCH_IOU", "0.5"))
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise IoU of two (N, 4+) and (M, 4+) arrays of `x1, y1, x2, y2` boxes -> (N, M).
+    """
+    import numpy as np
+
+    a = np.asarray(boxes_a, dtype=np.float64)[:, None, :4]
+    b = np.asarray(boxes_b, dtype=np.float64)[None, :, :4]
+    width = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(0)
+    height = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(0)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+def compare_detections(primary, candidate, iou_threshold=0.5):
+    """
+    Greedily matches candidate boxes to primary boxes by IoU, regardless of class.
+
+    Parameters
+    ----------
+    primary, candidate : np.ndarray
+        (N, 6) arrays with rows `x1, y1, x2, y2, confidence, class_id`, as returned by `DetectorBackend.predict`.
+
+    Returns
+    -------
+    dict
+        - `matched`: Boxes both models found with the same class.
+        - `label_mismatch`: Boxes both models found with a different class.
+        - `missed`: Primary boxes the candidate didn't find.
+        - `extra`: Candidate boxes the primary didn't find.
+        - `iou_sum`, `confidence_delta_sum`: Over matched and mismatched pairs, for averages.
+    """
+    import numpy as np
+
+    primary = np.asarray(primary).reshape(-1, 6)
+    candidate = np.asarray(candidate).reshape(-1, 6)
+    result = {"matched": 0, "label_mismatch": 0, "missed": len(primary), "extra": len(candidate),
+              "iou_sum": 0.0, "confidence_delta_sum": 0.0}
+    if not len(primary) or not len(candidate):
+        return result
+
+    ious = box_iou(primary, candidate)
+    # Highest IoU pairs first, every box used at most once
+    for flat_index in np.argsort(ious, axis=None)[::-1]:
+        i, j = np.unravel_index(flat_index, ious.shape)
+        if ious[i, j] < iou_threshold:
+            break
+        if ious[i].max() < 0 or ious[:, j].max() < 0:  # Already paired
+            continue
+        same_label = int(primary[i, 5]) == int(candidate[j, 5])
+        result["matched" if same_label else "label_mismatch"] += 1
+        result["missed"] -= 1
+        result["extra"] -= 1
+        result["iou_sum"] += float(ious[i, j])
+        result["confidence_delta_sum"] += float(candidate[j, 4] - primary[i, 4])
+        ious[i, :] = -1
+        ious[:, j] = -1
+    return result
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate model on a sample of live requests off the critical path.
+
+    The request handler only calls `offer` once the primary answer is known, which is a
+    random draw plus a non-blocking put on a small bounded queue; a single background thread
+    runs the candidate on the same decoded frame, mode and tier and compares its boxes with
+    the primary ones. Shadow work is the first thing to go under load: frames are not sampled
+    while `overloaded()` says the node is busy, queued frames are dropped if it becomes busy
+    before they run, and a full queue drops new frames instead of growing.
+
+    Attributes:
+        backend (DetectorBackend): The candidate model.
+        sample_rate (float): Fraction of requests offered to the candidate.
+        stats (dict): Counters exposed by the /stats/shadow endpoint.
+    """
+    def __init__(self, backend, predict, sample_rate=SHADOW_SAMPLE_RATE, max_pending=SHADOW_MAX_PENDING,
+                 overloaded=None, iou_threshold=SHADOW_MATCH_IOU, window=500, seed=None):
+        """
+        Parameters
+        ----------
+        predict : callable
+            `predict(backend, image, mode, imgsz, conf, bgr)` -> ((N, 6) array, fallback), the same
+            function the primary path uses, so both models see identical pre- and post-processing.
+        overloaded : callable, optional
+            Returns True while the primary path is under pressure.
+        """
+        self.backend = backend
+        self.predict = predict
+        self.sample_rate = sample_rate
+        self.overloaded = overloaded or (lambda: False)
+        self.iou_threshold = iou_threshold
+        self.stats = {"offered": 0, "sampled": 0, "shed_load": 0, "dropped_full": 0, "completed": 0, "failed": 0,
+                      "frames_agreeing": 0, "matched": 0, "label_mismatch": 0, "missed": 0, "extra": 0,
+                      "iou_sum": 0.0, "confidence_delta_sum": 0.0}
+        self._primary_ms = deque(maxlen=window)
+        self._candidate_ms = deque(maxlen=window)
+        self._disagreements = deque(maxlen=20)
+        self._random = random.Random(seed)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name="shadow", daemon=True)
+            self._thread.start()
+
+    def offer(self, image, primary, mode, imgsz, conf, primary_ms, bgr=False):
+        """
+        Maybe queues a frame for the candidate. Never blocks and never raises.
+
+        Parameters
+        ----------
+        image : np.ndarray
+            The decoded frame, RGB or BGR (`bgr=True`); it is only read, never modified.
+        primary : np.ndarray
+            The primary model's (N, 6) detections for the frame.
+        primary_ms : float
+            Model time of the primary path, compared with the candidate's.
+        """
+        with self._lock:
+            self.stats["offered"] += 1
+            if self._random.random() >= self.sample_rate:
+                return False
+            if self.overloaded():
+                self.stats["shed_load"] += 1
+                return False
+        try:
+            self._queue.put_nowait((image, primary, mode, imgsz, conf, primary_ms, bgr))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped_full"] += 1
+            return False
+        with self._lock:
+            self.stats["sampled"] += 1
+        return True
+
+    def _worker(self):
+        while True:
+            image, primary, mode, imgsz, conf, primary_ms, bgr = self._queue.get()
+            if self.overloaded():  # Load went up while the frame waited
+                with self._lock:
+                    self.stats["shed_load"] += 1
+                continue
+
+            start = time.perf_counter()
+            try:
+                candidate, _ = self.predict(self.backend, image, mode, imgsz, conf, bgr)
+                candidate_ms = (time.perf_counter() - start) * 1000
+                comparison = compare_detections(primary, candidate, self.iou_threshold)
+            except Exception as e:
+                with self._lock:
+                    self.stats["failed"] += 1
+                logger.warning(f"⚠️ Shadow model failed: {e}")
+                continue
+            self._record(comparison, mode, primary_ms, candidate_ms)
+
+    def _record(self, comparison, mode, primary_ms, candidate_ms):
+        with self._lock:
+            self.stats["completed"] += 1
+            for key, value in comparison.items():
+                self.stats[key] += value
+            agreeing = not (comparison["label_mismatch"] or comparison["missed"] or comparison["extra"])
+            if agreeing:
+                self.stats["frames_agreeing"] += 1
+            else:
+                self._disagreements.append({"time": time.time(), "mode": mode,
+                                            **{key: comparison[key] for key in ["label_mismatch", "missed", "extra"]}})
+            self._primary_ms.append(primary_ms)
+            self._candidate_ms.append(candidate_ms)
+
+    def snapshot(self):
+        with self._lock:
+            stats = {key: value for key, value in self.stats.items() if not key.endswith("_sum")}
+            paired = self.stats["matched"] + self.stats["label_mismatch"]
+            boxes = paired + self.stats["missed"] + self.stats["extra"]
+            primary_ms, candidate_ms = list(self._primary_ms), list(self._candidate_ms)
+            return {
+                "model": getattr(self.backend, "source", None),
+                "sample_rate": self.sample_rate,
+                "pending": self._queue.qsize(),
+                **stats,
+                "frame_agreement": round(self.stats["frames_agreeing"] / self.stats["completed"], 4)
+                if self.stats["completed"] else None,
+                "box_agreement": round(self.stats["matched"] / boxes, 4) if boxes else None,
+                "mean_iou": round(self.stats["iou_sum"] / paired, 4) if paired else None,
+                "mean_confidence_delta": round(self.stats["confidence_delta_sum"] / paired, 4) if paired else None,
+                "latency_ms": {
+                    "primary_p50": _percentile(primary_ms, 0.5), "primary_p95": _percentile(primary_ms, 0.95),
+                    "candidate_p50": _percentile(candidate_ms, 0.5), "candidate_p95": _percentile(candidate_ms, 0.95),
+                },
+                "recent_disagreements": list(self._disagreements),
+            }
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import logging
+import threading
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+from serving.memory_debug import detect_growth, process_rss
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = ["320x240", "640x480", "1280x720", "1920x1080"]
+
+
+def parse_duration(text):
+    """
+    "45s", "30m", "3h" or plain seconds -> seconds.
+    """
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def make_frames(sizes, per_size=4, seed=0):
+    """
+    JPEG frames of every size with random shapes and JPEG quality, so decode and
+    preprocessing buffers of many shapes are exercised.
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for size in sizes:
+        width, height = map(int, size.split("x"))
+        for _ in range(per_size):
+            image = np.full((height, width, 3), rng.integers(0, 255, 3), dtype=np.uint8)
+            for _ in range(8):
+                center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+                radius = int(rng.integers(10, max(11, min(width, height) // 4)))
+                cv2.circle(image, center, radius, tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(rng.integers(60, 95))])
+            frames.append((size, buffer.tobytes()))
+    return frames
+
+
+def multipart_body(image_bytes):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"frame.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + image_bytes + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def get_json(url, timeout=30):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+class LoadGenerator:
+    """
+    Closed-loop load: `concurrency` threads each send a random frame, wait for the answer,
+    then sleep `think_time` seconds. Latencies and errors are collected per sampling interval.
+    """
+    def __init__(self, url, frames, concurrency=4, think_time=0.0, mode="full"):
+        self.url = f"{url}/detect_mask?mode={mode}"
+        self.frames = frames
+        self.concurrency = concurrency
+        self.think_time = think_time
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.status_counts = {}
+        self.threads = []
+
+    def _run(self, seed):
+        rng = random.Random(seed)
+        while not self.stop.is_set():
+            size, image_bytes = rng.choice(self.frames)
+            body, content_type = multipart_body(image_bytes)
+            request = urllib.request.Request(self.url, data=body, headers={"Content-Type": content_type})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except (urllib.error.URLError, OSError):
+                status = "connection_error"
+                self.stop.wait(1.0)  # Server down or restarting, don't spin
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.latencies.append(elapsed)
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if self.think_time:
+                self.stop.wait(self.think_time)
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"load-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def drain(self):
+        """
+        Latency summary and status counts since the last call.
+        """
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            counts, self.status_counts = self.status_counts, {}
+        summary = {"requests": len(latencies), "status": {str(k): v for k, v in counts.items()}}
+        if latencies:
+            latencies.sort()
+            summary["p50_ms"] = round(statistics.median(latencies) * 1000, 1)
+            summary["p95_ms"] = round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1)
+        return summary
+
+    def close(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join(timeout=65)
+
+
+def start_server(port, model_path=None):
+    """
+    Starts `uvicorn main:app` with MEMORY_DEBUG=1 and waits until it is ready.
+    """
+    env = {**os.environ, "MEMORY_DEBUG": "1"}
+    if model_path:
+        env["MODEL_PATH"] = model_path
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+                               env=env)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError(f"❌ Server exited with code {process.returncode}")
+        status = get_json(f"{url}/ready", timeout=2)
+        if status and status.get("ready"):
+            return process, url
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError("❌ Server did not become ready within 10 minutes")
+
+
+def soak(url, duration, frames, concurrency=4, think_time=0.0, sample_interval=30, warmup=300, pid=None,
+         threshold_mb_per_hour=20, output=None, mode="full", top=15):
+    """
+    Runs the load generator for `duration` seconds, sampling server memory every `sample_interval` seconds.
+
+    RSS is read from /proc for `pid` (server on this machine), otherwise from /debug/memory,
+    which also provides tracemalloc and torch numbers when the server runs with MEMORY_DEBUG=1.
+    Samples taken during `warmup` are recorded but not used for growth detection.
+
+    Returns
+    -------
+    dict
+        Growth verdicts for RSS and traced memory, plus the top growing allocation sites.
+    """
+    load = LoadGenerator(url, frames, concurrency, think_time, mode)
+    samples = []
+    start = time.time()
+    out = open(output, "w") if output else None
+
+    # Growth is measured against the state after warmup
+    def post_baseline():
+        try:
+            urllib.request.urlopen(urllib.request.Request(f"{url}/debug/memory/baseline", method="POST"), timeout=30)
+        except (urllib.error.URLError, OSError):
+            pass
+
+    load.start()
+    baseline_reset = False
+    try:
+        next_sample = start
+        while time.time() - start < duration:
+            next_sample += sample_interval
+            time.sleep(max(0.0, min(next_sample, start + duration) - time.time()))
+            elapsed = time.time() - start
+            if elapsed >= warmup and not baseline_reset:
+                post_baseline()
+                baseline_reset = True
+
+            debug = get_json(f"{url}/debug/memory?top=0")  # Counters only, allocation sites once at the end
+            sample = {
+                "elapsed": round(elapsed, 1),
+                "rss_bytes": process_rss(pid) if pid else (debug or {}).get("rss_bytes"),
+                "traced_bytes": (debug or {}).get("traced_bytes"),
+                "gc_objects": (debug or {}).get("gc_objects"),
+                "torch": (debug or {}).get("torch"),
+                "load": load.drain(),
+            }
+            samples.append(sample)
+            if out:
+                out.write(json.dumps(sample) + "\n")
+                out.flush()
+            rss_mb = (sample["rss_bytes"] or 0) / 2 ** 20
+            logger.info(f"⏱️ {elapsed / 60:.1f} min: RSS {rss_mb:.1f} MB, {sample['load']}")
+    finally:
+        load.close()
+        if out:
+            out.close()
+    sites = get_json(f"{url}/debug/memory?top={top}", timeout=300) or {}
+
+    steady = [s for s in samples if s["elapsed"] >= warmup]
+    report = {"duration_seconds": round(time.time() - start, 1), "samples": len(samples)}
+    for key in ["rss_bytes", "traced_bytes"]:
+        points = [(s["elapsed"], s[key] / 2 ** 20) for s in steady if s[key] is not None]
+        report[key.replace("_bytes", "_mb")] = detect_growth([t for t, _ in points], [v for _, v in points],
+                                                              threshold_mb_per_hour,
+                                                              min_duration=min(1800, duration - warmup) * 0.9)
+    report["leak_suspected"] = any(report[key]["flagged"] for key in ["rss_mb", "traced_mb"])
+    report["top_growth"] = sites.get("top_growth", [])
+    return report
+
+
+def print_report(report):
+    print(f"\nSoak test: {report['duration_seconds'] / 60:.1f} min, {report['samples']} samples")
+    for key in ["rss_mb", "traced_mb"]:
+        verdict = report[key]
+        if verdict["slope_per_hour"] is None:
+            print(f"  {key:<10} not enough samples")
+            continue
+        print(f"  {key:<10} slope {verdict['slope_per_hour']:+.1f} MB/h, growth {verdict['growth']:+.1f} MB, "
+              f"monotonic={verdict['monotonic']} -> {'🚨 GROWING' if verdict['flagged'] else '✅ stable'}")
+    if report["top_growth"]:
+        print("\nTop allocation sites by growth since warmup:")
+        for stat in report["top_growth"]:
+            print(f"  {stat['size_diff'] / 1024:>10.1f} KiB  {stat['count_diff']:>+8}  {stat['site']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-running load test that watches the server's memory.")
+    parser.add_argument("--url", default=None, help="Running server; default starts one with MEMORY_DEBUG=1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=None, help="MODEL_PATH for the started server")
+    parser.add_argument("--pid", type=int, default=None, help="Server pid, to read RSS from /proc")
+    parser.add_argument("--duration", default="3h")
+    parser.add_argument("--warmup", default="5m")
+    parser.add_argument("--sample-interval", default="30s")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds each client waits between requests")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--mode", default="full")
+    parser.add_argument("--threshold-mb-per-hour", type=float, default=20)
+    parser.add_argument("--output", default="soak_samples.jsonl")
+    args = parser.parse_args()
+
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server, url = start_server(args.port, args.model)
+        pid = server.pid
+    try:
+        report = soak(url, parse_duration(args.duration), make_frames(args.sizes), args.concurrency, args.think_time,
+                      parse_duration(args.sample_interval), parse_duration(args.warmup), pid,
+                      args.threshold_mb_per_hour, args.output, args.mode)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    sys.exit(1 if report["leak_suspected"] else 0)
+
+#python -m serving.soak_test --duration 3h --model best.pt
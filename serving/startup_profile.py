@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import subprocess
+from logging_setup import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Modules that dominate cold start of the server
+DEFAULT_MODULES = ["main", "fastapi", "numpy", "cv2", "torch", "torchvision", "ultralytics"]
+
+
+def parse_importtime(stderr):
+    """
+    Parses the output of `python -X importtime`.
+
+    Returns
+    -------
+    list of dict
+        One entry per imported module with `module`, `self_ms`, `cumulative_ms` and `depth`.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def profile_import(module):
+    """
+    Imports `module` in a fresh interpreter and returns the wall time and the `-X importtime` breakdown.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "WARMUP_RUNS": "0"},
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        logger.warning(f"⚠️ Importing {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+
+    return {"module": module, "ok": completed.returncode == 0, "wall_ms": wall_ms,
+            "imports": parse_importtime(completed.stderr)}
+
+
+def profile_model_load(model_path):
+    """
+    Times backend construction and warm-up in this process.
+    """
+    from serving.backends import load_backend
+
+    start = time.perf_counter()
+    backend = load_backend(model_path)
+    loaded = time.perf_counter()
+    backend.warmup(runs=1)
+    warmed = time.perf_counter()
+
+    return {"model": model_path, "load_ms": (loaded - start) * 1000, "warmup_ms": (warmed - loaded) * 1000}
+
+
+def startup_report(modules=None, model_path=None, top=15):
+    """
+    Builds a startup profile: per-module import cost, the slowest transitive imports and model load time.
+    """
+    report = {"modules": [], "slowest_imports": [], "model": None}
+    for module in modules or DEFAULT_MODULES:
+        result = profile_import(module)
+        report["modules"].append({"module": module, "ok": result["ok"], "wall_ms": round(result["wall_ms"], 1)})
+        report["slowest_imports"].extend(result["imports"])
+
+    # Keep the costliest top-level-ish entry for each module across all runs
+    slowest = {}
+    for row in report["slowest_imports"]:
+        if row["module"] not in slowest or row["cumulative_ms"] > slowest[row["module"]]["cumulative_ms"]:
+            slowest[row["module"]] = row
+    report["slowest_imports"] = sorted(slowest.values(), key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+    if model_path:
+        report["model"] = profile_model_load(model_path)
+
+    return report
+
+
+def print_report(report):
+    print(f"\n{'module':<30}{'import wall (ms)':>18}")
+    for row in report["modules"]:
+        status = "" if row["ok"] else "  (failed)"
+        print(f"{row['module']:<30}{row['wall_ms']:>18.1f}{status}")
+
+    print(f"\n{'slowest transitive imports':<50}{'self (ms)':>12}{'cumul. (ms)':>14}")
+    for row in report["slowest_imports"]:
+        print(f"{row['module']:<50}{row['self_ms']:>12.1f}{row['cumulative_ms']:>14.1f}")
+
+    if report["model"]:
+        model = report["model"]
+        print(f"\nModel {model['model']}: load {model['load_ms']:.1f} ms, warm-up {model['warmup_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile server cold start: import timing per module and model load.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--model", default=None, help="Also time loading this .pt/.torchscript model")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", default=None, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = startup_report(args.modules, args.model, args.top)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"✅ Startup report written to {args.json}")
+
+#python -m serving.startup_profile --model best.torchscript
@@ -0,0 +1,136 @@
+import os
+import logging
+from logging_setup import setup_logging
+
+# numpy is imported inside the functions, like serving.backends, to keep main.py cheap to import.
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Defaults for the opt-in tiled mode, overridable per deployment
+TILE_SIZE = int(os.getenv("TILE_SIZE", "448"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+MAX_TILES = int(os.getenv("MAX_TILES", "16"))
+
+
+def tile_positions(length, tile_size, overlap):
+    """
+    Start offsets of overlapping tiles covering `length` pixels, the last tile flush with the edge.
+    """
+    if length <= tile_size:
+        return [0]
+
+    step = max(1, int(tile_size * (1 - overlap)))
+    positions = list(range(0, length - tile_size, step))
+    positions.append(length - tile_size)
+    return positions
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES):
+    """
+    Splits an image into overlapping square tiles.
+
+    If the grid would exceed `max_tiles`, the tile size is grown until it fits, trading
+    small-object resolution for a bounded amount of compute.
+
+    Returns
+    -------
+    list of tuple
+        `(x1, y1, x2, y2)` crop windows.
+    """
+    while True:
+        xs = tile_positions(width, tile_size, overlap)
+        ys = tile_positions(height, tile_size, overlap)
+        if len(xs) * len(ys) <= max_tiles:
+            break
+        tile_size = int(tile_size * 1.25) + 1
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs]
+
+
+def nms(detections, iou=0.45, use_min_area=False):
+    """
+    Class-aware NMS in NumPy, used to merge detections from overlapping tiles.
+
+    Parameters
+    ----------
+    detections : np.ndarray
+        (N, 6) array with rows `x1, y1, x2, y2, confidence, class_id`.
+    use_min_area : bool
+        Divide the intersection by the smaller box instead of the union. A face cut by a tile
+        border yields a partial box mostly contained in the full one, which plain IoU keeps.
+
+    Returns
+    -------
+    np.ndarray
+        The kept detections, highest confidence first.
+    """
+    import numpy as np
+
+    if len(detections) == 0:
+        return detections
+
+    # Offsetting boxes by class keeps different classes from suppressing each other
+    offset = detections[:, 5:6] * (detections[:, :4].max() + 1)
+    boxes = detections[:, :4] + offset
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-detections[:, 4], kind="stable")
+
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        top_left = np.maximum(boxes[i, :2], boxes[rest, :2])
+        bottom_right = np.minimum(boxes[i, 2:], boxes[rest, 2:])
+        intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=1)
+        if use_min_area:
+            overlap = intersection / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            overlap = intersection / (areas[i] + areas[rest] - intersection + 1e-9)
+        order = rest[overlap < iou]
+
+    return detections[keep]
+
+
+def tiled_predict(backend, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES,
+                  include_full_frame=True, conf=0.25, iou=0.45, merge_threshold=0.6, imgsz=None):
+    """
+    Runs detection on overlapping tiles of a large image in a single batch and merges the results.
+
+    Parameters
+    ----------
+    backend : serving.backends.DetectorBackend
+        The loaded model.
+    image : np.ndarray
+        RGB image.
+    include_full_frame : bool
+        Also run the whole (downscaled) frame in the same batch, so faces larger than a tile are kept.
+    merge_threshold : float
+        Intersection over the smaller box above which detections from different tiles are merged.
+
+    Returns
+    -------
+    np.ndarray
+        (N, 6) detections in image coordinates.
+    """
+    import numpy as np
+
+    height, width = image.shape[:2]
+    windows = tile_grid(width, height, tile_size, overlap, max_tiles)
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    if include_full_frame and len(windows) > 1:
+        crops.append(image)
+        windows.append((0, 0, width, height))
+
+    results = backend.predict(crops, imgsz=imgsz, conf=conf, iou=iou)
+
+    merged = []
+    for (x1, y1, _, _), detections in zip(windows, results):
+        detections = detections.copy()
+        detections[:, [0, 2]] += x1
+        detections[:, [1, 3]] += y1
+        merged.append(detections)
+    merged = np.concatenate(merged) if merged else np.zeros((0, 6), dtype=np.float32)
+
+    return nms(merged, merge_threshold, use_min_area=True)
@@ -0,0 +1,62 @@
+import unittest
+from serving.adaptive import AdaptiveController, DEFAULT_TIERS
+
+
+class TestAdaptiveController(unittest.TestCase):
+    def serve(self, controller, latency_ms=50, count=3):
+        for _ in range(count):
+            controller.record(latency_ms)
+
+    def test_steps_down_under_load_and_back_up(self):
+        controller = AdaptiveController(DEFAULT_TIERS, high_queue=4, low_queue=1, cooldown=1.0, min_samples=3)
+
+        self.assertEqual(controller.update(queue_depth=0, now=10.0)["name"], "full")
+        self.assertEqual(controller.update(queue_depth=6, now=11.0)["name"], "reduced")
+        self.serve(controller)
+        # Still overloaded but inside the cooldown window
+        self.assertEqual(controller.update(queue_depth=6, now=11.5)["name"], "reduced")
+        self.assertEqual(controller.update(queue_depth=6, now=12.5)["name"], "minimal")
+        self.serve(controller)
+        # Already at the cheapest tier
+        self.assertEqual(controller.update(queue_depth=9, now=14.0)["name"], "minimal")
+
+        self.assertEqual(controller.update(queue_depth=0, now=15.0)["name"], "reduced")
+        self.serve(controller)
+        self.assertEqual(controller.update(queue_depth=0, now=16.0)["name"], "full")
+
+    def test_waits_for_samples_after_a_change(self):
+        controller = AdaptiveController(DEFAULT_TIERS, high_latency_ms=300, cooldown=0.0, min_samples=5)
+        self.serve(controller, latency_ms=500, count=20)
+        self.assertEqual(controller.update(queue_depth=0, now=1.0)["name"], "reduced")
+
+        # The latency window was cleared: an empty p95 must not count as relaxed
+        self.assertEqual(controller.update(queue_depth=0, now=2.0)["name"], "reduced")
+        self.serve(controller, latency_ms=50, count=4)
+        self.assertEqual(controller.update(queue_depth=0, now=3.0)["name"], "reduced")
+        self.serve(controller, latency_ms=50, count=1)
+        self.assertEqual(controller.update(queue_depth=0, now=4.0)["name"], "full")
+
+    def test_latency_triggers_step_down(self):
+        controller = AdaptiveController(DEFAULT_TIERS, high_latency_ms=300, cooldown=0.0)
+        for _ in range(20):
+            controller.record(500)
+
+        self.assertEqual(controller.update(queue_depth=0, now=1.0)["name"], "reduced")
+
+    def test_saturated_queue_steps_down_without_samples(self):
+        # Every request is shed at its deadline, so no latencies are ever recorded
+        controller = AdaptiveController(DEFAULT_TIERS, high_queue=4, cooldown=1.0, min_samples=5)
+
+        self.assertEqual(controller.update(queue_depth=20, now=1.0)["name"], "reduced")
+        self.assertEqual(controller.update(queue_depth=20, now=2.0)["name"], "minimal")
+        # Once the queue drains it still waits for samples before stepping back up
+        self.assertEqual(controller.update(queue_depth=0, now=3.0)["name"], "minimal")
+
+    def test_disabled_stays_on_best_tier(self):
+        controller = AdaptiveController(DEFAULT_TIERS, high_queue=1, cooldown=0.0, enabled=False)
+
+        self.assertEqual(controller.update(queue_depth=50, now=1.0)["name"], "full")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,17 @@
+import unittest
+from serving.autotune import largest_within
+
+
+class TestLargestWithin(unittest.TestCase):
+    def test_largest_size_within_budget(self):
+        timings = {224: 0.030, 160: 0.018, 128: 0.012}
+
+        self.assertEqual(largest_within(timings, target_ms=40), 224)
+        self.assertEqual(largest_within(timings, target_ms=20), 160)
+
+    def test_fastest_when_nothing_fits(self):
+        self.assertEqual(largest_within({224: 0.030, 160: 0.018, 128: 0.012}, target_ms=5), 128)
+
+
+if __name__ == "__main__":
+    unittest.main()
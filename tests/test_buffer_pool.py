@@ -0,0 +1,86 @@
+import unittest
+import cv2
+import numpy as np
+from serving.buffer_pool import BufferPool, bucket_capacity
+from serving.backends import LETTERBOX_COLOR, DetectorBackend, decode_image, fill_input, letterbox
+
+
+class TestBufferPool(unittest.TestCase):
+    def test_buffers_are_reused_within_a_bucket(self):
+        pool = BufferPool(max_per_bucket=2)
+        first = pool.acquire((480, 640, 3), np.uint8)
+        pool.release(first)
+
+        second = pool.acquire((478, 640, 3), np.uint8)  # Same bucket, different shape
+
+        self.assertTrue(np.shares_memory(first, second))
+        self.assertEqual(second.shape, (478, 640, 3))
+        self.assertEqual((pool.stats["hits"], pool.stats["misses"]), (1, 1))
+        self.assertFalse(np.shares_memory(second, pool.acquire((478, 640, 3), np.uint8)))
+
+    def test_idle_buffers_are_bounded(self):
+        pool = BufferPool(max_per_bucket=1, max_bytes=10 ** 9)
+        arrays = [pool.acquire((100, 100), np.float32) for _ in range(3)]
+        for array in arrays:
+            pool.release(array)
+        pool.release(arrays[0])  # Double release is ignored
+
+        self.assertEqual(pool.snapshot()["idle_buffers"], 1)
+        self.assertEqual(pool.stats["discarded"], 2)
+
+    def test_bucket_capacity(self):
+        self.assertEqual(bucket_capacity(1), 4096)
+        for nbytes in [70000, 602112, 921600, 6220800]:
+            self.assertTrue(nbytes <= bucket_capacity(nbytes) <= nbytes * 1.125)
+
+
+class TestFusedPreprocessing(unittest.TestCase):
+    def setUp(self):
+        self.image = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    def reference(self, image, imgsz):
+        # Allocating implementation the fused one replaces
+        scale = min(imgsz / image.shape[1], imgsz / image.shape[0])
+        width, height = int(round(image.shape[1] * scale)), int(round(image.shape[0] * scale))
+        canvas = np.full((imgsz, imgsz, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        left, top = (imgsz - width) // 2, (imgsz - height) // 2
+        canvas[top:top + height, left:left + width] = cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+        return canvas
+
+    def test_letterbox_into_dirty_buffer(self):
+        out = np.full((224, 224, 3), 7, dtype=np.uint8)
+
+        canvas, scale, pad = letterbox(self.image, 224, out=out)
+
+        self.assertIs(canvas, out)
+        self.assertEqual(pad, (0, 28))
+        np.testing.assert_array_equal(canvas, self.reference(self.image, 224))
+
+    def test_fill_input_swaps_channels(self):
+        out = np.empty((3, 224, 224), dtype=np.float32)
+
+        fill_input(self.image[:224, :224], out, bgr=True)
+
+        np.testing.assert_allclose(out, self.image[:224, :224, ::-1].transpose(2, 0, 1) / 255, rtol=1e-6)
+
+    def test_prepare_inputs_matches_rgb_path_for_bgr_frames(self):
+        ok, encoded = cv2.imencode(".png", self.image)
+        image_rgb, image_bgr = decode_image(encoded.tobytes()), decode_image(encoded.tobytes(), rgb=False)
+        pool = BufferPool()
+        backend = DetectorBackend(module=None, names={}, pool=pool)
+        expected = self.reference(image_rgb, 224).transpose(2, 0, 1) / 255
+
+        for channels_last in [False, True]:
+            backend.channels_last = channels_last
+            inputs, metas, buffers = backend.prepare_inputs([image_bgr, image_rgb[:200]], 224, bgr=True)
+            np.testing.assert_allclose(inputs[0], expected, rtol=1e-6)
+            self.assertEqual(inputs.shape, (2, 3, 224, 224))
+            self.assertEqual(inputs.flags["C_CONTIGUOUS"], not channels_last)
+            backend.release(buffers)
+
+        self.assertEqual(metas[1][2], (200, 640))
+        self.assertEqual(pool.snapshot()["leased"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import threading
+import numpy as np
+from serving.cascade import FaceProposer, cascade_predict
+
+
+class FakeBackend:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, images, imgsz=None, conf=0.25, iou=0.45):
+        self.calls.append({"images": len(images), "imgsz": imgsz})
+        return [np.zeros((0, 6)) for _ in images]
+
+
+class NoFaces:
+    def propose(self, image):
+        return []
+
+
+class TestCascade(unittest.TestCase):
+    def test_each_thread_gets_its_own_classifier(self):
+        proposer = FaceProposer()
+        classifiers = []
+
+        def worker():
+            classifiers.append(proposer.classifier)
+            proposer.propose(np.zeros((64, 64, 3), dtype=np.uint8))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(classifier) for classifier in classifiers + [proposer.classifier]}), 4)
+
+    def test_fallback_keeps_tier_input_size(self):
+        backend = FakeBackend()
+
+        detections, fallback = cascade_predict(backend, np.zeros((480, 640, 3), dtype=np.uint8), NoFaces(),
+                                               full_imgsz=160)
+
+        self.assertTrue(fallback)
+        self.assertEqual(len(detections), 0)
+        self.assertEqual(backend.calls, [{"images": 1, "imgsz": 160}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from data_processing.dedup import DEFAULT_MAX_DISTANCE, HashIndex, blocks_for, build_report, duplicate_clusters, hamming_distances, perceptual_hash
+
+
+class TestHashIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.hashes = rng.integers(0, 2 ** 63, size=500, dtype=np.int64).astype(np.uint64)
+        # Near copies of the first 50 hashes with 1-3 flipped bits
+        flips = [sum(1 << int(b) for b in rng.choice(64, size=rng.integers(1, 4), replace=False)) for _ in range(50)]
+        near = self.hashes[:50] ^ np.array(flips, dtype=np.uint64)
+        self.hashes = np.concatenate([self.hashes, near])
+
+    def test_hamming_distances(self):
+        hashes = np.array([0b0, 0b1011, 2 ** 64 - 1], dtype=np.uint64)
+
+        self.assertEqual(hamming_distances(0, hashes).tolist(), [0, 3, 64])
+
+    def test_query_matches_brute_force(self):
+        for max_distance in [3, DEFAULT_MAX_DISTANCE]:
+            index = HashIndex(self.hashes, max_distance)
+            for i in range(0, len(self.hashes), 7):
+                found, _ = index.query(int(self.hashes[i]), max_distance)
+                expected = np.flatnonzero(hamming_distances(int(self.hashes[i]), self.hashes) <= max_distance)
+                self.assertEqual(sorted(found.tolist()), expected.tolist())
+
+    def test_default_radius_uses_the_index(self):
+        index = HashIndex(self.hashes)
+
+        self.assertEqual(index.blocks, blocks_for(DEFAULT_MAX_DISTANCE))
+        self.assertGreater(index.blocks, DEFAULT_MAX_DISTANCE)
+        candidates = [len(index._candidates(int(h))) for h in self.hashes[:100]]
+        self.assertLess(max(candidates), len(self.hashes) // 10)
+
+    def test_clusters_group_near_copies(self):
+        labels = duplicate_clusters(self.hashes, max_distance=3)
+
+        for i in range(50):
+            self.assertEqual(labels[i], labels[500 + i])
+        self.assertEqual(len(set(labels.tolist())), 500)
+
+
+class TestPerceptualHash(unittest.TestCase):
+    def test_report_clusters_recompressed_frames(self):
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as image_dir:
+            for i in range(3):
+                scene = cv2.GaussianBlur(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8), (15, 15), 0)
+                cv2.imwrite(os.path.join(image_dir, f"scene{i}.png"), scene)
+                cv2.imwrite(os.path.join(image_dir, f"scene{i}_copy.jpg"), cv2.resize(scene, (320, 240)),
+                            [cv2.IMWRITE_JPEG_QUALITY, 60])
+
+            self.assertIsNone(perceptual_hash(os.path.join(image_dir, "missing.png")))
+            report = build_report(image_dir, max_distance=6, workers=1)
+
+        self.assertEqual(report["duplicate_clusters"], 3)
+        for members in report["clusters"]:
+            scenes = {os.path.splitext(name)[0].replace("_copy", "") for name in members}
+            self.assertEqual((len(members), len(scenes)), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
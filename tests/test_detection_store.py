@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from serving.detection_store import DetectionStore
+
+
+def boxes(*labels):
+    return [{"label": label, "confidence": 0.9, "bbox": [0, 0, 10, 10]} for label in labels]
+
+
+class TestDetectionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DetectionStore(os.path.join(self.tmp.name, "detections.db"), flush_interval=0.05)
+        self.store.start()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_label_share_per_hour(self):
+        self.store.add("cam-1", boxes("with_mask", "without_mask"), ts=3600 * 10 + 5)
+        self.store.add("cam-1", boxes("with_mask", "with_mask"), ts=3600 * 10 + 1800)
+        self.store.add("cam-2", boxes("without_mask"), ts=3600 * 11)
+        self.store.close()
+
+        report = self.store.label_share("without_mask", bucket="hour")
+
+        self.assertEqual([(row["total"], row["count"], row["percent"]) for row in report], [(4, 1, 25.0), (1, 1, 100.0)])
+        self.assertEqual(report[0]["period"], "1970-01-01T10:00:00Z")
+
+    def test_day_bucket_camera_filter_and_time_range(self):
+        for hour in range(30):
+            self.store.add("cam-1", boxes("without_mask"), ts=3600 * hour)
+            self.store.add("cam-2", boxes("with_mask"), ts=3600 * hour)
+        self.store.close()
+
+        by_day = self.store.label_share(bucket="day", camera="cam-1")
+        in_range = self.store.label_share(bucket="day", start=3600 * 20, end=3600 * 25, by_camera=True)
+
+        self.assertEqual([row["total"] for row in by_day], [24, 6])
+        self.assertEqual([(row["camera"], row["total"]) for row in in_range],
+                         [("cam-1", 4), ("cam-2", 4), ("cam-1", 2), ("cam-2", 2)])
+
+    def test_recent_and_stats(self):
+        self.store.add("cam-1", boxes("with_mask"), mode="full", ts=1)
+        self.store.add("cam-1", boxes("without_mask"), mode="tiled", ts=2)
+        self.store.close()
+
+        recent = self.store.recent(limit=1, camera="cam-1")
+
+        self.assertEqual([(row["label"], row["mode"]) for row in recent], [("without_mask", "tiled")])
+        self.assertEqual((self.store.stats["frames"], self.store.stats["detections"]), (2, 2))
+
+    def test_add_drops_when_writer_is_behind(self):
+        store = DetectionStore(os.path.join(self.tmp.name, "full.db"), max_pending=2)  # Writer not started
+
+        for _ in range(5):
+            store.add("cam-1", boxes("with_mask"))
+
+        self.assertEqual(store.snapshot()["dropped"], 3)
+        self.assertEqual(store.snapshot()["pending"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from model.yolo_v3_mini.evaluate import box_iou, cache_key, match_predictions, evaluate_predictions
+
+NAMES = {0: 'without_mask', 1: 'with_mask'}
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_box_iou(self):
+        boxes_a = np.array([[0, 0, 10, 10]], dtype=float)
+        boxes_b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=float)
+
+        iou = box_iou(boxes_a, boxes_b)
+
+        np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], atol=1e-6)
+
+    def test_match_predictions_one_prediction_per_ground_truth(self):
+        gt_boxes = np.array([[0, 0, 10, 10]], dtype=float)
+        gt_classes = np.array([1])
+        # Two predictions on the same face: only the best one can be a true positive
+        pred_boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 9]], dtype=float)
+        pred_classes = np.array([1, 1])
+
+        correct = match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes)
+
+        self.assertTrue(correct[0].all())
+        self.assertFalse(correct[1].any())
+
+    def test_match_predictions_class_mismatch(self):
+        gt_boxes = np.array([[0, 0, 10, 10]], dtype=float)
+        correct = match_predictions(gt_boxes, np.array([0]), gt_boxes, np.array([1]))
+
+        self.assertFalse(correct.any())
+
+    def test_perfect_predictions(self):
+        ground_truths = [np.array([[1, 10, 10, 50, 50], [0, 100, 100, 150, 160]], dtype=float)]
+        predictions = [np.array([[10, 10, 50, 50, 0.9, 1], [100, 100, 150, 160, 0.8, 0]], dtype=float)]
+
+        report = evaluate_predictions(predictions, ground_truths, [(224, 224)], NAMES)
+
+        self.assertAlmostEqual(report["overall"]["precision"], 1.0)
+        self.assertAlmostEqual(report["overall"]["recall"], 1.0)
+        self.assertAlmostEqual(report["overall"]["mAP_0.5"], 1.0)
+        self.assertAlmostEqual(report["overall"]["mAP_0_5_0_95"], 1.0)
+        self.assertEqual(report["per_class"]["with_mask"]["num_gt"], 1)
+
+    def test_conf_threshold_rescoring(self):
+        ground_truths = [np.array([[1, 10, 10, 50, 50]], dtype=float)]
+        predictions = [np.array([[10, 10, 50, 50, 0.3, 1]], dtype=float)]
+
+        low = evaluate_predictions(predictions, ground_truths, [(224, 224)], NAMES, conf_threshold=0.25)
+        high = evaluate_predictions(predictions, ground_truths, [(224, 224)], NAMES, conf_threshold=0.5)
+
+        self.assertAlmostEqual(low["per_class"]["with_mask"]["recall"], 1.0)
+        self.assertAlmostEqual(high["per_class"]["with_mask"]["recall"], 0.0)
+        # mAP doesn't depend on the reporting threshold
+        self.assertAlmostEqual(low["overall"]["mAP_0.5"], high["overall"]["mAP_0.5"])
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_changed_images_invalidate_the_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, "best.pt")
+            image_dir = os.path.join(directory, "images")
+            os.makedirs(image_dir)
+            for path in [model_path, os.path.join(image_dir, "a.jpg"), os.path.join(image_dir, "b.png")]:
+                with open(path, "wb") as f:
+                    f.write(b"0" * 10)
+
+            key = cache_key(model_path, image_dir, 224, 0.001)
+            self.assertEqual(cache_key(model_path, image_dir, 224, 0.001), key)
+
+            with open(os.path.join(image_dir, "notes.txt"), "w") as f:
+                f.write("not an image")
+            self.assertEqual(cache_key(model_path, image_dir, 224, 0.001), key)
+
+            with open(os.path.join(image_dir, "a.jpg"), "wb") as f:
+                f.write(b"1" * 12)
+            replaced = cache_key(model_path, image_dir, 224, 0.001)
+            self.assertNotEqual(replaced, key)
+
+            os.remove(os.path.join(image_dir, "b.png"))
+            self.assertNotEqual(cache_key(model_path, image_dir, 224, 0.001), replaced)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+from model.yolo_v3_mini.feature_cache import batch_targets, cache_key, cached_layers, letterbox_labels, load_feature_cache
+
+
+class TestCachedLayers(unittest.TestCase):
+    def test_sequential_backbone(self):
+        self.assertEqual(cached_layers([-1] * 10, freeze=5), [4])
+
+    def test_skip_connections_into_the_head(self):
+        froms = [-1, -1, -1, -1, -1, -1, [-1, 2], -1, [-1, 6], [7, 8]]
+
+        self.assertEqual(cached_layers(froms, freeze=5), [2, 4])
+        self.assertEqual(cached_layers(froms, freeze=7), [6])  # Layer 2 is only read inside the frozen part
+
+
+class TestLabels(unittest.TestCase):
+    def test_letterbox_and_flip(self):
+        # 640x480 image into 224: scale 0.35, 28 px padding top and bottom
+        boxes = np.array([[1, 0, 0, 320, 240], [0, 320, 240, 640, 480]], dtype=float)
+
+        labels = letterbox_labels(boxes, 0.35, (0, 28), 224)
+        flipped = letterbox_labels(boxes, 0.35, (0, 28), 224, flip=True)
+
+        np.testing.assert_allclose(labels[0], [1, 0.25, (28 + 42) / 224, 0.5, 84 / 224])
+        np.testing.assert_allclose(flipped[0], [1, 0.75, (28 + 42) / 224, 0.5, 84 / 224])
+        np.testing.assert_allclose(flipped[1, 1], 0.25)
+
+    def test_batch_targets(self):
+        labels = np.array([[0, 1, .1, .1, .1, .1], [2, 0, .2, .2, .2, .2], [2, 1, .3, .3, .3, .3],
+                           [5, 1, .5, .5, .5, .5]])
+
+        targets = batch_targets(labels, np.array([1, 2, 5]))
+
+        np.testing.assert_array_equal(targets["batch_idx"], [1, 1, 2])
+        np.testing.assert_array_equal(targets["cls"], [[0], [1], [1]])
+        self.assertEqual(targets["bboxes"].shape, (3, 4))
+
+
+class TestLoadFeatureCache(unittest.TestCase):
+    def test_features_are_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            store = np.lib.format.open_memmap(os.path.join(cache_dir, "layer_4.npy"), mode="w+", dtype=np.float16,
+                                              shape=(3, 8, 4, 4))
+            store[:] = np.arange(3)[:, None, None, None]
+            store.flush()
+            del store
+            np.save(os.path.join(cache_dir, "labels.npy"), np.zeros((0, 6)))
+            with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+                json.dump({"layers": [4], "samples": 3, "freeze": 5}, f)
+
+            meta, features, labels = load_feature_cache(cache_dir)
+
+            self.assertIsInstance(features[4], np.memmap)
+            self.assertEqual(float(features[4][2, 0, 0, 0]), 2.0)
+            self.assertEqual(labels.shape, (0, 6))
+            del features
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_changed_images_and_labels_invalidate_the_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, "best.pt")
+            image_dir, label_dir = os.path.join(directory, "images"), os.path.join(directory, "labels")
+            os.makedirs(image_dir)
+            os.makedirs(label_dir)
+            for path in [model_path, os.path.join(image_dir, "a.jpg"), os.path.join(label_dir, "a.txt")]:
+                with open(path, "w") as f:
+                    f.write("0 0.5 0.5 0.1 0.1\n")
+
+            def key():
+                return cache_key(model_path, image_dir, label_dir, 224, 5, False)
+
+            first = key()
+            self.assertEqual(key(), first)
+
+            with open(os.path.join(image_dir, "b.png"), "w") as f:
+                f.write("new capture")
+            added = key()
+            self.assertNotEqual(added, first)
+
+            with open(os.path.join(label_dir, "b.txt"), "w") as f:
+                f.write("1 0.5 0.5 0.2 0.2\n")
+            labelled = key()
+            self.assertNotEqual(labelled, added)
+
+            with open(os.path.join(label_dir, "a.txt"), "w") as f:
+                f.write("1 0.5 0.5 0.1 0.1\n0 0.2 0.2 0.1 0.1\n")
+            self.assertNotEqual(key(), labelled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+import unittest
+import subprocess
+from logging_setup import JsonFormatter, SampledLogger
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_logger(name):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = _ListHandler()
+    logger.handlers = [handler]
+    return logger, handler
+
+
+class TestSampledLogger(unittest.TestCase):
+    def test_emits_one_in_n_and_counts_all(self):
+        logger, handler = make_logger("test_sampled_every_n")
+        sampled = SampledLogger(logger, every_n=10, max_per_second=0, summary_interval=3600)
+
+        for i in range(25):
+            sampled.info("box", "Box %s", i)
+
+        self.assertEqual([record.getMessage() for record in handler.records], ["Box 0", "Box 10", "Box 20"])
+        self.assertEqual(sampled.counts["box"], 25)
+
+    def test_rate_limit_per_key(self):
+        logger, handler = make_logger("test_sampled_rate")
+        sampled = SampledLogger(logger, every_n=1, max_per_second=2, summary_interval=3600)
+
+        for i in range(10):
+            sampled.info("file", "File %s", i)
+        sampled.info("other", "Other")
+
+        self.assertEqual([record.getMessage() for record in handler.records], ["File 0", "File 1", "Other"])
+
+    def test_summary_reports_and_resets_counters(self):
+        logger, handler = make_logger("test_sampled_summary")
+        sampled = SampledLogger(logger, every_n=100, max_per_second=0, summary_interval=3600)
+        for _ in range(5):
+            sampled.info("box", "Box")
+
+        sampled.flush_summary()
+
+        self.assertEqual(handler.records[-1].log_summary, {"box": {"count": 5, "logged": 1}})
+        self.assertEqual(sampled.counts, {})
+
+    def test_disabled_level_is_skipped(self):
+        logger, handler = make_logger("test_sampled_level")
+        sampled = SampledLogger(logger, every_n=1)
+
+        sampled.debug("box", "Box")
+
+        self.assertEqual(handler.records, [])
+        self.assertEqual(sampled.counts, {})
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_includes_extra_fields(self):
+        record = logging.LogRecord("app", logging.INFO, __file__, 1, "Hello %s", ("world",), None)
+        record.camera = "cam-1"
+
+        payload = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(payload["message"], "Hello world")
+        self.assertEqual(payload["level"], "INFO")
+        self.assertEqual(payload["camera"], "cam-1")
+
+
+# Runs in a fresh interpreter so this process's own logging setup doesn't interfere
+WORKER_SCRIPT = """
+import sys, logging, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from logging_setup import setup_logging, shutdown_logging
+
+setup_logging(stream=open(sys.argv[1], "a"))  # At import like our modules, so spawned workers run it too
+
+def work(i):
+    logging.getLogger("worker").warning("worker %s done", i)
+    return i
+
+if __name__ == "__main__":
+    logging.getLogger("parent").info("parent started")
+    for method in ["fork", "spawn"]:
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context(method)) as executor:
+            list(executor.map(work, [f"{method}-{i}" for i in range(3)]))
+    shutdown_logging()
+"""
+
+
+class TestWorkerProcesses(unittest.TestCase):
+    def test_logs_from_forked_and_spawned_workers_are_written(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            script, output = os.path.join(tmp, "script.py"), os.path.join(tmp, "log.txt")
+            with open(script, "w") as f:
+                f.write(WORKER_SCRIPT)
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            subprocess.run([sys.executable, script, output], check=True, timeout=120,
+                           env={**os.environ, "PYTHONPATH": root, "LOG_FORMAT": "text"})
+            with open(output) as f:
+                lines = f.read()
+
+        self.assertIn("parent started", lines)
+        for method in ["fork", "spawn"]:
+            for i in range(3):
+                self.assertIn(f"worker {method}-{i} done", lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import tracemalloc
+import numpy as np
+from serving.memory_debug import MemoryTracker, detect_growth, process_rss
+
+
+class TestDetectGrowth(unittest.TestCase):
+    def setUp(self):
+        self.times = np.arange(0, 4 * 3600, 60.0)  # 4 hours, one sample a minute
+        self.noise = np.random.default_rng(0).normal(0, 3, len(self.times))
+
+    def test_steady_growth_is_flagged(self):
+        rss = 500 + 30 * self.times / 3600 + self.noise  # +30 MB/h
+
+        verdict = detect_growth(self.times, rss, threshold_per_hour=20)
+
+        self.assertTrue(verdict["flagged"])
+        self.assertAlmostEqual(verdict["slope_per_hour"], 30, delta=2)
+
+    def test_step_then_plateau_is_not_flagged(self):
+        rss = 500 + np.where(self.times > 600, 200, 0) + self.noise  # Cache filled once early on
+
+        self.assertFalse(detect_growth(self.times[30:], rss[30:], threshold_per_hour=20)["flagged"])
+
+    def test_flat_and_short_series(self):
+        self.assertFalse(detect_growth(self.times, 500 + self.noise, threshold_per_hour=20)["flagged"])
+        rss = 500 + 30 * self.times / 3600
+        self.assertFalse(detect_growth(self.times[:20], rss[:20], threshold_per_hour=20)["flagged"])
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def test_growth_sites_point_at_the_leak(self):
+        tracker = MemoryTracker(frames=1)
+        self.addCleanup(tracemalloc.stop)
+        leak = [bytearray(100_000) for _ in range(20)]
+
+        snapshot = tracker.snapshot(top=5)
+
+        self.assertIn("test_memory_debug.py", snapshot["top_growth"][0]["site"])
+        self.assertGreaterEqual(snapshot["top_growth"][0]["size_diff"], 2_000_000)
+        self.assertNotIn("top_sites", tracker.snapshot(top=0))
+        del leak
+
+    def test_rss(self):
+        rss = process_rss()
+        if rss is not None:  # /proc only exists on Linux
+            self.assertGreater(rss, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
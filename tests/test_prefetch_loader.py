@@ -0,0 +1,74 @@
+import time
+import unittest
+import threading
+from dataloader.prefetch_loader import PrefetchLoader
+
+
+class SlowBatches:
+    """
+    Re-iterable stand-in for a DataLoader: yields 0 .. count - 1, optionally failing at `fail_at`.
+    """
+    def __init__(self, count, delay=0.0, fail_at=None):
+        self.count = count
+        self.delay = delay
+        self.fail_at = fail_at
+        self.produced = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            if i == self.fail_at:
+                raise ValueError(f"corrupt image in batch {i}")
+            time.sleep(self.delay)
+            self.produced += 1
+            yield i
+
+
+def prefetch_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "prefetch"]
+
+
+class TestPrefetchLoader(unittest.TestCase):
+    def test_batches_arrive_in_order_every_epoch(self):
+        loader = PrefetchLoader(loader=SlowBatches(50), prefetch_batches=3)
+
+        for epoch in range(2):
+            self.assertEqual(list(loader), list(range(50)))
+
+        self.assertEqual(len(loader), 50)
+        self.assertEqual([stats["batches"] for stats in loader.epoch_stats], [50, 50])
+        self.assertEqual(prefetch_threads(), [])
+
+    def test_loader_error_reaches_the_training_loop(self):
+        loader = PrefetchLoader(loader=SlowBatches(10, fail_at=4))
+        received = []
+
+        with self.assertRaisesRegex(ValueError, "corrupt image in batch 4"):
+            for batch in loader:
+                received.append(batch)
+
+        self.assertEqual(received, [0, 1, 2, 3])
+        self.assertEqual(loader.last_epoch_stats["batches"], 4)
+        self.assertEqual(prefetch_threads(), [])
+
+    def test_early_break_stops_the_producer(self):
+        batches = SlowBatches(1000, delay=0.001)
+        loader = PrefetchLoader(loader=batches, prefetch_batches=2)
+
+        for batch in loader:
+            if batch == 5:
+                break
+
+        self.assertEqual(prefetch_threads(), [])
+        # The producer stopped instead of draining the whole epoch into the queue
+        produced = batches.produced
+        self.assertLess(produced, 20)
+        time.sleep(0.05)
+        self.assertEqual(batches.produced, produced)
+        self.assertEqual(loader.last_epoch_stats["batches"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from serving.rendering import COLOURS, encode_image, render_detections, draw_yolo_labels
+from dataloader.contact_sheets import make_contact_sheets
+
+
+class TestRendering(unittest.TestCase):
+    def test_render_detections_draws_class_colour(self):
+        image_rgb = np.zeros((240, 320, 3), dtype=np.uint8)
+        detections = [{"label": "without_mask", "confidence": 0.8, "bbox": [100, 100, 200, 200]}]
+
+        rendered = cv2.imdecode(np.frombuffer(render_detections(image_rgb, detections, "png"), np.uint8),
+                                cv2.IMREAD_COLOR)
+
+        self.assertEqual(rendered.shape, (240, 320, 3))
+        # Anti-aliased edges aren't the exact colour, but the box must be in the class colour's channel (BGR)
+        self.assertEqual(rendered[150, 98:103].max(axis=0).argmax(), np.argmax(COLOURS["without_mask"]))
+        self.assertFalse(image_rgb.any())  # Input frame is not drawn on
+
+    def test_yolo_labels_are_denormalised(self):
+        image = np.zeros((100, 200, 3), dtype=np.uint8)
+
+        draw_yolo_labels(image, [[1, 0.5, 0.5, 0.5, 0.4]], thickness=1)
+
+        self.assertEqual(image[50, 48:53].max(axis=0).argmax(), np.argmax(COLOURS["with_mask"]))  # Left edge at x = 50
+        self.assertFalse(image[50, 100].any())  # Centre stays empty
+
+    def test_encode_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            encode_image(np.zeros((8, 8, 3), dtype=np.uint8), "gif")
+
+
+class TestContactSheets(unittest.TestCase):
+    def test_sheets_hold_cols_times_rows_samples(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            image_dir, label_dir, output_dir = (os.path.join(tmp, name) for name in ("images", "labels", "sheets"))
+            os.makedirs(image_dir)
+            os.makedirs(label_dir)
+            for i in range(7):
+                cv2.imwrite(os.path.join(image_dir, f"img{i}.jpg"), np.full((60, 80, 3), 128, dtype=np.uint8))
+                with open(os.path.join(label_dir, f"img{i}.txt"), "w") as f:
+                    f.write("0 0.5 0.5 0.2 0.2\n")
+
+            paths = make_contact_sheets(image_dir, label_dir, output_dir, cols=2, rows=2, thumb_size=64, workers=1)
+            shapes = [cv2.imread(path).shape for path in paths]
+
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(shapes, [(128, 128, 3), (128, 128, 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
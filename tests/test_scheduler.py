@@ -0,0 +1,86 @@
+import time
+import asyncio
+import threading
+import unittest
+from serving.scheduler import InferenceScheduler, DeadlineExceeded, LoadShed, request_deadline
+
+
+class TestInferenceScheduler(unittest.TestCase):
+    def test_runs_job(self):
+        async def run():
+            scheduler = InferenceScheduler()
+            scheduler.start()
+            return await scheduler.submit(lambda: 42)
+
+        self.assertEqual(asyncio.run(run()), 42)
+
+    def test_rejects_unreachable_deadline(self):
+        async def run():
+            scheduler = InferenceScheduler(initial_service_time=1.0)
+            scheduler.start()
+            await scheduler.submit(lambda: None, deadline=time.monotonic() + 0.1)
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(run())
+
+    def test_live_before_batch_then_earliest_deadline(self):
+        order = []
+        release = threading.Event()
+
+        async def run():
+            scheduler = InferenceScheduler(initial_service_time=0.0)
+            scheduler.start()
+            # Occupy the single worker so the next jobs queue up
+            blocker = asyncio.ensure_future(scheduler.submit(release.wait))
+            await asyncio.sleep(0.05)
+
+            now = time.monotonic()
+            jobs = [
+                scheduler.submit(lambda: order.append("batch"), now + 10, "batch"),
+                scheduler.submit(lambda: order.append("live-late"), now + 10, "live"),
+                scheduler.submit(lambda: order.append("live-early"), now + 5, "live"),
+            ]
+            tasks = [asyncio.ensure_future(job) for job in jobs]
+            await asyncio.sleep(0.05)
+            release.set()
+            await asyncio.gather(blocker, *tasks)
+
+        asyncio.run(run())
+        self.assertEqual(order, ["live-early", "live-late", "batch"])
+
+    def test_full_queue_sheds_least_urgent(self):
+        release = threading.Event()
+
+        async def run():
+            scheduler = InferenceScheduler(max_queue=1, initial_service_time=0.0)
+            scheduler.start()
+            blocker = asyncio.ensure_future(scheduler.submit(release.wait))
+            await asyncio.sleep(0.05)
+
+            batch = asyncio.ensure_future(scheduler.submit(lambda: "batch", priority="batch"))
+            await asyncio.sleep(0.01)
+            live = asyncio.ensure_future(scheduler.submit(lambda: "live", priority="live"))
+            await asyncio.sleep(0.01)
+            release.set()
+
+            results = await asyncio.gather(blocker, batch, live, return_exceptions=True)
+            return results, scheduler.snapshot()
+
+        (_, batch, live), stats = asyncio.run(run())
+        self.assertIsInstance(batch, LoadShed)
+        self.assertEqual(live, "live")
+        self.assertEqual(stats["shed"], 1)
+
+    def test_request_deadline(self):
+        self.assertIsNone(request_deadline())
+
+        deadline = request_deadline(max_age_ms="500")
+        self.assertAlmostEqual(deadline - time.monotonic(), 0.5, delta=0.05)
+
+        # The earlier of the two headers wins
+        deadline = request_deadline(deadline_ms=str((time.time() + 2) * 1000), max_age_ms="500")
+        self.assertAlmostEqual(deadline - time.monotonic(), 0.5, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import time
+import unittest
+import numpy as np
+from serving.shadow import ShadowEvaluator, compare_detections
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+
+
+class TestCompareDetections(unittest.TestCase):
+    def test_matches_mismatches_and_misses(self):
+        primary = np.array([[0, 0, 10, 10, 0.9, 1], [20, 20, 30, 30, 0.8, 0], [50, 50, 60, 60, 0.7, 1]])
+        candidate = np.array([[1, 1, 10, 10, 0.8, 1], [20, 20, 30, 30, 0.6, 1], [80, 80, 90, 90, 0.5, 0]])
+
+        result = compare_detections(primary, candidate, iou_threshold=0.5)
+
+        self.assertEqual((result["matched"], result["label_mismatch"], result["missed"], result["extra"]), (1, 1, 1, 1))
+        self.assertAlmostEqual(result["confidence_delta_sum"], -0.1 - 0.2)
+
+    def test_each_box_is_matched_once(self):
+        primary = np.array([[0, 0, 10, 10, 0.9, 1]])
+        candidate = np.array([[0, 0, 10, 10, 0.9, 1], [0, 0, 10, 9, 0.8, 1]])
+
+        result = compare_detections(primary, candidate)
+
+        self.assertEqual((result["matched"], result["extra"]), (1, 1))
+        self.assertEqual(compare_detections(np.empty((0, 6)), candidate)["extra"], 2)
+
+
+class TestShadowEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.busy = False
+        self.calls = []
+
+        def predict(backend, image, mode, imgsz, conf, bgr):
+            self.calls.append(mode)
+            return np.array([[0, 0, 10, 10, 0.5, 0]]), False
+
+        self.shadow = ShadowEvaluator(backend=None, predict=predict, sample_rate=1.0, max_pending=4,
+                                      overloaded=lambda: self.busy)
+        self.image = np.zeros((20, 20, 3), dtype=np.uint8)
+
+    def test_compares_sampled_frames_in_the_background(self):
+        self.shadow.start()
+        self.shadow.offer(self.image, np.array([[0, 0, 10, 10, 0.9, 0]]), "full", 224, 0.25, 12.0)
+        self.shadow.offer(self.image, np.empty((0, 6)), "tiled", 224, 0.25, 30.0)
+        wait_for(lambda: self.shadow.stats["completed"] == 2)
+
+        snapshot = self.shadow.snapshot()
+
+        self.assertEqual(self.calls, ["full", "tiled"])
+        self.assertEqual((snapshot["frames_agreeing"], snapshot["matched"], snapshot["extra"]), (1, 1, 1))
+        self.assertEqual(snapshot["frame_agreement"], 0.5)
+        self.assertEqual(snapshot["latency_ms"]["primary_p95"], 30.0)
+        self.assertEqual(snapshot["recent_disagreements"][0]["mode"], "tiled")
+
+    def test_shed_under_load_and_when_full(self):
+        self.busy = True
+        self.assertFalse(self.shadow.offer(self.image, np.empty((0, 6)), "full", 224, 0.25, 1.0))
+
+        self.busy = False
+        for _ in range(6):  # Worker not started, so the queue fills up
+            self.shadow.offer(self.image, np.empty((0, 6)), "full", 224, 0.25, 1.0)
+        self.busy = True  # Load rises before the queued frames run
+        self.shadow.start()
+        wait_for(lambda: self.shadow._queue.empty())
+        time.sleep(0.05)
+
+        self.assertEqual(self.shadow.stats["dropped_full"], 2)
+        self.assertEqual(self.shadow.stats["shed_load"], 5)
+        self.assertEqual(self.calls, [])
+
+    def test_sample_rate(self):
+        self.shadow.sample_rate = 0.0
+        self.shadow.offer(self.image, np.empty((0, 6)), "full", 224, 0.25, 1.0)
+
+        self.assertEqual((self.shadow.stats["offered"], self.shadow.stats["sampled"]), (1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
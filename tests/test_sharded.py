@@ -0,0 +1,192 @@
+import os
+import json
+import tempfile
+import unittest
+from data_processing.file_utils import atomic_write
+from data_processing.sharded import WorkQueue, assign_split, merge, shard_of
+
+
+class TestSharding(unittest.TestCase):
+    def test_shards_are_stable_and_cover_everything(self):
+        stems = [f"maksssksksss{i}" for i in range(1000)]
+        shards = [shard_of(stem, 4) for stem in stems]
+
+        self.assertEqual(shards, [shard_of(stem, 4) for stem in stems])
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+        self.assertTrue(all(150 < shards.count(shard) < 350 for shard in range(4)))
+
+    def test_split_ratios(self):
+        splits = [assign_split(f"img{i}") for i in range(10000)]
+
+        self.assertAlmostEqual(splits.count("train") / len(splits), 0.8, delta=0.02)
+        self.assertAlmostEqual(splits.count("val") / len(splits), 0.1, delta=0.02)
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(os.path.join(self.tmp.name, "queue.db"), lease_seconds=60)
+        self.queue.add([(f"img{i}.png", f"img{i}") for i in range(10)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_claims_do_not_overlap(self):
+        first = self.queue.claim("worker-a", limit=6)
+        second = self.queue.claim("worker-b", limit=6)
+
+        self.assertEqual(len(first), 6)
+        self.assertEqual(len(second), 4)
+        self.assertFalse({stem for _, stem in first} & {stem for _, stem in second})
+        self.assertEqual(self.queue.claim("worker-c"), [])
+
+    def test_finish_and_expired_leases(self):
+        claimed = self.queue.claim("worker-a", limit=10)
+        self.queue.finish("worker-a", [stem for _, stem in claimed[:8]], {"img8": "bad xml"})
+
+        self.assertEqual(self.queue.progress(), {"done": 8, "failed": 1, "claimed": 1})
+        self.assertEqual(self.queue.add([("img0.png", "img0"), ("img10.png", "img10")]), 1)
+
+        self.queue.lease_seconds = -1  # Lease of the crashed worker holding img9 has run out
+        self.assertEqual(self.queue.claim("worker-b"), [("img10.png", "img10"), ("img9.png", "img9")])
+        self.queue.lease_seconds = 60
+
+        self.queue.retry_failed()
+        self.assertEqual(self.queue.claim("worker-b", limit=10), [("img8.png", "img8")])
+
+    def test_expired_items_fail_after_max_attempts(self):
+        self.queue.lease_seconds = -1  # Every worker crashes before finishing
+        for attempt in range(3):
+            self.assertEqual(len(self.queue.claim(f"worker-{attempt}", limit=10, max_attempts=3)), 10)
+
+        self.assertEqual(self.queue.claim("worker-3", limit=10, max_attempts=3), [])
+        self.assertEqual(self.queue.progress(), {"failed": 10})
+
+        self.queue.retry_failed()
+        self.assertEqual(len(self.queue.claim("worker-4", limit=10, max_attempts=3)), 10)
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def test_replaces_file_and_cleans_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "part.jsonl")
+            temp_paths = []
+
+            def write(temp_path):
+                temp_paths.append(temp_path)
+                with open(temp_path, "w") as f:
+                    f.write("new")
+
+            with open(path, "w") as f:
+                f.write("old")
+            atomic_write(path, write)
+            atomic_write(path, write)
+
+            with open(path) as f:
+                self.assertEqual(f.read(), "new")
+            self.assertEqual(os.listdir(directory), ["part.jsonl"])
+            self.assertNotEqual(temp_paths[0], temp_paths[1])
+            self.assertEqual(os.path.dirname(temp_paths[0]), directory)
+
+    def test_failed_write_keeps_old_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "part.jsonl")
+            with open(path, "w") as f:
+                f.write("old")
+
+            def write(temp_path):
+                with open(temp_path, "w") as f:
+                    f.write("partial")
+                raise OSError("disk full")
+
+            with self.assertRaises(OSError):
+                atomic_write(path, write)
+
+            with open(path) as f:
+                self.assertEqual(f.read(), "old")
+            self.assertEqual(os.listdir(directory), ["part.jsonl"])
+
+
+class TestMerge(unittest.TestCase):
+    def test_merge_writes_manifest_and_split_lists(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "manifests"))
+            for part in range(2):
+                with open(os.path.join(output_dir, "manifests", f"shard-{part}.jsonl"), "w") as f:
+                    for i in range(part * 50, part * 50 + 50):
+                        f.write(json.dumps({"stem": f"img{i}", "source": f"img{i}.png", "boxes": {"resize": 1}}) + "\n")
+            report = os.path.join(output_dir, "dedup.json")
+            with open(report, "w") as f:
+                json.dump({"clusters": [[f"img{i}.png" for i in range(20)]]}, f)
+
+            counts = merge(output_dir, methods=["resize"], dedup_report=report)
+
+            with open(os.path.join(output_dir, "manifest.jsonl")) as f:
+                manifest = [json.loads(line) for line in f]
+            lists = {}
+            for split in counts:
+                with open(os.path.join(output_dir, "splits", "resize", f"{split}.txt")) as f:
+                    lists[split] = f.read().split()
+
+        self.assertEqual(len(manifest), 100)
+        self.assertEqual(sum(counts.values()), 100)
+        self.assertEqual(len({record["split"] for record in manifest if int(record["stem"][3:]) < 20}), 1)
+        self.assertEqual(sum(len(paths) for paths in lists.values()), 100)
+        self.assertTrue(all(path.endswith(".jpg") and "/images/resize/" in path for path in lists["train"]))
+
+    def test_regenerated_report_keeps_existing_splits(self):
+        def write_part(output_dir, name, stems):
+            with open(os.path.join(output_dir, "manifests", f"{name}.jsonl"), "w") as f:
+                for stem in stems:
+                    f.write(json.dumps({"stem": stem, "source": f"{stem}.png", "boxes": {"resize": 1}}) + "\n")
+
+        def write_report(path, clusters):
+            # Like dedup.build_report: largest clusters first, singletons included
+            clusters = sorted(clusters, key=lambda members: (-len(members), members[0]))
+            with open(path, "w") as f:
+                json.dump({"clusters": [[f"{stem}.png" for stem in members] for members in clusters]}, f)
+
+        def read_splits(output_dir):
+            with open(os.path.join(output_dir, "manifest.jsonl")) as f:
+                return {record["stem"]: record["split"] for record in map(json.loads, f)}
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "manifests"))
+            report = os.path.join(output_dir, "dedup.json")
+            clusters = [[f"img{i}", f"img{i}_copy"] for i in range(100)] + [[f"solo{i}"] for i in range(800)]
+            write_part(output_dir, "first", [stem for members in clusters for stem in members])
+            write_report(report, clusters)
+            merge(output_dir, methods=["resize"], dedup_report=report)
+            before = read_splits(output_dir)
+
+            # New captures: a large duplicate cluster sorting in front of all others, and new singletons
+            new_clusters = [[f"new{i}" for i in range(5)]] + [[f"late{i}"] for i in range(50)]
+            write_part(output_dir, "second", [stem for members in new_clusters for stem in members])
+            write_report(report, new_clusters + clusters)
+            merge(output_dir, methods=["resize"], dedup_report=report)
+            after = read_splits(output_dir)
+
+        self.assertEqual({stem: after[stem] for stem in before}, before)
+        self.assertEqual(len({after[f"new{i}"] for i in range(5)}), 1)
+        self.assertTrue(all(after[f"img{i}"] == after[f"img{i}_copy"] for i in range(100)))
+
+    def test_latest_part_wins(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, "manifests"))
+            # The re-run of img0 has a part name that sorts first but was written last
+            for part, boxes, mtime in [("worker-b-00000", 1, 1000), ("worker-a-00000", 2, 2000)]:
+                path = os.path.join(output_dir, "manifests", f"{part}.jsonl")
+                with open(path, "w") as f:
+                    f.write(json.dumps({"stem": "img0", "source": "img0.png", "boxes": {"resize": boxes}}) + "\n")
+                os.utime(path, (mtime, mtime))
+
+            merge(output_dir, methods=["resize"])
+
+            with open(os.path.join(output_dir, "manifest.jsonl")) as f:
+                manifest = [json.loads(line) for line in f]
+
+        self.assertEqual([record["boxes"]["resize"] for record in manifest], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from serving.startup_profile import parse_importtime
+
+# Trimmed from `python -X importtime -c "import json"`, with unrelated stderr mixed in
+IMPORTTIME_SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       735 |        735 |   _io
+import time:      1708 |      50045 | site
+import time:       209 |        209 |       _json
+import time:       478 |        686 |     json.scanner
+import time:       463 |       1148 |   json.decoder
+import time:       478 |        478 |   json.encoder
+import time:       309 |       1935 | json
+Traceback (most recent call last):
+ModuleNotFoundError: No module named 'torch'
+"""
+
+
+class TestParseImporttime(unittest.TestCase):
+    def test_parses_captured_sample(self):
+        rows = parse_importtime(IMPORTTIME_SAMPLE)
+
+        self.assertEqual([row["module"] for row in rows],
+                         ["_io", "site", "_json", "json.scanner", "json.decoder", "json.encoder", "json"])
+        self.assertEqual([row["depth"] for row in rows], [1, 0, 3, 2, 1, 1, 0])
+        self.assertEqual(rows[-1], {"module": "json", "self_ms": 0.309, "cumulative_ms": 1.935, "depth": 0})
+        self.assertEqual(rows[1]["cumulative_ms"], 50.045)
+
+    def test_ignores_other_output(self):
+        self.assertEqual(parse_importtime("import time: self [us] | cumulative | imported package\nhello\n"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    from model.yolo_v3_mini import sweep
+except ImportError:  # mlflow is not installed
+    sweep = None
+
+SEARCH_SPACE = {
+    "method": ["resize", "pad_resize"],
+    "imgsz": [160, 224],
+    "lr0": [0.001, 0.01, 0.1],
+    "augmentation": {"mild": {"degrees": 5.0, "hsv_s": 0.2}, "strong": {"degrees": 10.0, "fliplr": 0.5}},
+}
+
+
+def fake_run(run_id, history):
+    return SimpleNamespace(info=SimpleNamespace(run_id=run_id), history=history)
+
+
+@unittest.skipIf(sweep is None, "mlflow is not installed")
+class TestSearchSpace(unittest.TestCase):
+    def test_full_grid(self):
+        trials = sweep.expand_search_space(SEARCH_SPACE)
+
+        self.assertEqual(len(trials), 2 * 2 * 3 * 2)
+        self.assertEqual(len({sweep.trial_key(trial) for trial in trials}), len(trials))
+        self.assertEqual(trials[0], {"augmentation": "mild", "imgsz": 160, "lr0": 0.001, "method": "resize"})
+
+    def test_sample_is_reproducible(self):
+        trials = sweep.expand_search_space(SEARCH_SPACE, max_trials=5, seed=3)
+
+        self.assertEqual(len(trials), 5)
+        self.assertEqual(trials, sweep.expand_search_space(SEARCH_SPACE, max_trials=5, seed=3))
+        self.assertTrue(all(trial in sweep.expand_search_space(SEARCH_SPACE) for trial in trials))
+        # More trials than the grid has: the whole grid
+        self.assertEqual(len(sweep.expand_search_space(SEARCH_SPACE, max_trials=100)), 24)
+
+    def test_trial_key_is_stable(self):
+        trial = {"method": "resize", "imgsz": 224, "lr0": 0.01, "freeze": 5, "augmentation": "mild"}
+
+        # Hardcoded so a change to the key (which would orphan the MLflow runs of a sweep) fails here
+        self.assertEqual(sweep.trial_key(trial), "8867f0bf2849")
+        self.assertEqual(sweep.trial_key(dict(reversed(list(trial.items())))), "8867f0bf2849")
+
+    def test_build_train_params(self):
+        base = {"epochs": 50, "lr0": 0.005, "degrees": 0.0}
+        trial = {"method": "resize", "imgsz": 160, "lr0": 0.1, "augmentation": "strong"}
+
+        params = sweep.build_train_params(trial, SEARCH_SPACE, base)
+
+        self.assertEqual(params, {"epochs": 50, "lr0": 0.1, "imgsz": 160, "degrees": 10.0, "fliplr": 0.5})
+        self.assertEqual(base, {"epochs": 50, "lr0": 0.005, "degrees": 0.0})
+
+
+@unittest.skipIf(sweep is None, "mlflow is not installed")
+class TestMedianPruner(unittest.TestCase):
+    def setUp(self):
+        runs = {
+            "a": fake_run("run-a", {10: 0.5, 11: 0.6}),
+            "b": fake_run("run-b", {10: 0.3, 11: 0.4}),
+            "c": fake_run("run-c", {10: 0.4}),
+            "self": fake_run("run-self", {10: 0.0}),
+        }
+        histories = {run.info.run_id: run.history for run in runs.values()}
+
+        client = mock.Mock()
+        client.get_metric_history.side_effect = lambda run_id, metric: [
+            SimpleNamespace(step=step, value=value) for step, value in histories[run_id].items()]
+        patches = [mock.patch.object(sweep, "MlflowClient", return_value=client),
+                   mock.patch.object(sweep, "sweep_runs", return_value=runs)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.pruner = sweep.MedianPruner("experiment", "sweep", "run-self", warmup_epochs=10, min_trials=3)
+
+    def test_reference_values_skip_own_run(self):
+        self.assertEqual(sorted(self.pruner.reference_values(10)), [0.3, 0.4, 0.5])
+
+    def test_prunes_below_median(self):
+        self.assertTrue(self.pruner.should_prune(10, 0.35))
+        self.assertFalse(self.pruner.should_prune(10, 0.45))
+
+    def test_warmup_and_min_trials(self):
+        self.assertFalse(self.pruner.should_prune(9, 0.0))
+        # Only two other trials reached epoch 11
+        self.assertFalse(self.pruner.should_prune(11, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
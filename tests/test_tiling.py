@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from serving.tiling import tile_grid, nms
+
+
+class TestTiling(unittest.TestCase):
+    def test_small_image_is_single_tile(self):
+        self.assertEqual(tile_grid(200, 150, tile_size=448), [(0, 0, 200, 150)])
+
+    def test_tiles_cover_image_with_overlap(self):
+        windows = tile_grid(1920, 1080, tile_size=448, overlap=0.2, max_tiles=100)
+
+        covered = np.zeros((1080, 1920), dtype=bool)
+        for x1, y1, x2, y2 in windows:
+            self.assertEqual((x2 - x1, y2 - y1), (448, 448))
+            covered[y1:y2, x1:x2] = True
+        self.assertTrue(covered.all())
+
+    def test_max_tiles_is_respected(self):
+        windows = tile_grid(1920, 1080, tile_size=224, overlap=0.2, max_tiles=8)
+
+        self.assertLessEqual(len(windows), 8)
+
+    def test_nms_keeps_other_classes(self):
+        detections = np.array([[0, 0, 10, 10, 0.9, 1],
+                               [0, 0, 10, 10, 0.8, 1],
+                               [0, 0, 10, 10, 0.7, 0]], dtype=float)
+
+        kept = nms(detections, iou=0.5)
+
+        np.testing.assert_array_equal(kept[:, 4], [0.9, 0.7])
+
+    def test_nms_min_area_merges_partial_box(self):
+        # A face cut by a tile border: the partial box is contained in the full one
+        detections = np.array([[0, 0, 20, 20, 0.9, 1],
+                               [0, 0, 8, 20, 0.6, 1]], dtype=float)
+
+        self.assertEqual(len(nms(detections, iou=0.6)), 2)
+        self.assertEqual(len(nms(detections, iou=0.6, use_min_area=True)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()